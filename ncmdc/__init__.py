@@ -1,7 +1,39 @@
+from __future__ import annotations
+
+# 说明：
+# 包入口只声明公开接口，不在导入时加载 api（及其解密、输出依赖）：
+# `import ncmdc` 与 `python -m ncmdc.cli` 的冷启动都不为库接口付出导入开销，
+# 首次访问 ncmdc.convert_file 等名字时再由 __getattr__ 导入 ncmdc.api。
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .api import ConvertOptions, ConvertResult, convert_archive, convert_file, convert_many, convert_s3
+
 __all__ = [
     "__version__",
+    "ConvertOptions",
+    "ConvertResult",
+    "convert_archive",
+    "convert_file",
+    "convert_many",
+    "convert_s3",
 ]
 
 __version__ = "0.1.0"
 
+_API_NAMES = frozenset(__all__) - {"__version__"}
+
+
+def __getattr__(name: str):
+    if name in _API_NAMES:
+        from . import api
+
+        value = getattr(api, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | _API_NAMES)
@@ -0,0 +1,910 @@
+from __future__ import annotations
+
+# 说明：
+# 可嵌入的库接口。CLI 与长驻服务共用同一条单文件流水线：
+# 头部只解析一次 → 流式解密写入输出 → 摘要/容器检查 → 封面/meta/歌词等附加产物。
+# 每个文件返回一个 ConvertResult（状态、输出路径、字节数、分阶段耗时、错误），
+# 不抛出转换错误；convert_many 按完成顺序逐个产出结果，服务可以边转边消费。
+# 可选子系统（mutagen 标签写入、在线/本地缓存歌词）只在对应选项启用时才导入，
+# 纯解密不加载 mutagen/urllib，也不改动 sys.path（vendor 目录）。
+
+import functools
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from dataclasses import dataclass, field, fields, replace
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Callable, Iterable, Iterator
+
+from .ncm.chunking import DEFAULT_CHUNK
+from .ncm.parser import NcmDecoder, NcmMagicHeaderError
+from .output import DirectorySink, OutputSink, open_output
+from .sniff.image import sniff_image_extension
+
+_LOGGER = logging.getLogger("ncmdc")
+
+
+@dataclass
+class ConvertOptions:
+    """单文件转换选项，字段与 CLI 同名参数一一对应。"""
+
+    overwrite: bool = False
+    dry_run: bool = False
+    meta: bool = False
+    cover: bool = False
+    no_cover_file: bool = False
+    write_meta: bool = False
+    embed_cover: bool = False
+    lyrics: str | None = None
+    fetch_lyrics: bool = False
+    cookie: str | None = None
+    lyric_cache_dir: str | None = None
+    dump_meta: bool = False
+    export_lyrics: bool = False
+    lyrics_fallback: str = "both"
+    checksum: str | None = None
+    verify_container: bool = False
+    verify_existing: bool = False
+    verify_samples: int = 8
+    verify_block_kb: int = 64
+    # 只解析头部，为已存在的输出补齐缺失的附加产物（封面/meta/歌词/标签），不重新解密音频
+    artifacts_only: bool = False
+    # 解密结果写入该命令的 stdin 而不是输出文件（见 ncmdc.pipe）
+    pipe_to: str | None = None
+    # 外部命令以该退出码结束时记为跳过（而非失败）
+    pipe_skip_code: int | None = None
+    # 内嵌封面缺失或小于 cover_min_bytes 时按 album_pic_url 下载（见 providers.cover）
+    fetch_cover: bool = False
+    cover_size: int = 500
+    cover_min_bytes: int = 2048
+    cover_cache_dir: str | None = None
+    # 音频不小于该值（MB）时分段并行解密（见 ncm.parallel）；0 表示关闭
+    split_threshold_mb: int = 512
+    # 分段解密的 worker 数，None 时取 CPU 核数
+    split_workers: int | None = None
+    split_backend: str = "process"
+    # 内核 I/O 提示：输入顺序预读 + 读写过的区间释放页缓存 + 输出预分配（见 iohints）
+    io_hints: bool = False
+    # 解密循环复用页对齐缓冲（readinto）
+    aligned_buffers: bool = False
+    # 解密块大小（字节）；None 时由 chunk_tuner 自适应，二者皆无时为 256 KB
+    chunk_size: int | None = None
+    # 自适应块大小（ncm.chunking.ChunkTuner），整次运行共享
+    chunk_tuner: Any = None
+    # dump_meta 的聚合写入器（metadump.MetaWriter）；None 时每首写 <stem>.meta.json。由调用方创建并关闭
+    meta_writer: Any = None
+
+    @classmethod
+    def from_namespace(cls, ns: Any) -> ConvertOptions:
+        """从 argparse.Namespace（或任意带同名属性的对象）构造，忽略无关属性。"""
+        return cls(**{f.name: getattr(ns, f.name) for f in fields(cls) if hasattr(ns, f.name)})
+
+
+@dataclass
+class ConvertResult:
+    """单个文件的处理结果。status 为 ok / skip / fail / plan（dry-run）。"""
+
+    source: str
+    status: str
+    output: str | None = None
+    bytes: int = 0
+    # 附加产物（封面、meta JSON、歌词、校验和旁车）的输出位置
+    artifacts: list[str] = field(default_factory=list)
+    # 分阶段耗时（秒）：header / decrypt / post / total
+    timings: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+    checksum: str | None = None
+    digest: str | None = None
+    container: dict | None = None
+    # --verify-existing 实际比对的字节数
+    checked: int | None = None
+    meta: dict | None = None
+    # --pipe-to 外部命令的退出码
+    returncode: int | None = None
+    # --pipe-to 命令提前关闭 stdin、只收到音频开头部分时为 True（此时不给出摘要与容器检查结论）
+    partial: bool = False
+    # 封面取自在线下载时为 "remote"
+    cover_source: str | None = None
+    # 分段并行解密时的区间数
+    ranges: int | None = None
+    # 源数据字节数（可得时），供吞吐统计
+    bytes_in: int | None = None
+    # 不影响结果状态的附加步骤失败（如 "lyrics_fetch"、"cover_fetch"、"tags"）
+    warnings: list[str] = field(default_factory=list)
+    # --artifacts-only 补齐的产物种类（cover / meta / lyrics / tags）
+    backfilled: list[str] | None = None
+    # --in-place 核验通过后对源文件的处理："deleted" 或归档后的位置
+    retired: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    def to_dict(self) -> dict:
+        """运行报告中的逐文件条目（省略空字段，摘要以算法名为键）。"""
+        entry: dict = {"source": self.source, "status": self.status}
+        if self.output is not None:
+            entry["output"] = self.output
+        if self.status == "ok":
+            entry["bytes"] = self.bytes
+        if self.checked is not None:
+            entry["checked"] = self.checked
+        if self.returncode is not None:
+            entry["returncode"] = self.returncode
+        if self.partial:
+            entry["partial"] = True
+        if self.cover_source is not None:
+            entry["cover_source"] = self.cover_source
+        if self.ranges is not None:
+            entry["ranges"] = self.ranges
+        if self.digest and self.checksum:
+            entry[self.checksum] = self.digest
+        if self.container is not None:
+            entry["container"] = self.container
+        if self.artifacts:
+            entry["artifacts"] = list(self.artifacts)
+        if self.backfilled is not None:
+            entry["backfilled"] = list(self.backfilled)
+        if self.retired is not None:
+            entry["retired"] = self.retired
+        if self.warnings:
+            entry["warnings"] = list(self.warnings)
+        if self.error is not None:
+            entry["error"] = self.error
+        if self.timings:
+            entry["timings"] = {k: round(v, 6) for k, v in self.timings.items()}
+        return entry
+
+
+def _resolve_output(output: str | Path | OutputSink | None) -> tuple[OutputSink | None, bool]:
+    # 返回 (sink, 是否由本函数创建并负责关闭)；None 表示输出到源文件所在目录
+    if output is None or isinstance(output, OutputSink):
+        return output, False
+    return open_output(str(output)), True
+
+
+def _stream_size(fp: BinaryIO) -> int | None:
+    try:
+        return os.fstat(fp.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _split_plan(
+    dec: NcmDecoder,
+    src: Path | None,
+    out_rel: PurePosixPath,
+    sink: OutputSink,
+    options: ConvertOptions,
+) -> tuple[Path, int, int] | None:
+    """满足分段并行解密条件时返回 (输出路径, 音频大小, worker 数)，否则返回 None（走顺序解密）。"""
+    if not options.split_threshold_mb or src is None:
+        return None
+    out_file = sink.local_path(out_rel)
+    size = dec.audio_size()
+    if out_file is None or size is None or size < options.split_threshold_mb * 1024 * 1024:
+        return None
+    workers = options.split_workers or os.cpu_count() or 1
+    if workers < 2:
+        return None
+    return out_file, size, workers
+
+
+def _replay(path: Path, observers: Iterable, chunk_size: int = 1024 * 1024) -> None:
+    # 分段写出的结果不是顺序流：按顺序读回一遍交给摘要/容器检查
+    with path.open("rb") as fp:
+        while True:
+            buf = fp.read(chunk_size)
+            if not buf:
+                break
+            for cb in observers:
+                cb(buf)
+
+
+def _chunking(options: ConvertOptions) -> dict:
+    # stream_decrypt 的块大小参数：固定值优先，否则交给共享的 tuner
+    if options.chunk_size is None and options.chunk_tuner is not None:
+        return {"tuner": options.chunk_tuner}
+    return {"chunk_size": options.chunk_size or DEFAULT_CHUNK}
+
+
+def _stream_audio(
+    dec: NcmDecoder,
+    out_rel: PurePosixPath,
+    sink: OutputSink,
+    observers: Iterable | None,
+    options: ConvertOptions,
+    fp: BinaryIO | None,
+) -> int:
+    total = dec.audio_size()
+    chunking = _chunking(options)
+    buffer = None
+    if options.aligned_buffers:
+        from .iohints import COUNTERS, aligned_buffer
+
+        tuner = chunking.get("tuner")
+        buffer = aligned_buffer(tuner.max_chunk if tuner is not None else chunking["chunk_size"])
+        COUNTERS.add(aligned_files=1)
+    try:
+        # 中文注释：大小在解密前即可由头部得出，归档输出据此直接写成员头
+        with sink.open(out_rel, size=total) as out:
+            if not options.io_hints or fp is None:
+                return dec.stream_decrypt(out, observers=observers, buffer=buffer, **chunking)
+            from .iohints import IoHints
+
+            hints = IoHints(fp, dec.audio_start or 0, out, total)
+            try:
+                return dec.stream_decrypt(out, observers=[*(observers or ()), hints], buffer=buffer, **chunking)
+            finally:
+                hints.finish()
+    finally:
+        if buffer is not None:
+            try:
+                buffer.close()
+            except BufferError:
+                # 异常回溯仍引用着缓冲视图时交给垃圾回收
+                pass
+
+
+def _write_audio(
+    dec: NcmDecoder,
+    out_rel: PurePosixPath,
+    sink: OutputSink,
+    logger: logging.Logger,
+    source: str,
+    observers: Iterable | None = None,
+    options: ConvertOptions | None = None,
+    fp: BinaryIO | None = None,
+    result: ConvertResult | None = None,
+    src: Path | None = None,
+) -> int:
+    options = options or ConvertOptions()
+    try:
+        plan = _split_plan(dec, src, out_rel, sink, options)
+        if plan is not None:
+            from .ncm.parallel import RANGE_SIZE, parallel_decrypt, split_ranges
+
+            out_file, total, workers = plan
+            out_file.parent.mkdir(parents=True, exist_ok=True)
+            size = parallel_decrypt(
+                src, out_file, dec.audio_start, total, dec.key_box, workers, options.split_backend  # type: ignore[arg-type]
+            )
+            if observers:
+                _replay(out_file, observers)
+            if result is not None:
+                result.ranges = len(split_ranges(total, RANGE_SIZE))
+        else:
+            size = _stream_audio(dec, out_rel, sink, observers, options, fp)
+        logger.info("converted", extra={"source": source, "destination": sink.describe(out_rel)})
+        return size
+    except Exception:
+        logger.error("failed to convert", extra={"source": source}, exc_info=True)
+        raise
+
+
+def _pipe_audio(
+    dec: NcmDecoder,
+    ext: str,
+    stem: str,
+    out_rel: PurePosixPath,
+    sink: OutputSink,
+    options: ConvertOptions,
+    logger: logging.Logger,
+    result: ConvertResult,
+    observers: Iterable | None = None,
+) -> int:
+    from .pipe import run_pipe
+
+    meta = dec.get_audio_meta() or {}
+    size = dec.audio_size()
+    fields = {
+        "ext": ext.lstrip("."),
+        "stem": stem,
+        "source": result.source,
+        "output": sink.describe(out_rel),
+        "title": str(meta.get("title") or ""),
+        "artist": " / ".join(meta.get("artists") or []),
+        "album": str(meta.get("album") or ""),
+        "song_id": str(meta.get("song_id") or ""),
+        "size": "" if size is None else str(size),
+    }
+    try:
+        written, code = run_pipe(options.pipe_to, fields, lambda w: dec.stream_decrypt(w, observers=observers, **_chunking(options)))
+    except Exception:
+        logger.error("failed to pipe", extra={"source": result.source}, exc_info=True)
+        raise
+    result.returncode = code
+    if code == 0:
+        logger.info("piped", extra={"source": result.source})
+    return written
+
+
+def _verify_existing(
+    dec: NcmDecoder,
+    out_rel: PurePosixPath,
+    sink: OutputSink,
+    options: ConvertOptions,
+    logger: logging.Logger,
+    result: ConvertResult,
+) -> None:
+    from .verify import verify_sampled
+
+    out_file = sink.local_path(out_rel)
+    if out_file is None or not out_file.exists():
+        logger.warning("output missing, skip", extra={"destination": sink.describe(out_rel)})
+        result.status, result.error = "skip", "output missing"
+        return
+    result.output = str(out_file)
+    try:
+        res = verify_sampled(dec, out_file, samples=options.verify_samples, block=options.verify_block_kb * 1024)
+    except Exception as e:
+        logger.error("verify failed", extra={"source": result.source}, exc_info=True)
+        result.status, result.error = "fail", str(e)
+        return
+    if res.ok:
+        logger.info("verified", extra={"source": result.source, "destination": str(out_file)})
+        result.status, result.bytes, result.checked = "ok", res.actual_size, res.checked_bytes
+    else:
+        logger.warning("verify mismatch: %s (%s)", str(out_file), res.detail)
+        result.status, result.error = "fail", res.detail
+
+
+def _read_lyrics(
+    dec: NcmDecoder,
+    meta: dict | None,
+    stem: str,
+    out_file: Path | None,
+    options: ConvertOptions,
+    logger: logging.Logger,
+    result: ConvertResult | None = None,
+) -> str | None:
+    from .providers.local_lyric import detect_default_dirs, fetch_local_lyrics
+
+    # 1. Load Local
+    local_text = None
+    if options.lyrics:
+        lyr_path = Path(options.lyrics)
+        if lyr_path.is_dir():
+            cand = lyr_path / (stem + ".lrc")
+            if cand.exists():
+                local_text = cand.read_text(encoding="utf-8", errors="ignore")
+        elif lyr_path.is_file():
+            local_text = lyr_path.read_text(encoding="utf-8", errors="ignore")
+    elif out_file is not None:
+        cand = out_file.with_suffix(".lrc")
+        if cand.exists():
+            local_text = cand.read_text(encoding="utf-8", errors="ignore")
+
+    # 2. Load Cache
+    cache_text = None
+    if meta and meta.get("song_id"):
+        search_dirs = [options.lyric_cache_dir] if options.lyric_cache_dir else detect_default_dirs()
+        try:
+            cache_text = fetch_local_lyrics(int(meta["song_id"]), search_dirs)
+        except Exception:
+            logger.warning("本地缓存歌词读取失败，已跳过", exc_info=True)
+
+    # 3. Remote Fetch
+    remote_text = None
+    if options.fetch_lyrics and meta and meta.get("song_id"):
+        try:
+            from .providers.netease import fetch_lyrics_by_song_id, merge_lyrics
+
+            fetched = fetch_lyrics_by_song_id(int(meta["song_id"]), cookie=options.cookie)
+            remote_text = merge_lyrics(fetched.get("lrc"), fetched.get("tlyric"))
+        except Exception:
+            logger.warning("在线歌词获取失败，已跳过", exc_info=True)
+            if result is not None:
+                result.warnings.append("lyrics_fetch")
+
+    if options.lyrics_fallback == "local":
+        return local_text or cache_text
+    if options.lyrics_fallback == "remote":
+        return remote_text or local_text or cache_text
+    # both
+    return local_text or remote_text or cache_text
+
+
+def _resolve_cover(
+    dec: NcmDecoder,
+    meta: dict | None,
+    options: ConvertOptions,
+    logger: logging.Logger,
+    result: ConvertResult,
+) -> bytes | None:
+    cover = dec.get_cover_image()
+    if not options.fetch_cover or (cover and len(cover) >= options.cover_min_bytes):
+        return cover
+    url = (meta or {}).get("album_pic_url")
+    if not url:
+        return cover
+    from .providers.cover import shared_fetcher
+
+    try:
+        fetched = shared_fetcher(options.cover_cache_dir, options.cover_size).get(url)
+    except Exception:
+        logger.warning("在线封面获取失败，使用内嵌封面", exc_info=True)
+        result.warnings.append("cover_fetch")
+        return cover
+    if fetched is None:
+        logger.warning("在线封面不可用，使用内嵌封面: %s", url)
+        return cover
+    result.cover_source = "remote"
+    return fetched
+
+
+def _write_artifacts(
+    dec: NcmDecoder,
+    stem: str,
+    rel_dir: PurePosixPath,
+    out_rel: PurePosixPath,
+    sink: OutputSink,
+    options: ConvertOptions,
+    logger: logging.Logger,
+    result: ConvertResult,
+) -> None:
+    # 本地输出时的音频路径（归档输出为 None）
+    out_file = sink.local_path(out_rel)
+    meta = result.meta
+    # optional: print meta and export cover
+    if options.meta:
+        logger.info("meta: %s", meta)
+    need_cover = (options.cover and not options.no_cover_file) or (options.write_meta and options.embed_cover)
+    cover = _resolve_cover(dec, meta, options, logger, result) if need_cover else None
+    if options.cover and not options.no_cover_file:
+        if cover:
+            cover_rel = rel_dir / (stem + sniff_image_extension(cover, fallback=".bin"))
+            sink.write_bytes(cover_rel, cover)
+            result.artifacts.append(sink.describe(cover_rel))
+    if options.dump_meta and options.meta_writer is not None:
+        from .metadump import meta_record
+
+        options.meta_writer.add(meta_record(result.source, result.output, meta, dec.get_raw_meta()))
+    elif options.dump_meta:
+        import json as _json
+
+        info = {
+            "parsed": meta or {},
+            "raw": dec.get_raw_meta() or {},
+        }
+        meta_rel = rel_dir / (stem + ".meta.json")
+        sink.write_text(meta_rel, _json.dumps(info, ensure_ascii=False, indent=2))
+        result.artifacts.append(sink.describe(meta_rel))
+
+    # Prepare lyrics (fetch/load if needed)
+    lyrics_text = None
+    if options.lyrics or options.fetch_lyrics or options.export_lyrics or options.write_meta:
+        t = time.perf_counter()
+        lyrics_text = _read_lyrics(dec, meta, stem, out_file, options, logger, result)
+        result.timings["lyrics"] = time.perf_counter() - t
+
+    # Action: Export Lyrics (.lrc)
+    if options.export_lyrics and lyrics_text:
+        lrc_rel = out_rel.with_suffix(".lrc")
+        try:
+            sink.write_text(lrc_rel, lyrics_text)
+            result.artifacts.append(sink.describe(lrc_rel))
+            logger.info("exported lyrics", extra={"source": "memory", "destination": sink.describe(lrc_rel)})
+        except Exception:
+            logger.warning("写入旁车歌词失败，已跳过", exc_info=True)
+
+    # Action: Write Metadata (Tags)
+    if options.write_meta:
+        t = time.perf_counter()
+        try:
+            if out_file is None or not out_file.exists():
+                logger.warning("输出文件不存在，跳过元数据写入: %s", out_file)
+            else:
+                from .meta.writer import write_metadata
+
+                write_metadata(out_file, meta, cover, lyrics_text, logger)
+        except Exception:
+            logger.warning("元数据写入失败", exc_info=True)
+            result.warnings.append("tags")
+        result.timings["tags"] = time.perf_counter() - t
+
+
+# 封面旁车可能的扩展名（与 sniff_image_extension 的结果一致）
+_COVER_EXTS = (".jpg", ".png", ".gif", ".webp", ".bmp", ".bin")
+
+
+def _tags_missing(out_file: Path | None, options: ConvertOptions) -> bool:
+    if out_file is None:
+        return False
+    from .meta.writer import read_tag_state
+
+    state = read_tag_state(out_file)
+    if state is None:
+        return True
+    # 歌词标签只在有歌词来源（显式指定，或输出旁已有 .lrc）时才算缺失，避免无歌词的曲目每次都重写标签
+    has_lyrics_source = bool(options.lyrics or options.fetch_lyrics) or out_file.with_suffix(".lrc").exists()
+    return (
+        not state["title"]
+        or (options.embed_cover and not state["cover"])
+        or (has_lyrics_source and not state["lyrics"])
+    )
+
+
+def _backfill_artifacts(
+    dec: NcmDecoder,
+    stem: str,
+    rel_dir: PurePosixPath,
+    out_rel: PurePosixPath,
+    sink: OutputSink,
+    options: ConvertOptions,
+    logger: logging.Logger,
+    result: ConvertResult,
+) -> None:
+    """--artifacts-only：输出已存在时只补齐缺失的附加产物，音频不重新解密。"""
+    if not sink.exists(out_rel):
+        logger.warning("output missing, skip", extra={"destination": sink.describe(out_rel)})
+        result.status, result.error = "skip", "output missing"
+        return
+    result.output = sink.describe(out_rel)
+    result.meta = dec.get_audio_meta()
+    if options.meta:
+        logger.info("meta: %s", result.meta)
+    todo = {
+        "cover": options.cover
+        and not options.no_cover_file
+        and not any(sink.exists(rel_dir / (stem + e)) for e in _COVER_EXTS),
+        # 聚合写入（jsonl/sqlite）每次运行重新生成，每首都要写入
+        "meta": options.dump_meta
+        and (options.meta_writer is not None or not sink.exists(rel_dir / (stem + ".meta.json"))),
+        "lyrics": options.export_lyrics and not sink.exists(out_rel.with_suffix(".lrc")),
+        "tags": options.write_meta and _tags_missing(sink.local_path(out_rel), options),
+    }
+    result.backfilled = [k for k, v in todo.items() if v]
+    if not result.backfilled:
+        logger.info("artifacts complete, skip", extra={"destination": result.output})
+        result.status, result.error = "skip", "artifacts complete"
+        return
+    # 歌词只在需要导出或写入标签时读取（可能联网）
+    lyrics_needed = todo["lyrics"] or todo["tags"]
+    sub = replace(
+        options,
+        meta=False,
+        cover=todo["cover"],
+        dump_meta=todo["meta"],
+        export_lyrics=todo["lyrics"],
+        write_meta=todo["tags"],
+        lyrics=options.lyrics if lyrics_needed else None,
+        fetch_lyrics=options.fetch_lyrics and lyrics_needed,
+    )
+    try:
+        _write_artifacts(dec, stem, rel_dir, out_rel, sink, sub, logger, result)
+    except Exception as e:
+        logger.error("backfill failed", extra={"source": result.source}, exc_info=True)
+        result.error = str(e)
+        return
+    logger.info("backfilled %s", ", ".join(result.backfilled), extra={"destination": result.output})
+    result.status = "ok"
+
+
+def convert_stream(
+    fp: BinaryIO,
+    stem: str,
+    sink: OutputSink,
+    options: ConvertOptions | None = None,
+    rel_dir: PurePosixPath = PurePosixPath(),
+    source: str | None = None,
+    logger: logging.Logger | None = None,
+    seekable: bool | None = None,
+    size: int | None = None,
+    path: str | Path | None = None,
+) -> ConvertResult:
+    """转换一个已打开的 NCM 流，输出写到 sink 下的 rel_dir/<stem>.<ext>。
+
+    seekable/size 透传给 NcmDecoder：只能前向读取的流（如 tar 成员）需显式传 seekable=False。
+    path：流对应的本地文件；只有给出时才可能分段并行解密（worker 按路径重新打开源文件）。
+    """
+    options = options or ConvertOptions()
+    logger = logger or _LOGGER
+    source = source or stem
+    result = ConvertResult(source=source, status="fail", bytes_in=size if size is not None else _stream_size(fp))
+    t0 = time.perf_counter()
+    try:
+        # 中文注释：分段解密的 worker 按路径重新打开源文件，只对调用方明确给出的可随机访问本地文件启用
+        src = Path(path).absolute() if path is not None and seekable is not False else None
+        _convert(fp, stem, sink, options, rel_dir, logger, seekable, size, result, t0, src)
+    finally:
+        result.timings["total"] = time.perf_counter() - t0
+    return result
+
+
+def _convert(
+    fp: BinaryIO,
+    stem: str,
+    sink: OutputSink,
+    options: ConvertOptions,
+    rel_dir: PurePosixPath,
+    logger: logging.Logger,
+    seekable: bool | None,
+    size: int | None,
+    result: ConvertResult,
+    t0: float,
+    src: Path | None = None,
+) -> None:
+    source = result.source
+    # 中文注释：头部只解析一次，meta/封面/歌词均复用同一个 decoder（兼容只能前向读取的归档成员流）
+    dec = NcmDecoder(fp, logger=logger, seekable=seekable, size=size)
+    try:
+        dec.validate()
+        ext = dec.sniff_audio_ext()
+    except NcmMagicHeaderError:
+        # If suffix matched but header not match, treat as skip.
+        logger.warning("file suffix is .ncm but magic header mismatch, skip: %s", source)
+        result.status, result.error = "skip", "magic header mismatch"
+        return
+    except Exception as e:
+        logger.error("failed to convert", extra={"source": source}, exc_info=True)
+        result.error = str(e)
+        return
+    t1 = time.perf_counter()
+    result.timings["header"] = t1 - t0
+    out_rel = rel_dir / (stem + ext)
+
+    if options.dry_run:
+        logger.info("plan", extra={"source": source, "destination": sink.describe(out_rel)})
+        result.status, result.output = "plan", sink.describe(out_rel)
+        if options.meta:
+            logger.info("meta: %s", dec.get_audio_meta())
+        return
+
+    if options.verify_existing:
+        _verify_existing(dec, out_rel, sink, options, logger, result)
+        result.timings["verify"] = time.perf_counter() - t1
+        return
+
+    if options.artifacts_only:
+        _backfill_artifacts(dec, stem, rel_dir, out_rel, sink, options, logger, result)
+        result.timings["post"] = time.perf_counter() - t1
+        return
+
+    if not options.pipe_to and sink.exists(out_rel) and not options.overwrite:
+        logger.warning("output exists, skip", extra={"destination": sink.describe(out_rel)})
+        result.status, result.output = "skip", sink.describe(out_rel)
+        return
+
+    verifier = None
+    if options.checksum or options.verify_container:
+        from .verify import StreamVerifier
+
+        verifier = StreamVerifier(ext, digest=options.checksum, container=options.verify_container)
+    observers = [verifier] if verifier else None
+    try:
+        if options.pipe_to:
+            written = _pipe_audio(dec, ext, stem, out_rel, sink, options, logger, result, observers)
+        else:
+            written = _write_audio(dec, out_rel, sink, logger, source, observers, options, fp, result, src)
+    except Exception as e:
+        result.error = str(e)
+        return
+    t2 = time.perf_counter()
+    result.timings["decrypt"] = t2 - t1
+    if result.returncode:
+        # 外部命令失败：约定的退出码记为跳过，其余记为失败
+        skip = result.returncode == options.pipe_skip_code
+        result.status, result.error = ("skip" if skip else "fail"), f"exit code {result.returncode}"
+        logger.log(logging.INFO if skip else logging.ERROR, "pipe command exited with %d: %s", result.returncode, source)
+        return
+    result.status, result.bytes = "ok", written
+    result.output = None if options.pipe_to else sink.describe(out_rel)
+    if options.pipe_to:
+        total = dec.audio_size()
+        if total is not None and written < total:
+            # 中文注释：命令提前关闭 stdin，摘要与容器检查只覆盖了开头部分，不能当作整首的结论
+            result.partial = True
+            verifier = None
+            logger.info("pipe command stopped reading after %d of %d bytes: %s", written, total, source)
+
+    if verifier is not None:
+        check = verifier.finish()
+        if check is not None:
+            result.container = {"type": check.container, "ok": check.ok, "detail": check.detail, **check.stats}
+            if not check.ok:
+                logger.warning("container check failed: %s (%s)", sink.describe(out_rel), check.detail)
+        digest = verifier.hexdigest()
+        if digest:
+            result.checksum, result.digest = options.checksum, digest
+        if digest and not options.pipe_to:
+            # 与 sha256sum/b2sum -c 兼容的格式
+            sidecar = out_rel.with_name(f"{out_rel.name}.{options.checksum}")
+            try:
+                sink.write_text(sidecar, f"{digest}  {out_rel.name}\n")
+                result.artifacts.append(sink.describe(sidecar))
+            except Exception:
+                logger.warning("写入校验和旁车失败，已跳过", exc_info=True)
+
+    try:
+        result.meta = dec.get_audio_meta()
+        _write_artifacts(dec, stem, rel_dir, out_rel, sink, options, logger, result)
+    except Exception:
+        # 附加产物失败不影响已完成的解密结果
+        logger.warning("post-processing failed", extra={"source": source}, exc_info=True)
+    result.timings["post"] = time.perf_counter() - t2
+
+
+def convert_file(
+    path: str | Path,
+    options: ConvertOptions | None = None,
+    output: str | Path | OutputSink | None = None,
+    root: str | Path | None = None,
+    logger: logging.Logger | None = None,
+) -> ConvertResult:
+    """转换单个 .ncm 文件。
+
+    output：输出目录/归档路径或 OutputSink；None 时输出到源文件所在目录。
+    root：给定时输出镜像源文件相对 root 的子目录结构。
+    """
+    path = Path(path)
+    logger = logger or _LOGGER
+    sink, owned = _resolve_output(output)
+    if sink is None:
+        sink = DirectorySink(path.parent)
+        rel_dir = PurePosixPath()
+    elif root is not None:
+        try:
+            rel_dir = PurePosixPath(*path.parent.absolute().relative_to(Path(root).absolute()).parts)
+        except ValueError:
+            # 不在 root 之下的文件（如 --from-list 清单中的任意路径）直接输出到输出根目录
+            rel_dir = PurePosixPath()
+    else:
+        rel_dir = PurePosixPath()
+    try:
+        try:
+            fp = path.open("rb")
+        except OSError as e:
+            logger.error("failed to convert", extra={"source": str(path)}, exc_info=True)
+            return ConvertResult(source=str(path), status="fail", error=str(e))
+        with fp:
+            return convert_stream(fp, path.stem, sink, options, rel_dir, str(path), logger, path=path)
+    finally:
+        if owned:
+            sink.close()
+
+
+def convert_many(
+    paths: Iterable[str | Path],
+    options: ConvertOptions | None = None,
+    output: str | Path | OutputSink | None = None,
+    root: str | Path | None = None,
+    executor: Executor | None = None,
+    window: int = 64,
+    logger: logging.Logger | None = None,
+) -> Iterator[ConvertResult]:
+    """批量转换，按完成顺序逐个产出 ConvertResult。
+
+    executor 为 None 时在当前线程依次转换；否则提交到 executor，
+    同时在途的任务数不超过 window（paths 可以是惰性迭代器，不会一次性展开）。
+    提前结束迭代时取消尚未开始的任务，并等待已开始的任务结束。
+    """
+    sink, owned = _resolve_output(output)
+    try:
+        tasks = (functools.partial(convert_file, p, options, sink, root, logger) for p in paths)
+        yield from _run_tasks(tasks, executor, window)
+    finally:
+        if owned and sink is not None:
+            sink.close()
+
+
+def _run_tasks(
+    tasks: Iterable[Callable[[], ConvertResult]],
+    executor: Executor | None,
+    window: int,
+) -> Iterator[ConvertResult]:
+    # convert_many / convert_s3 共用：按完成顺序产出，在途任务数不超过 window
+    pending: set[Future] = set()
+    try:
+        if executor is None:
+            for task in tasks:
+                yield task()
+            return
+        for task in tasks:
+            pending.add(executor.submit(task))
+            if len(pending) >= max(1, window):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+        wait(pending)
+
+
+def convert_archive(
+    archive: str | Path,
+    options: ConvertOptions | None = None,
+    output: str | Path | OutputSink | None = None,
+    logger: logging.Logger | None = None,
+) -> Iterator[ConvertResult]:
+    """按成员顺序流式转换 .zip/.tar/.tar.gz 中的 .ncm，输出镜像成员路径（默认写到归档所在目录）。"""
+    from .archive import iter_ncm_members
+
+    archive = Path(archive)
+    logger = logger or _LOGGER
+    sink, owned = _resolve_output(output)
+    if sink is None:
+        sink = DirectorySink(archive.parent)
+    try:
+        # 中文注释：成员按归档内顺序流式读取，输出目录镜像成员路径
+        for member in iter_ncm_members(archive, logger=logger):
+            yield convert_stream(
+                member.fp,
+                member.path.stem,
+                sink,
+                options,
+                member.path.parent,
+                f"{archive}!{member.path}",
+                logger,
+                seekable=False,
+                size=member.size,
+            )
+    except Exception as e:
+        logger.error("failed to read archive", extra={"source": str(archive)}, exc_info=True)
+        yield ConvertResult(source=str(archive), status="fail", error=str(e))
+    finally:
+        if owned:
+            sink.close()
+
+
+def convert_s3(
+    url: str,
+    options: ConvertOptions | None = None,
+    output: str | Path | OutputSink | None = None,
+    logger: logging.Logger | None = None,
+    executor: Executor | None = None,
+    window: int = 64,
+    client=None,
+) -> Iterator[ConvertResult]:
+    """转换 s3://bucket/prefix 下的全部 .ncm（或单个对象），输出镜像相对前缀的键路径。
+
+    源对象以 Range 请求按需读取：--dry-run / --meta 只取头部。output 为 None 时写回输入所在前缀。
+    executor / window 含义同 convert_many；client 默认按环境变量创建。
+    """
+    from .s3 import S3Client, S3Reader, iter_ncm_objects, parse_s3_url
+
+    logger = logger or _LOGGER
+    bucket, prefix = parse_s3_url(url)
+    # 前缀指向单个对象时以其所在“目录”为镜像根
+    base = prefix.rpartition("/")[0] if prefix.lower().endswith(".ncm") else prefix
+    if output is None:
+        output = f"s3://{bucket}/{base}"
+    sink, owned = _resolve_output(output)
+    own_client = client is None
+    client = client or S3Client.from_env()
+
+    def task(obj) -> ConvertResult:
+        rel = PurePosixPath(obj.key[len(base) + 1:] if base else obj.key)
+        with S3Reader(client, bucket, obj.key, size=obj.size) as fp:
+            return convert_stream(
+                fp, rel.stem, sink, options, rel.parent, f"s3://{bucket}/{obj.key}", logger, seekable=True, size=obj.size
+            )
+
+    try:
+        objects = iter_ncm_objects(client, bucket, prefix)
+        yield from _run_tasks((functools.partial(task, obj) for obj in objects), executor, window)
+    except Exception as e:
+        logger.error("failed to read s3 input", extra={"source": url}, exc_info=True)
+        yield ConvertResult(source=url, status="fail", error=str(e))
+    finally:
+        if owned:
+            sink.close()  # type: ignore[union-attr]
+        if own_client:
+            client.close()
+
+
+__all__ = [
+    "ConvertOptions",
+    "ConvertResult",
+    "convert_stream",
+    "convert_file",
+    "convert_many",
+    "convert_archive",
+    "convert_s3",
+]
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+# 说明：
+# 直接从 zip/tar 归档中流式读取 .ncm 成员，无需先解压到磁盘。
+# - tar（含 .tar.gz/.tgz/.tar.bz2/.tar.xz）以流模式 "r|*" 顺序读取，只前进不回退；
+# - zip 依赖中央目录定位成员，逐个以流方式打开；
+# 成员路径会做安全化处理（去掉绝对路径前缀，拒绝包含 ".." 的成员），用于镜像输出目录。
+
+import logging
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+@dataclass
+class ArchiveMember:
+    # 归档内的相对路径（已安全化）
+    path: PurePosixPath
+    # 成员数据流：仅在迭代到下一个成员之前有效
+    fp: BinaryIO
+    size: int
+
+
+def is_archive(path: str | Path) -> bool:
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _safe_member_path(name: str) -> PurePosixPath | None:
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or any(p == ".." for p in parts):
+        return None
+    # Windows 盘符（如 "C:"）同样视为绝对路径前缀并去掉
+    if parts[0].endswith(":"):
+        parts = parts[1:]
+    return PurePosixPath(*parts) if parts else None
+
+
+def iter_ncm_members(
+    path: str | Path,
+    suffixes: tuple[str, ...] = (".ncm",),
+    logger: logging.Logger | None = None,
+) -> Iterator[ArchiveMember]:
+    """按归档内顺序产出 .ncm 成员；调用方须在取下一个成员前读完当前成员。"""
+    logger = logger or logging.getLogger(__name__)
+    path = Path(path)
+    if path.suffix.lower() == ".zip":
+        import zipfile
+
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(suffixes):
+                    continue
+                rel = _safe_member_path(info.filename)
+                if rel is None:
+                    logger.warning("unsafe archive member, skip: %s", info.filename)
+                    continue
+                with zf.open(info) as fp:
+                    yield ArchiveMember(rel, fp, info.file_size)
+        return
+
+    import tarfile
+
+    with tarfile.open(path, mode="r|*") as tf:
+        for info in tf:
+            if not info.isfile() or not info.name.lower().endswith(suffixes):
+                continue
+            rel = _safe_member_path(info.name)
+            if rel is None:
+                logger.warning("unsafe archive member, skip: %s", info.name)
+                continue
+            fp = tf.extractfile(info)
+            if fp is None:
+                continue
+            with fp:
+                yield ArchiveMember(rel, fp, info.size)
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+# 说明：
+# 曲库目录：只解析 NCM 头部（meta + 嗅探格式），不解密音频，写入 SQLite。
+# - tracks 表以源文件绝对路径为主键，记录 size/mtime_ns，再次构建时未变化的文件直接跳过；
+# - tracks_fts 为 FTS5 外部内容索引（title/artist/album），由触发器与 tracks 保持同步；
+# - 查询结果可以 --paths 输出路径清单，交给 `ming-ncm --from-list -` 只转换选中的文件。
+# 用法：ming-ncm catalog build DIR --db lib.db；ming-ncm catalog query --db lib.db [TEXT] [--artist X] ...
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .ncm.parser import NcmDecoder
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    song_id INTEGER,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    format TEXT,
+    duration_ms INTEGER,
+    bitrate INTEGER,
+    meta_json TEXT,
+    error TEXT,
+    scanned_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tracks_format ON tracks(format);
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+    title, artist, album, content='tracks', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+    INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.rowid, new.title, new.artist, new.album);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+    INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album)
+    VALUES ('delete', old.rowid, old.title, old.artist, old.album);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE ON tracks BEGIN
+    INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album)
+    VALUES ('delete', old.rowid, old.title, old.artist, old.album);
+    INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.rowid, new.title, new.artist, new.album);
+END;
+"""
+
+_COLUMNS = (
+    "path", "size", "mtime_ns", "song_id", "title", "artist", "album",
+    "format", "duration_ms", "bitrate", "meta_json", "error", "scanned_at",
+)
+
+# 每个事务写入的行数
+_BATCH = 500
+
+
+@dataclass
+class CatalogStats:
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    failed: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"目录：新增 {self.added}，更新 {self.updated}，未变 {self.unchanged}，"
+            f"移除 {self.removed}，解析失败 {self.failed}"
+        )
+
+
+def connect(db_path: str | Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _as_int(v) -> int | None:
+    try:
+        return int(v) if v is not None and v != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def read_header(path: Path, size: int, mtime_ns: int) -> dict:
+    """只解析头部，返回 tracks 表的一行（解析失败时 error 非空）。"""
+    row: dict = dict.fromkeys(_COLUMNS)
+    row.update(path=str(path), size=size, mtime_ns=mtime_ns, scanned_at=time.time())
+    try:
+        with path.open("rb") as fp:
+            dec = NcmDecoder(fp)
+            dec.validate()
+            row["format"] = dec.sniff_audio_ext().lstrip(".")
+            meta = dec.get_audio_meta() or {}
+            raw = dec.get_raw_meta() or {}
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+        return row
+    row.update(
+        song_id=_as_int(meta.get("song_id")),
+        title=meta.get("title") or None,
+        artist=" / ".join(meta.get("artists") or []) or None,
+        album=meta.get("album") or None,
+        duration_ms=_as_int(raw.get("duration")),
+        bitrate=_as_int(raw.get("bitrate")),
+        meta_json=json.dumps(raw, ensure_ascii=False) if raw else None,
+    )
+    return row
+
+
+def build_catalog(
+    db_path: str | Path,
+    paths: Iterable[Path],
+    workers: int = 4,
+    prune_under: str | Path | None = None,
+    logger: logging.Logger | None = None,
+) -> CatalogStats:
+    """增量构建：按 path + size + mtime_ns 判断是否需要重新解析。
+
+    prune_under：给定目录时，删除库中位于该目录下、但本次未出现的记录（源文件已删除）。
+    """
+    logger = logger or logging.getLogger(__name__)
+    stats = CatalogStats()
+    conn = connect(db_path)
+    try:
+        known = {r["path"]: (r["size"], r["mtime_ns"]) for r in conn.execute("SELECT path, size, mtime_ns FROM tracks")}
+        seen: set[str] = set()
+
+        def todo() -> Iterator[tuple[Path, int, int]]:
+            for p in paths:
+                p = Path(p).absolute()
+                key = str(p)
+                seen.add(key)
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                if known.get(key) == (st.st_size, st.st_mtime_ns):
+                    stats.unchanged += 1
+                    continue
+                yield p, st.st_size, st.st_mtime_ns
+
+        # 用 UPSERT 而非 INSERT OR REPLACE：REPLACE 的隐式删除不触发删除触发器，FTS 索引会残留旧内容
+        sql = (
+            f"INSERT INTO tracks ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)}) "
+            f"ON CONFLICT(path) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in _COLUMNS[1:])}"
+        )
+        pending: list[tuple] = []
+
+        def flush() -> None:
+            with conn:
+                conn.executemany(sql, pending)
+            pending.clear()
+
+        # 中文注释：头部解析在线程池中并行，SQLite 写入只在当前线程批量提交
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ncmdc-catalog") as ex:
+            for row in ex.map(lambda t: read_header(*t), todo()):
+                if row["path"] in known:
+                    stats.updated += 1
+                else:
+                    stats.added += 1
+                if row["error"]:
+                    stats.failed += 1
+                    logger.warning("header parse failed: %s (%s)", row["path"], row["error"])
+                pending.append(tuple(row[c] for c in _COLUMNS))
+                if len(pending) >= _BATCH:
+                    flush()
+        if pending:
+            flush()
+
+        if prune_under is not None:
+            root = Path(prune_under).absolute()
+            gone = [p for p in known if p not in seen and Path(p).is_relative_to(root)]
+            with conn:
+                conn.executemany("DELETE FROM tracks WHERE path = ?", [(p,) for p in gone])
+            stats.removed = len(gone)
+    finally:
+        conn.close()
+    return stats
+
+
+def _fts_query(text: str) -> str:
+    # 每个词按短语加引号，避免用户输入被当作 FTS5 语法（AND/OR/NEAR/列过滤等）
+    return " ".join('"' + tok.replace('"', '""') + '"' for tok in text.split())
+
+
+def query_catalog(
+    db_path: str | Path,
+    text: str | None = None,
+    title: str | None = None,
+    artist: str | None = None,
+    album: str | None = None,
+    fmt: str | None = None,
+    limit: int | None = None,
+) -> list[dict]:
+    """全文检索 + 字段过滤。title/artist/album 为子串匹配（不依赖分词，中文同样适用），fmt 为精确匹配。"""
+    where: list[str] = ["t.error IS NULL"]
+    params: list = []
+    if text and text.split():
+        where.append("t.rowid IN (SELECT rowid FROM tracks_fts WHERE tracks_fts MATCH ?)")
+        params.append(_fts_query(text))
+    for col, value in (("title", title), ("artist", artist), ("album", album)):
+        if value:
+            where.append(f"t.{col} LIKE ? ESCAPE '\\'")
+            params.append("%" + value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    if fmt:
+        where.append("t.format = ?")
+        params.append(fmt.lower().lstrip("."))
+    sql = (
+        "SELECT t.path, t.song_id, t.title, t.artist, t.album, t.format, t.duration_ms, t.bitrate, t.size "
+        f"FROM tracks t WHERE {' AND '.join(where)} ORDER BY t.artist, t.album, t.title, t.path"
+    )
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    conn = connect(db_path)
+    try:
+        return [dict(r) for r in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="ming-ncm catalog", description="曲库目录：只解析 NCM 头部，建立可检索的 SQLite 索引")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    b = sub.add_parser("build", help="build：扫描目录并增量更新目录库")
+    b.add_argument("input", metavar="DIR", help="input：要扫描的目录")
+    b.add_argument("--db", required=True, help="db：SQLite 目录库文件")
+    b.add_argument("--workers", type=int, default=4, help="workers：并发解析头部的线程数")
+    b.add_argument("--include", action="append", metavar="GLOB", help="include：仅收录匹配的文件（可多次指定）")
+    b.add_argument("--exclude", action="append", metavar="GLOB", help="exclude：排除匹配的文件/目录（可多次指定）")
+    b.add_argument("--no-prune", action="store_true", help="no-prune：保留库中已不存在的源文件记录")
+
+    q = sub.add_parser("query", help="query：检索目录库")
+    q.add_argument("text", nargs="?", default=None, help="text：全文检索（标题/艺人/专辑）")
+    q.add_argument("--db", required=True, help="db：SQLite 目录库文件")
+    q.add_argument("--title", default=None, help="title：标题包含")
+    q.add_argument("--artist", default=None, help="artist：艺人包含")
+    q.add_argument("--album", default=None, help="album：专辑包含")
+    q.add_argument("--format", dest="fmt", default=None, help="format：音频格式（flac/mp3/...）")
+    q.add_argument("--limit", type=int, default=None, help="limit：最多返回条数")
+    out = q.add_mutually_exclusive_group()
+    out.add_argument("--paths", action="store_true", help="paths：只输出源文件路径（可交给 --from-list -）")
+    out.add_argument("--json", action="store_true", help="json：每行输出一条 JSON")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    logger = logging.getLogger("ncmdc")
+    if args.command == "build":
+        root = Path(args.input)
+        if not root.is_dir():
+            logger.error("input should be a directory: %s", str(root))
+            return 2
+        from .scan import scan_tree
+
+        paths = scan_tree(root, include=args.include or (), exclude=args.exclude or ())
+        stats = build_catalog(
+            args.db, paths, workers=args.workers, prune_under=None if args.no_prune else root, logger=logger
+        )
+        print(stats.summary())
+        return 0
+
+    rows = query_catalog(args.db, args.text, args.title, args.artist, args.album, args.fmt, args.limit)
+    for r in rows:
+        if args.paths:
+            print(r["path"])
+        elif args.json:
+            print(json.dumps(r, ensure_ascii=False))
+        else:
+            print("\t".join(str(r[k] or "") for k in ("artist", "title", "album", "format", "path")))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
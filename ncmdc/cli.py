@@ -1,16 +1,24 @@
 from __future__ import annotations
 
 import argparse
+import dataclasses
 import logging
-import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
 
-from .ncm.parser import NcmDecoder, NcmMagicHeaderError
-from .sniff.image import sniff_image_extension
-from .meta.writer import write_metadata
-from .providers.netease import fetch_lyrics_by_song_id, merge_lyrics
-from .providers.local_lyric import fetch_local_lyrics, detect_default_dirs
+from .api import ConvertOptions, ConvertResult, convert_archive, convert_file, convert_many
+from .archive import is_archive
+from .logqueue import LogPipeline
+from .output import DirectorySink, OutputSink, is_archive_output, is_s3_url, open_output
+from .progress import Progress, summary_line
+
+if TYPE_CHECKING:
+    from .inplace import InPlaceConverter
+    from .metrics import ConversionMetrics
 
 BANNER = r"""
 
@@ -44,44 +52,60 @@ def _match_lyrics(file_path: Path, out_file: Path, lyrics_arg: str | None) -> st
         return cand.read_text(encoding="utf-8", errors="ignore")
     return None
 
-def _process_file(src: Path, dst_root: Path, overwrite: bool, logger: logging.Logger) -> tuple[Path | None, int]:
-    try:
-        with src.open("rb") as fp:
-            dec = NcmDecoder(fp, logger=logger)
-            dec.validate()
-            ext = dec.sniff_audio_ext()
-            # compute output dir relative to input root later in main
-            out_dir = dst_root
-            out_dir.mkdir(parents=True, exist_ok=True)
-            out_file = out_dir / (src.stem + ext)
-
-            if out_file.exists() and not overwrite:
-                logger.warning("output exists, skip", extra={"destination": str(out_file)})
-                return None, 0
-
-            with out_file.open("wb") as out:
-                dec.stream_decrypt(out)
-            size = out_file.stat().st_size if out_file.exists() else 0
-            logger.info("converted", extra={"source": str(src), "destination": str(out_file)})
-            return out_file, size
-    except NcmMagicHeaderError:
-        # not an ncm file when probed in bulk; ignore silently here
-        raise
-    except Exception:
-        logger.error("failed to convert", extra={"source": str(src)}, exc_info=True)
-        raise
-
-
-def main(argv: list[str] | None = None) -> int:
-    argv = sys.argv[1:] if argv is None else argv
-
+@dataclass
+class _RunStats:
+    processed_any: bool = False
+    num_ok: int = 0
+    num_skip: int = 0
+    num_fail: int = 0
+    bytes_out: int = 0
+    # 逐文件记录（仅在需要输出运行报告时收集）
+    entries: list[dict] | None = None
+    # 中文注释：watch/多 worker 模式下由多个线程同时累加
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, result: ConvertResult) -> None:
+        with self._lock:
+            self.processed_any = True
+            if result.status == "ok":
+                self.num_ok += 1
+                self.bytes_out += result.bytes
+            elif result.status == "skip":
+                self.num_skip += 1
+            elif result.status == "fail":
+                self.num_fail += 1
+            if self.entries is not None and result.status != "plan":
+                self.entries.append(result.to_dict())
+
+
+@dataclass
+class _Run:
+    args: argparse.Namespace
+    logger: logging.Logger
+    stats: _RunStats
+    # None：输出到各源文件所在目录（--from-list 且未指定 -o/-i）
+    sink: OutputSink | None
+    options: ConvertOptions
+    input_dir: Path | None
+    progress: Progress | None = None
+    # (INDEX, COUNT)：只处理属于本分片的文件
+    shard: tuple[int, int] | None = None
+    # 进度模式下预先统计的输入大小（源路径 → 字节）
+    input_sizes: dict[str, int] = field(default_factory=dict)
+    # --metrics-listen / --metrics-textfile 时的实时指标
+    metrics: ConversionMetrics | None = None
+    # --in-place 时逐个转换并移除源文件（ncmdc.inplace.InPlaceConverter）
+    in_place: InPlaceConverter | None = None
+
+
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog="ming-ncm",
         description="Decrypt NCM to playable audio（NCM 解密为可播放音频，no re-encode）",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
-    parser.add_argument("-i", "--input", help="input：输入文件或目录", default=None, metavar="PATH")
-    parser.add_argument("-o", "--output", help="output：输出目录", default=None, metavar="DIR")
+    parser.add_argument("-i", "--input", help="input：输入文件、目录或 .zip/.tar/.tar.gz 归档；s3://bucket/prefix 表示读取对象存储中的 .ncm", default=None, metavar="PATH|s3://BUCKET/PREFIX")
+    parser.add_argument("-o", "--output", help="output：输出目录；或 .tar/.tar.gz/.zip 归档文件，'-' 表示以 tar 流写到 stdout，s3://bucket/prefix 表示上传到 S3 兼容对象存储", default=None, metavar="DIR|ARCHIVE|-|s3://BUCKET/PREFIX")
     parser.add_argument("--overwrite", action="store_true", help="overwrite：若目标已存在则覆盖")
     parser.add_argument("--dry-run", action="store_true", help="dry-run：仅扫描与预览输出结果，不实际写入")
     parser.add_argument("--quiet", action="store_true", help="quiet：减少日志输出")
@@ -96,6 +120,8 @@ def main(argv: list[str] | None = None) -> int:
     parser.add_argument("--cookie", help="cookie：Netease 登录 Cookie（可选）", default=None)
     parser.add_argument("--lyric-cache-dir", help="lyric-cache-dir：本地歌词缓存目录（默认自动探测）", default=None)
     parser.add_argument("--dump-meta", action="store_true", help="dump-meta：将每首 meta 输出为旁车 JSON")
+    parser.add_argument("--dump-meta-format", choices=["json", "jsonl", "sqlite"], default="json", help="dump-meta-format：json 每首一个 .meta.json；jsonl/sqlite 整次运行聚合为一个文件（隐含 --dump-meta）")
+    parser.add_argument("--dump-meta-file", default=None, help="dump-meta-file：聚合 meta 的输出文件（默认输出目录下 ncm-meta.jsonl / ncm-meta.sqlite）")
     parser.add_argument("--export-lyrics", action="store_true", help="export-lyrics：将找到的歌词旁车保存为 .lrc 文件")
     parser.add_argument(
         "--lyrics-fallback",
@@ -103,211 +129,576 @@ def main(argv: list[str] | None = None) -> int:
         default="both",
         help="lyrics-fallback：歌词来源优先级（local/remote/both）",
     )
+    parser.add_argument("--watch", action="store_true", help="watch：常驻监听输入目录，自动转换新增/变更的 .ncm")
+    parser.add_argument("--watch-interval", type=float, default=2.0, help="watch-interval：轮询间隔（秒）")
+    parser.add_argument("--watch-settle", type=float, default=3.0, help="watch-settle：文件大小/mtime 稳定多久后才转换（秒）")
+    parser.add_argument("--workers", type=int, default=1, help="workers：并发转换的工作线程数")
+    parser.add_argument("--queue-size", type=int, default=64, help="queue-size：watch 模式下待转换队列上限（满则背压）")
+    parser.add_argument("--include", action="append", metavar="GLOB", help="include：仅处理匹配的文件（文件名或相对路径通配，可多次指定）")
+    parser.add_argument("--exclude", action="append", metavar="GLOB", help="exclude：排除匹配的文件/目录（可多次指定）")
+    parser.add_argument("--max-depth", type=int, default=None, help="max-depth：目录递归最大深度（0 仅输入目录本层）")
+    parser.add_argument("--scan-workers", type=int, default=8, help="scan-workers：并发列举目录的线程数")
+    parser.add_argument(
+        "--schedule",
+        choices=("stream", "size"),
+        default="stream",
+        help="schedule：stream 边扫边转；size 先统计全部大小，按从大到小派发",
+    )
+    parser.add_argument("--max-inflight-mb", type=int, default=None, help="max-inflight-mb：size 调度下同时在途的输入总量上限（MB）")
+    parser.add_argument(
+        "--checksum",
+        choices=("sha256", "blake2b"),
+        default=None,
+        help="checksum：解密同时计算输出摘要，写入 <输出>.<算法> 旁车（sha256sum/b2sum -c 兼容）",
+    )
+    parser.add_argument("--verify-container", action="store_true", help="verify-container：解密同时做轻量容器检查（FLAC/MP3/MP4）")
+    parser.add_argument(
+        "--verify-existing",
+        action="store_true",
+        help="verify-existing：不转换，抽样核验已有输出与源文件是否一致（长度 + 首尾块 + 随机区间）",
+    )
+    parser.add_argument(
+        "--artifacts-only",
+        action="store_true",
+        help="artifacts-only：不重新解密，只解析头部并为已存在的输出补齐缺失的封面/meta/歌词/标签",
+    )
+    parser.add_argument("--in-place", action="store_true", help="in-place：逐个文件转换 → 核验 → 删除（或归档）源文件，磁盘接近写满时使用")
+    parser.add_argument("--min-free-mb", type=int, default=1024, help="min-free-mb：就地模式下输出所在磁盘须保留的剩余空间（MB），不足时跳过该文件")
+    parser.add_argument("--archive-sources", default=None, metavar="DIR", help="archive-sources：就地模式下把源文件移到该目录（保留相对路径）而不是删除")
+    parser.add_argument("--journal", default=None, metavar="FILE", help="journal：就地模式的恢复日志（默认输出目录下的 .ncmdc-inplace.journal）")
+    parser.add_argument("--verify-samples", type=int, default=8, help="verify-samples：每个文件随机抽样的区间数")
+    parser.add_argument("--verify-block-kb", type=int, default=64, help="verify-block-kb：每个抽样区间大小（KB）")
+    parser.add_argument("--report", default=None, metavar="FILE", help="report：将逐文件结果与汇总写入 JSON 运行报告")
+    parser.add_argument("--progress", action="store_true", help="progress：预先统计输入总量，在 stderr 显示已完成文件数、MB/s 与剩余时间")
+    parser.add_argument("--log-file", default=None, metavar="FILE", help="log-file：日志同时写入文件（后台线程写出，不阻塞转换）")
+    parser.add_argument("--from-list", default=None, metavar="FILE", help="from-list：按清单转换（每行一个 .ncm 路径，'-' 为 stdin，可接 catalog query --paths）")
+    parser.add_argument("--shard", default=None, metavar="INDEX/COUNT", help="shard：多机分片，只处理第 INDEX 份（从 1 开始，共 COUNT 份）")
+    parser.add_argument(
+        "--shard-by",
+        choices=("hash", "size"),
+        default="hash",
+        help="shard-by：hash 按相对路径稳定哈希（边扫边分）；size 统计全部大小后按字节均衡分配",
+    )
+    parser.add_argument(
+        "--pipe-to",
+        default=None,
+        metavar="CMD",
+        help="pipe-to：解密结果写入该命令的 stdin，不落输出文件；支持 {ext} {stem} {title} 等占位符与 NCMDC_* 环境变量",
+    )
+    parser.add_argument("--pipe-skip-code", type=int, default=None, metavar="N", help="pipe-skip-code：外部命令以该退出码结束时记为跳过")
+    parser.add_argument("--fetch-cover", action="store_true", help="fetch-cover：内嵌封面缺失或过小时按 album_pic_url 在线下载（供 --cover/--embed-cover 使用）")
+    parser.add_argument("--cover-size", type=int, default=500, help="cover-size：在线封面尺寸（像素，附加 ?param=NyN）")
+    parser.add_argument("--cover-min-bytes", type=int, default=2048, help="cover-min-bytes：内嵌封面小于该字节数时视为过小")
+    parser.add_argument("--cover-cache-dir", default=None, help="cover-cache-dir：在线封面缓存目录（按 URL 与内容哈希去重，跨运行复用）")
+    parser.add_argument("--split-threshold-mb", type=int, default=512, help="split-threshold-mb：音频不小于该值（MB）时分段并行解密（0 关闭）")
+    parser.add_argument("--split-workers", type=int, default=None, help="split-workers：分段解密的并发数（默认 CPU 核数，同一进程内共享）")
+    parser.add_argument("--split-backend", choices=["process", "thread"], default="process", help="split-backend：分段解密后端（process 可用满多核；thread 仅在解密不占 GIL 时有效）")
+    parser.add_argument("--io-hints", action="store_true", help="io-hints：输入顺序预读、读写过的区间释放页缓存、输出按最终大小预分配（posix_fadvise/posix_fallocate）")
+    parser.add_argument("--aligned-buffers", action="store_true", help="aligned-buffers：解密循环复用页对齐缓冲（readinto），不逐块分配")
+    parser.add_argument("--chunk-size", type=_chunk_size_arg, default="256K", metavar="auto|SIZE", help="chunk-size：解密块大小（默认固定 256K，可写如 1M）；auto 为按实测吞吐在内存上限内自适应")
+    parser.add_argument("--chunk-max", type=_size_arg, default=4 * 1024 * 1024, metavar="SIZE", help="chunk-max：自适应块大小的上限（每个 worker 同时只持有一块，默认 4M）")
+    parser.add_argument("--metrics-listen", default=None, metavar="[HOST:]PORT", help="metrics-listen：在本地 HTTP 端点 /metrics 暴露实时指标（Prometheus 文本格式，默认仅 127.0.0.1）")
+    parser.add_argument("--metrics-textfile", default=None, metavar="FILE", help="metrics-textfile：定期原子重写指标文件（node-exporter textfile collector）")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="metrics-interval：指标文件重写间隔（秒）")
+    parser.add_argument("--s3-part-size", type=_size_arg, default=8 * 1024 * 1024, metavar="SIZE", help="s3-part-size：S3 输出的 multipart 分片大小（不小于 5M，默认 8M）")
+    parser.add_argument("--s3-inflight", type=int, default=4, help="s3-inflight：S3 输出时每个文件同时在途（缓冲/上传中）的分片数上限")
+    parser.add_argument("--batch-small-kb", type=int, default=1024, help="batch-small-kb：size 调度下小于该值的文件合并为一个任务（KB）")
+    return parser
+
+
+def _chunk_size_arg(text: str) -> int | None:
+    from .ncm.chunking import parse_chunk_size
+
+    try:
+        return parse_chunk_size(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _size_arg(text: str) -> int:
+    from .ncm.chunking import parse_size
+
+    try:
+        return parse_size(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _open_sink(args: argparse.Namespace) -> OutputSink:
+    if not is_s3_url(args.output):
+        return open_output(args.output)
+    from .s3 import MIN_PART_SIZE, S3Sink
+
+    if args.s3_part_size < MIN_PART_SIZE:
+        raise ValueError("--s3-part-size must be at least 5M")
+    inflight = max(1, args.s3_inflight)
+    # 上传线程数：每个转换 worker 都能让自己的在途分片同时上传
+    return S3Sink.from_url(
+        args.output,
+        part_size=args.s3_part_size,
+        max_inflight=inflight,
+        upload_workers=inflight * max(1, args.workers),
+    )
+
+
+def _print_summary(stats: _RunStats, logger: logging.Logger, file=None) -> None:
+    if not stats.processed_any:
+        logger.info("no .ncm files processed")
+    else:
+        print(summary_line(stats.num_ok, stats.num_skip, stats.num_fail, stats.bytes_out), file=file)
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "catalog":
+        # 子命令：ming-ncm catalog build/query
+        from .catalog import main as catalog_main
+
+        return catalog_main(argv[1:])
+    if argv and argv[0] == "merge-reports":
+        from .shard import main as merge_main
+
+        return merge_main(argv[1:])
+    if argv and argv[0] in ("daemon", "submit"):
+        # 子命令：常驻转换服务及其客户端
+        from .daemon import main_daemon, main_submit
+
+        return (main_daemon if argv[0] == "daemon" else main_submit)(argv[1:])
+
+    parser = _build_parser()
     args = parser.parse_args(argv)
 
-    logging.basicConfig(level=(logging.WARNING if args.quiet else logging.INFO), format="%(levelname)s %(message)s")
-    logger = logging.getLogger("ncmdc")
+    # 中文注释：日志经队列交给后台线程输出；进度模式下逐文件 info 日志会淹没进度行，只保留告警
+    level = logging.WARNING if args.quiet or args.progress else logging.INFO
+    progress = Progress(sys.stderr) if args.progress else None
+    pipeline = LogPipeline(level, log_file=args.log_file, progress=progress).start()
+    try:
+        return _main(args, logging.getLogger("ncmdc"), progress)
+    finally:
+        if progress is not None:
+            progress.close()
+        pipeline.stop()
+
 
+def _main(args: argparse.Namespace, logger: logging.Logger, progress: Progress | None) -> int:
+    to_stdout = args.output == "-"
     if not args.quiet and not args.no_banner:
-        # 启动横幅（艺术字），仅在非静默模式下显示
-        print(BANNER)
+        # 启动横幅（艺术字），仅在非静默模式下显示；stdout 被 tar 流占用时改写到 stderr
+        print(BANNER, file=sys.stderr if to_stdout else sys.stdout)
 
     cwd = Path.cwd()
-    input_path = Path(args.input) if args.input else cwd
-    if not input_path.exists():
-        logger.error("input not found: %s", str(input_path))
+    input_path: Path | None
+    if args.input and is_s3_url(args.input):
+        # 对象存储输入：没有本地目录树可监听/分片，抽样核验也需要本地输出
+        if args.watch or args.from_list or args.shard or args.verify_existing:
+            logger.error("s3 input cannot be combined with --watch, --from-list, --shard or --verify-existing")
+            return 2
+        if not args.output:
+            # 与本地输入一致：默认输出到输入所在位置（同一前缀）
+            prefix = args.input.rstrip("/")
+            args.output = prefix.rpartition("/")[0] if prefix.lower().endswith(".ncm") else prefix
+        input_path = input_dir = None
+    else:
+        input_path = Path(args.input) if args.input else cwd
+        if not input_path.exists():
+            logger.error("input not found: %s", str(input_path))
+            return 2
+        input_dir = input_path if input_path.is_dir() else input_path.parent
+
+    if args.from_list:
+        if args.watch:
+            logger.error("--watch cannot be combined with --from-list")
+            return 2
+        # 清单模式下 -i 只作为镜像子目录的根；未给出时输出到 -o 根目录（或源文件旁）
+        input_dir = input_path if args.input and input_path.is_dir() else None
+
+    shard = None
+    if args.shard:
+        from .shard import parse_shard
+
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            logger.error("%s", e)
+            return 2
+        if args.watch or not (args.from_list or input_path.is_dir()):
+            logger.error("--shard requires a directory or --from-list input (without --watch)")
+            return 2
+
+    if args.pipe_to:
+        from .pipe import check_template
+
+        try:
+            check_template(args.pipe_to)
+        except ValueError as e:
+            logger.error("%s", e)
+            return 2
+        if args.write_meta or args.verify_existing or args.artifacts_only or to_stdout:
+            # 管道模式不产生本地音频文件，子进程的 stdout 也不能与 tar 流混写
+            logger.error("--pipe-to cannot be combined with --write-meta, --verify-existing, --artifacts-only or -o -")
+            return 2
+
+    if args.metrics_listen:
+        from .metrics import parse_listen
+
+        try:
+            parse_listen(args.metrics_listen)
+        except ValueError as e:
+            logger.error("%s", e)
+            return 2
+
+    if args.watch and not input_path.is_dir():
+        logger.error("--watch requires an input directory: %s", str(input_path))
         return 2
 
-    if input_path.is_dir():
-        input_dir = input_path
-    else:
-        input_dir = input_path.parent
+    if args.verify_existing and input_path.is_file() and is_archive(input_path):
+        # 抽样核验需要随机读取源文件
+        logger.error("--verify-existing does not support archive inputs")
+        return 2
 
-    output_dir = Path(args.output) if args.output else input_dir
-    if output_dir.exists() and not output_dir.is_dir():
-        logger.error("output should be a directory: %s", str(output_dir))
+    if args.in_place:
+        if args.watch or args.pipe_to or args.dry_run or args.verify_existing or args.artifacts_only:
+            logger.error("--in-place cannot be combined with --watch, --pipe-to, --dry-run, --verify-existing or --artifacts-only")
+            return 2
+        if input_path is None or (input_path.is_file() and is_archive(input_path)):
+            # 需要随机读取本地源文件做核验，并在之后删除它
+            logger.error("--in-place requires a local .ncm file or directory input")
+            return 2
+        if (args.output and (is_archive_output(args.output) or is_s3_url(args.output))) or (
+            not args.output and input_dir is None
+        ):
+            logger.error("--in-place requires a directory output")
+            return 2
+
+    if args.artifacts_only and args.output and is_archive_output(args.output):
+        # 归档输出每次都是新建的，不存在可补齐的已有输出
+        logger.error("--artifacts-only requires a directory or s3 output")
         return 2
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    processed_any = False
-    num_ok = 0
-    num_skip = 0
-    num_fail = 0
-    bytes_out = 0
-
-    def _human_bytes(n: int) -> str:
-        units = ["B", "KB", "MB", "GB"]
-        v = float(n)
-        for u in units:
-            if v < 1024 or u == units[-1]:
-                return f"{v:.2f} {u}"
-            v /= 1024
-        # 显式返回（静态分析友好）
-        return f"{v:.2f} {units[-1]}"
-
-    def handle_one(file_path: Path):
-        nonlocal processed_any, num_ok, num_skip, num_fail, bytes_out
-        # only process .ncm (case-insensitive)
-        if file_path.suffix.lower() != ".ncm":
-            return
-        processed_any = True
-        # compute relative dir
-        rel_dir = file_path.parent.relative_to(input_dir)
-        dst_root = output_dir / rel_dir
-        try:
-            if args.dry_run:
-                with file_path.open("rb") as fp:
-                    dec = NcmDecoder(fp, logger=logger)
-                    dec.validate()
-                    ext = dec.sniff_audio_ext()
-                    out_file = (dst_root / (file_path.stem + ext))
-                    logger.info("plan", extra={"source": str(file_path), "destination": str(out_file)})
-                    if args.meta:
-                        logger.info("meta: %s", dec.get_audio_meta())
-                return
 
+    if args.output and (is_archive_output(args.output) or is_s3_url(args.output)):
+        if args.verify_existing:
+            logger.error("--verify-existing requires a directory output")
+            return 2
+        if args.write_meta:
+            # mutagen 需要可随机读写的本地文件，归档/流式输出无法原地写标签
+            logger.error("--write-meta requires a directory output")
+            return 2
+        try:
+            sink = _open_sink(args)
+        except ValueError as e:
+            logger.error("%s", e)
+            return 2
+    elif not args.output and input_dir is None:
+        sink = None
+    else:
+        output_dir = Path(args.output) if args.output else input_dir
+        if output_dir.exists() and not output_dir.is_dir():
+            logger.error("output should be a directory: %s", str(output_dir))
+            return 2
+        output_dir.mkdir(parents=True, exist_ok=True)
+        sink = DirectorySink(output_dir)
+
+    options = ConvertOptions.from_namespace(args)
+    meta_writer = None
+    if args.dump_meta_format != "json" and not args.dry_run and not args.verify_existing:
+        from .metadump import DEFAULT_FILENAMES, open_meta_writer
+
+        if args.dump_meta_file:
+            meta_path = Path(args.dump_meta_file)
+        elif isinstance(sink, DirectorySink):
+            meta_path = sink.root / DEFAULT_FILENAMES[args.dump_meta_format]
+        elif sink is None:
+            meta_path = cwd / DEFAULT_FILENAMES[args.dump_meta_format]
+        else:
+            sink.close()
+            logger.error("--dump-meta-format %s with archive or s3 output requires --dump-meta-file", args.dump_meta_format)
+            return 2
+        meta_writer = open_meta_writer(args.dump_meta_format, meta_path)
+        options = dataclasses.replace(options, dump_meta=True, meta_writer=meta_writer)
+
+    tuner = None
+    if args.chunk_size is None:
+        from .ncm.chunking import ChunkTuner
+
+        tuner = ChunkTuner(max_chunk=args.chunk_max)
+        options = dataclasses.replace(options, chunk_tuner=tuner)
+
+    stats = _RunStats(entries=[] if args.report else None)
+    run = _Run(args, logger, stats, sink, options, input_dir, progress, shard)
+
+    journal = None
+    if args.in_place:
+        from .inplace import DEFAULT_JOURNAL, InPlaceConverter, Journal
+
+        journal = Journal(args.journal or sink.root / DEFAULT_JOURNAL)  # type: ignore[union-attr]
+        run.in_place = InPlaceConverter(
+            options,
+            sink,  # type: ignore[arg-type]
+            journal,
+            root=input_dir,
+            min_free=args.min_free_mb * 1024 * 1024,
+            archive_dir=Path(args.archive_sources) if args.archive_sources else None,
+            logger=logger,
+        )
+        recovered = run.in_place.recover()
+        if recovered:
+            logger.warning("in-place: recovered %d interrupted entries from %s", recovered, str(journal.path))
+
+    exporters: list = []
+    try:
+        if args.metrics_listen or args.metrics_textfile:
             try:
-                out_file, size = _process_file(file_path, dst_root, args.overwrite, logger)
-                if out_file is None:
-                    num_skip += 1
-                    return
-                bytes_out += size
-                num_ok += 1
-            except Exception:
-                num_fail += 1
-                return
-
-            # optional: print meta and export cover
-            if args.meta or args.cover or args.dump_meta:
-                with file_path.open("rb") as fp:
-                    dec = NcmDecoder(fp, logger=logger)
-                    dec.validate()
-                    if args.meta:
-                        logger.info("meta: %s", dec.get_audio_meta())
-                    if args.cover and not args.no_cover_file:
-                        cover = dec.get_cover_image()
-                        if cover:
-                            ext_img = sniff_image_extension(cover, fallback=".bin")
-                            (dst_root).mkdir(parents=True, exist_ok=True)
-                            (dst_root / (file_path.stem + ext_img)).write_bytes(cover)
-                    if args.dump_meta:
-                        import json as _json
-                        info = {
-                            "parsed": dec.get_audio_meta() or {},
-                            "raw": dec.get_raw_meta() or {},
-                        }
-                        (dst_root).mkdir(parents=True, exist_ok=True)
-                        (dst_root / (file_path.stem + ".meta.json")).write_text(
-                            _json.dumps(info, ensure_ascii=False, indent=2), encoding="utf-8"
-                        )
-
-            # Prepare lyrics (fetch/load if needed)
-            lyrics_text = None
-            
-            # 1. Load Local
-            local_text = None
-            if args.lyrics:
-                lyr_path = Path(args.lyrics)
-                if lyr_path.is_dir():
-                    cand = lyr_path / (file_path.stem + ".lrc")
-                    if cand.exists():
-                        local_text = cand.read_text(encoding="utf-8", errors="ignore")
-                elif lyr_path.is_file():
-                    local_text = lyr_path.read_text(encoding="utf-8", errors="ignore")
-            else:
-                cand = out_file.with_suffix(".lrc")
-                if cand.exists():
-                    local_text = cand.read_text(encoding="utf-8", errors="ignore")
-
-            # 2. Load Cache
-            cache_text = None
-            # Meta might be needed for cache search
-            # We need to peek meta if not already loaded (dec was closed above)
-            # But wait, we can't get meta efficiently without reading the file.
-            # In the original code, `dec` was opened inside `write_meta`.
-            # We should open file once for both ops if possible, or re-open.
-            
-            # To avoid complex refactoring, let's open file slightly earlier if we need lyrics
-            should_fetch_lyrics = args.lyrics or args.fetch_lyrics or args.export_lyrics or args.write_meta
-            
-            meta = None
-            cover = None
-            
-            if should_fetch_lyrics or args.write_meta:
-                with file_path.open("rb") as fp:
-                    dec = NcmDecoder(fp, logger=logger)
-                    dec.validate()
-                    meta = dec.get_audio_meta()
-                    if args.write_meta and args.embed_cover:
-                        cover = dec.get_cover_image()
-
-                    # Cache Search
-                    if meta and meta.get("song_id"):
-                        search_dirs = [args.lyric_cache_dir] if args.lyric_cache_dir else detect_default_dirs()
-                        try:
-                            cache_text = fetch_local_lyrics(int(meta["song_id"]), search_dirs)
-                        except Exception:
-                            logger.warning("本地缓存歌词读取失败，已跳过", exc_info=True)
-
-                    # Remote Fetch
-                    remote_text = None
-                    if args.fetch_lyrics and meta and meta.get("song_id"):
-                        try:
-                            fetched = fetch_lyrics_by_song_id(int(meta["song_id"]), cookie=args.cookie)
-                            remote_text = merge_lyrics(fetched.get("lrc"), fetched.get("tlyric"))
-                        except Exception:
-                            logger.warning("在线歌词获取失败，已跳过", exc_info=True)
-
-                    if args.lyrics_fallback == "local":
-                        lyrics_text = local_text or cache_text
-                    elif args.lyrics_fallback == "remote":
-                        lyrics_text = remote_text or local_text or cache_text
-                    else:  # both
-                        lyrics_text = local_text or remote_text or cache_text
-
-            # Action: Export Lyrics (.lrc)
-            if args.export_lyrics and lyrics_text:
-                lrc_path = out_file.with_suffix(".lrc")
-                try:
-                    lrc_path.write_text(lyrics_text, encoding="utf-8")
-                    logger.info("exported lyrics", extra={"source": "memory", "destination": str(lrc_path)})
-                except Exception:
-                    logger.warning("写入旁车歌词失败，已跳过", exc_info=True)
-
-            # Action: Write Metadata (Tags)
-            if args.write_meta:
-                try:
-                    # Note: 'meta', 'cover', 'lyrics_text' allow reuse from above
-                    # But 'out_file' relies on extension which might have been computed earlier.
-                    # Actually earlier code computed out_file = ...
-                    
-                    # Check existance of out_file (it was processed in try block above)
-                    if not out_file.exists():
-                        logger.warning("输出文件不存在，跳过元数据写入: %s", out_file)
-                    else:
-                         write_metadata(out_file, meta, cover, lyrics_text)
-                except Exception:
-                     logger.warning("元数据写入失败", exc_info=True)
-        except NcmMagicHeaderError:
-            # If suffix matched but header not match, treat as skip.
-            logger.warning("file suffix is .ncm but magic header mismatch, skip: %s", str(file_path))
-        except Exception:
-            # error already logged in _process_file
-            pass
+                run.metrics, exporters = _start_metrics(args, logger)
+            except OSError as e:
+                logger.error("metrics: %s", e)
+                return 2
+        if progress is not None:
+            progress.start()
+        _run_inputs(input_path, run)
+    finally:
+        for exporter in exporters:
+            exporter.stop()
+        if sink is not None:
+            sink.close()
+        if journal is not None:
+            journal.close()
+        if meta_writer is not None:
+            meta_writer.close()
+            logger.info("meta: %d records -> %s", meta_writer.count, str(meta_writer.path))
+    _finish_progress(run)
+
+    _print_summary(stats, logger, file=sys.stderr if to_stdout else sys.stdout)
+    io_counters = None
+    if args.io_hints or args.aligned_buffers:
+        from .iohints import COUNTERS as io_counters
+
+        print(io_counters.summary(), file=sys.stderr if to_stdout else sys.stdout)
+    if args.report:
+        extra: dict = {"shard": {"index": shard[0], "count": shard[1], "by": args.shard_by}} if shard else {}
+        if io_counters is not None:
+            extra["io"] = io_counters.snapshot()
+        extra["chunk"] = tuner.report() if tuner is not None else {"mode": "fixed", "size": args.chunk_size}
+        _write_report(Path(args.report), stats, extra)
+    return 0
 
-    if input_path.is_file():
-        handle_one(input_path)
-    else:
-        for root, dirs, files in os.walk(input_path):
-            for name in files:
-                handle_one(Path(root) / name)
 
-    if not processed_any:
-        logger.info("no .ncm files processed")
+def _start_metrics(args: argparse.Namespace, logger: logging.Logger) -> tuple[ConversionMetrics, list]:
+    from .metrics import ConversionMetrics, MetricsServer, TextfileExporter, parse_listen
+
+    metrics = ConversionMetrics()
+    exporters: list = []
+    try:
+        if args.metrics_listen:
+            host, port = parse_listen(args.metrics_listen)
+            server = MetricsServer(metrics.registry, host, port).start()
+            exporters.append(server)
+            logger.info("metrics: http://%s:%d/metrics", host, server.port)
+        if args.metrics_textfile:
+            exporters.append(TextfileExporter(metrics.registry, args.metrics_textfile, args.metrics_interval).start())
+    except BaseException:
+        for exporter in exporters:
+            exporter.stop()
+        raise
+    return metrics, exporters
+
+
+def _write_report(path: Path, stats: _RunStats, extra: dict | None = None) -> None:
+    import json as _json
+
+    report = {
+        "summary": {
+            "ok": stats.num_ok,
+            "skip": stats.num_skip,
+            "fail": stats.num_fail,
+            "bytes_out": stats.bytes_out,
+        },
+        "files": stats.entries or [],
+    }
+    if extra:
+        report.update(extra)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(_json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _record(run: _Run, result: ConvertResult, queued: bool = False) -> None:
+    run.stats.add(result)
+    if run.metrics is not None:
+        run.metrics.record(result)
+        if queued:
+            run.metrics.queue_depth.dec()
+    if run.progress is not None:
+        # 归档成员等未预先统计大小的输入按输出字节计
+        run.progress.advance(run.input_sizes.get(result.source, result.bytes))
+
+
+def _finish_progress(run: _Run) -> None:
+    if run.progress is not None:
+        run.progress.close()
+        run.progress = None
+
+
+def _stat_sizes(paths: list[Path]) -> dict[str, int]:
+    sizes: dict[str, int] = {}
+    for p in paths:
+        try:
+            sizes[str(p)] = p.stat().st_size
+        except OSError:
+            sizes[str(p)] = 0
+    return sizes
+
+
+def _convert_one(file_path: Path, run: _Run, options: ConvertOptions | None = None, queued: bool = False) -> None:
+    if run.in_place is not None:
+        _record(run, run.in_place.convert(file_path), queued)
+        return
+    _record(run, convert_file(file_path, options or run.options, run.sink, run.input_dir, run.logger), queued)
+
+
+def _dispatched(paths: Iterable[Path], run: _Run) -> Iterator[Path]:
+    # 每取出一个路径（交给调度/线程池）队列深度加一，结果记录时减一
+    for p in paths:
+        if run.metrics is not None:
+            run.metrics.queue_depth.inc()
+        yield p
+
+
+def _read_list(spec: str) -> Iterator[Path]:
+    # 每行一个路径；空行与 # 开头的行忽略；'-' 表示从 stdin 读取（如 catalog query --paths 的输出）
+    fp = sys.stdin if spec == "-" else open(spec, encoding="utf-8")
+    try:
+        for line in fp:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield Path(line)
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+
+
+def _run_paths(paths: Iterable[Path], run: _Run) -> None:
+    args, logger = run.args, run.logger
+    if run.shard is not None:
+        from .shard import select_shard
+
+        # 中文注释：分片键为相对输入根目录的路径，各节点挂载点不同也能得到相同划分
+        paths = select_shard(paths, *run.shard, root=run.input_dir, by=args.shard_by)
+    if run.progress is not None:
+        # 进度模式需要先拿到完整清单与总字节数才能估算剩余时间
+        paths = list(paths)
+        run.input_sizes = _stat_sizes(paths)
+        run.progress.set_total(len(paths), sum(run.input_sizes.values()))
+    paths = _dispatched(paths, run)
+    if run.in_place is not None:
+        # 就地模式逐个处理：同一时刻最多多占一个文件的空间（忽略 --workers / --schedule）
+        for p in paths:
+            _convert_one(p, run, queued=True)
+    elif args.schedule == "size":
+        from .schedule import plan_tasks, run_scheduled
+
+        # 按大小调度需要先拿到完整清单（stat 全部输入）再派发
+        tasks = plan_tasks(paths, small_bytes=args.batch_small_kb * 1024)
+        budget = args.max_inflight_mb * 1024 * 1024 if args.max_inflight_mb else None
+        report = run_scheduled(
+            tasks,
+            lambda p: _convert_one(p, run, queued=True),
+            workers=args.workers,
+            max_inflight_bytes=budget,
+            # 未被转换流程记录的异常仍计入汇总与报告
+            on_error=lambda p, e: _record(run, ConvertResult(source=str(p), status="fail", error=str(e)), queued=True),
+            logger=logger,
+        )
+        print(report.summary(), file=sys.stderr if args.output == "-" else sys.stdout)
+    elif args.workers <= 1:
+        for result in convert_many(paths, run.options, run.sink, run.input_dir, logger=logger):
+            _record(run, result, queued=True)
     else:
-        total = _human_bytes(bytes_out)
-        print(f"结果汇总：成功 {num_ok}，跳过 {num_skip}，失败 {num_fail}，输出 {total}")
-    return 0
+        with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="ncmdc-worker") as ex:
+            # 限制已提交未完成的任务数，避免扫描远快于转换时无限堆积
+            results = convert_many(
+                paths, run.options, run.sink, run.input_dir, executor=ex, window=args.workers * 2, logger=logger
+            )
+            for result in results:
+                _record(run, result, queued=True)
+
+
+def _run_s3(url: str, run: _Run) -> None:
+    from .api import convert_s3
+
+    args = run.args
+    if args.workers <= 1:
+        for result in convert_s3(url, run.options, run.sink, run.logger):
+            _record(run, result)
+        return
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="ncmdc-worker") as ex:
+        for result in convert_s3(url, run.options, run.sink, run.logger, executor=ex, window=args.workers * 2):
+            _record(run, result)
+
+
+def _run_inputs(input_path: Path | None, run: _Run) -> None:
+    args, logger = run.args, run.logger
+    watcher = None
+    if args.watch:
+        from .scan import ScanFilter
+        from .watch import DirectoryWatcher
+
+        # 中文注释：首轮遍历之前先建立快照；最近仍在写入的文件不进首轮，交给监听阶段的稳定判定，
+        # 首轮期间被改动的文件签名与快照不同，监听阶段会重新转换
+        filters = ScanFilter(tuple(args.include or ()), tuple(args.exclude or ()), args.max_depth)
+        watcher = DirectoryWatcher(input_path, settle=args.watch_settle, filters=filters)  # type: ignore[arg-type]
+        watcher.prime(quiet=args.watch_settle)
+    if input_path is None:
+        _run_s3(args.input, run)
+    elif args.from_list:
+        _run_paths(_read_list(args.from_list), run)
+    elif input_path.is_file() and is_archive(input_path):
+        for result in convert_archive(input_path, run.options, run.sink, logger):
+            _record(run, result)
+    elif input_path.is_file():
+        # only process .ncm (case-insensitive)
+        if input_path.suffix.lower() == ".ncm":
+            if run.progress is not None:
+                run.input_sizes = _stat_sizes([input_path])
+                run.progress.set_total(1, run.input_sizes[str(input_path)])
+            _convert_one(input_path, run)
+    else:
+        from .scan import scan_tree
+
+        # 中文注释：扫描线程边列举边产出，转换从第一个文件开始，不必等整棵树遍历完
+        paths = scan_tree(
+            input_path,
+            include=args.include or (),
+            exclude=args.exclude or (),
+            max_depth=args.max_depth,
+            workers=args.scan_workers,
+        )
+        if watcher is not None:
+            paths = (p for p in paths if watcher.is_primed(p))
+        _run_paths(paths, run)
+
+    if watcher is not None:
+        from .watch import run_watch
+
+        # 首轮结束即输出最终进度；监听阶段没有总量可言
+        _finish_progress(run)
+        logger.info("watching %s (Ctrl+C to stop)", str(input_path))
+
+        overwrite_options = dataclasses.replace(run.options, overwrite=True)
+
+        def on_event(event) -> None:
+            # 变更过的源文件需要重新转换，因此强制覆盖旧输出
+            _convert_one(event.path, run, overwrite_options if event.changed else None)
+
+        try:
+            run_watch(
+                watcher,
+                on_event,
+                interval=args.watch_interval,
+                workers=args.workers,
+                queue_size=args.queue_size,
+                logger=logger,
+            )
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == "__main__":
@@ -0,0 +1,451 @@
+from __future__ import annotations
+
+# 说明：
+# 常驻转换服务：`ming-ncm daemon` 启动后保持一组已热身的转换线程（解密、校验等模块已导入），
+# 在 Unix 域套接字上接收 JSON 行请求；`ming-ncm submit` 是配套的极简客户端。
+# 桌面集成、上传钩子逐个文件调用时，省掉每次的解释器启动、导入与线程池创建，延迟只剩解密本身。
+#
+# 协议（每行一个 JSON 对象，UTF-8）：
+#   请求  {"op": "convert", "id": "...", "paths": [...], "options": {...}, "output": "DIR", "root": "DIR"}
+#         {"op": "ping"} / {"op": "stats"} / {"op": "shutdown"}
+#   响应  {"event": "accepted", "job": ..., "files": N}
+#         {"event": "started", "job": ..., "source": ...}           每个文件开始转换时
+#         {"event": "result", "job": ..., "source": ..., "status": ...}   与运行报告的逐文件条目相同
+#         {"event": "done", "job": ..., "summary": {"ok", "skip", "fail", "bytes_out"}}
+#         {"event": "error", "error": "..."}                        请求无效
+# options 的键与 ConvertOptions 字段同名；路径应为绝对路径（客户端负责转换）。pipe_to 会执行任意命令，不接受经套接字传入。
+# 安全：套接字在 umask 0o077 下创建（绑定瞬间即为 0600），默认位置在属主专用的 0700 目录内；
+# 已存在的套接字路径或目录属于其他用户时拒绝使用（服务端与客户端都检查），防止抢先创建的伪服务。
+# 背压：全局在途文件数不超过 --queue-size，队列满时处理该连接的线程阻塞、不再读取其后续请求，
+# 客户端随之在写入时阻塞；单个连接断开后，其尚未开始的文件不再转换。
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import fields
+from pathlib import Path
+from typing import Callable
+
+from .api import ConvertOptions, ConvertResult, convert_file
+from .ncm.chunking import ChunkTuner
+from .output import DirectorySink, is_archive_output, is_s3_url
+
+_LOGGER = logging.getLogger("ncmdc")
+
+
+def default_socket_path() -> Path:
+    """$XDG_RUNTIME_DIR/ncmdc.sock，未设置时为临时目录下按用户区分的专用目录 ncmdc-<uid>/ncmdc.sock。"""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "ncmdc.sock"
+    uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return Path(tempfile.gettempdir()) / f"ncmdc-{uid}" / "ncmdc.sock"
+
+
+def _check_owner(path: Path, st: os.stat_result) -> None:
+    # 属于其他用户（root 除外）的套接字/目录可能是抢先创建的伪服务
+    if hasattr(os, "getuid") and st.st_uid not in (os.getuid(), 0):
+        raise PermissionError(f"{path} is owned by another user (uid {st.st_uid})")
+
+
+def check_socket_owner(path: str | Path) -> None:
+    """路径已存在时确认属于当前用户；不存在时不做处理。"""
+    path = Path(path)
+    try:
+        st = path.lstat()
+    except FileNotFoundError:
+        return
+    _check_owner(path, st)
+
+
+def _private_dir(path: Path) -> None:
+    """创建（或确认）仅属主可访问的 0700 目录。"""
+    try:
+        path.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+    st = path.lstat()
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"{path} is not a directory")
+    _check_owner(path, st)
+    if st.st_mode & 0o077:
+        raise PermissionError(f"{path} is accessible by other users (mode {stat.S_IMODE(st.st_mode):o})")
+
+
+def options_from_dict(data: dict, tuner: ChunkTuner | None = None) -> ConvertOptions:
+    """按字段名构造 ConvertOptions；未知键抛 ValueError（避免拼写错误被静默忽略）。
+
+    chunk_size 为 "auto" 时改用 tuner 自适应，未给出时与 CLI 一致为固定的默认块大小。
+    """
+    # meta_writer / chunk_tuner 是进程内对象，无法经 JSON 传入
+    names = {f.name for f in fields(ConvertOptions)} - {"meta_writer", "chunk_tuner"}
+    unknown = sorted(set(data) - names)
+    if unknown:
+        raise ValueError(f"unknown options: {', '.join(unknown)}")
+    if data.get("pipe_to"):
+        # 中文注释：会以服务进程身份执行任意命令，不接受经套接字传入
+        raise ValueError("pipe_to is not accepted by the daemon")
+    if data.get("chunk_size") == "auto":
+        return ConvertOptions(**{**data, "chunk_size": None}, chunk_tuner=tuner)
+    return ConvertOptions(**data)
+
+
+def output_from_spec(spec: object) -> DirectorySink | None:
+    """请求中的 output：只接受目录（None 表示源文件旁）。
+
+    '-' 会把 tar 流写进服务进程的 stdout，归档与 S3 输出在多个任务间无法共享，均拒绝。
+    """
+    if spec is None:
+        return None
+    if not isinstance(spec, str) or not spec:
+        raise ValueError("output must be a directory path")
+    if is_archive_output(spec) or is_s3_url(spec):
+        raise ValueError(f"output must be a directory, not {spec!r}")
+    return DirectorySink(spec)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _Server
+
+    def handle(self) -> None:
+        lock = threading.Lock()
+        closed = threading.Event()
+
+        def send(obj: dict) -> None:
+            if closed.is_set():
+                return
+            data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+            try:
+                with lock:
+                    self.wfile.write(data)
+            except OSError:
+                # 客户端已断开：其余文件不再转换
+                closed.set()
+
+        for line in self.rfile:
+            if closed.is_set() or not line.strip():
+                continue
+            try:
+                req = json.loads(line)
+                if not isinstance(req, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                send({"event": "error", "error": f"bad request: {e}"})
+                continue
+            self.server.service.dispatch(req, send, closed)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    service: Daemon
+
+
+class Daemon:
+    def __init__(
+        self,
+        socket_path: str | Path | None = None,
+        workers: int = 4,
+        queue_size: int | None = None,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self.socket_path = Path(socket_path) if socket_path else default_socket_path()
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size or self.workers * 4)
+        self.logger = logger or _LOGGER
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ncmdc-daemon")
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.inflight = 0
+        self.jobs = 0
+        self.files = 0
+        self._server: _Server | None = None
+        self.ready = threading.Event()
+        # 各任务共享同一个自适应块大小调节器，服务运行越久越接近最优值
+        self.tuner = ChunkTuner()
+
+    # ---- 请求处理 ----
+
+    def dispatch(self, req: dict, send: Callable[[dict], None], closed: threading.Event) -> None:
+        op = req.get("op", "convert")
+        if op == "ping":
+            send({"event": "pong", "pid": os.getpid()})
+        elif op == "stats":
+            with self._lock:
+                stats = {"inflight": self.inflight, "jobs": self.jobs, "files": self.files}
+            send({"event": "stats", "workers": self.workers, "queue_size": self.queue_size, **stats})
+        elif op == "shutdown":
+            send({"event": "bye"})
+            # serve_forever 所在线程之外才能调用 shutdown
+            threading.Thread(target=self.shutdown, daemon=True).start()
+        elif op == "convert":
+            self._convert(req, send, closed)
+        else:
+            send({"event": "error", "error": f"unknown op: {op}"})
+
+    def _convert(self, req: dict, send: Callable[[dict], None], closed: threading.Event) -> None:
+        job = req.get("id") or next(self._ids)
+        try:
+            paths = req.get("paths") or []
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                raise ValueError("paths must be a list of strings")
+            options = options_from_dict(req.get("options") or {}, self.tuner)
+            sink = output_from_spec(req.get("output"))
+        except Exception as e:
+            send({"event": "error", "job": job, "error": str(e)})
+            return
+        root = req.get("root")
+        with self._lock:
+            self.jobs += 1
+        summary = {"ok": 0, "skip": 0, "fail": 0, "bytes_out": 0}
+        send({"event": "accepted", "job": job, "files": len(paths)})
+
+        def one(path: str) -> None:
+            try:
+                if closed.is_set():
+                    return
+                send({"event": "started", "job": job, "source": path})
+                try:
+                    result = convert_file(path, options, sink, root, self.logger)
+                except Exception as e:  # pragma: no cover - convert_file 本身不抛转换错误
+                    result = ConvertResult(source=path, status="fail", error=str(e))
+                with self._lock:
+                    self.files += 1
+                    if result.status in summary:
+                        summary[result.status] += 1
+                    if result.ok:
+                        summary["bytes_out"] += result.bytes
+                send({"event": "result", "job": job, **result.to_dict()})
+            finally:
+                with self._lock:
+                    self.inflight -= 1
+                self._slots.release()
+
+        futures = []
+        try:
+            for p in paths:
+                if closed.is_set():
+                    break
+                # 中文注释：全局队列已满时在此阻塞，该连接的后续请求也随之等待
+                self._slots.acquire()
+                with self._lock:
+                    self.inflight += 1
+                try:
+                    futures.append(self._pool.submit(one, p))
+                except BaseException:
+                    with self._lock:
+                        self.inflight -= 1
+                    self._slots.release()
+                    raise
+            wait(futures)
+        finally:
+            if sink is not None:
+                sink.close()
+        send({"event": "done", "job": job, "summary": summary})
+
+    # ---- 生命周期 ----
+
+    def _claim_socket(self) -> None:
+        p = self.socket_path
+        try:
+            st = p.lstat()
+        except FileNotFoundError:
+            return
+        try:
+            _check_owner(p, st)
+        except PermissionError as e:
+            raise RuntimeError(str(e)) from None
+        if not stat.S_ISSOCK(st.st_mode):
+            raise RuntimeError(f"{p} exists and is not a socket")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(p))
+        except OSError:
+            # 上次异常退出留下的套接字文件
+            try:
+                p.unlink()
+            except OSError as e:
+                raise RuntimeError(f"cannot remove stale socket {p}: {e}") from None
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"daemon already running on {p}")
+
+    def _bind(self) -> _Server:
+        if self.socket_path == default_socket_path() and not os.environ.get("XDG_RUNTIME_DIR"):
+            # 共享的临时目录下：套接字放在属主专用目录中，他人无法抢先创建或连接
+            try:
+                _private_dir(self.socket_path.parent)
+            except PermissionError as e:
+                raise RuntimeError(str(e)) from None
+        else:
+            self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self._claim_socket()
+        # 中文注释：umask 保证套接字在 bind 的同一时刻即为 0600，不存在 chmod 之前的可连接窗口
+        old = os.umask(0o077)
+        try:
+            server = _Server(str(self.socket_path), _Handler)
+        finally:
+            os.umask(old)
+        os.chmod(self.socket_path, 0o600)
+        return server
+
+    def serve_forever(self) -> None:
+        # 预先导入转换路径上的模块，首个请求无需再付导入开销
+        from . import verify  # noqa: F401
+        from .ncm import parallel  # noqa: F401
+
+        server = self._bind()
+        server.service = self
+        self._server = server
+        try:
+            self.logger.info("daemon listening on %s (workers=%d, queue=%d)", self.socket_path, self.workers, self.queue_size)
+            self.ready.set()
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self._pool.shutdown(wait=True)
+            try:
+                self.socket_path.unlink()
+            except OSError:
+                pass
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def submit(
+    socket_path: str | Path,
+    request: dict,
+    on_event: Callable[[dict], None] | None = None,
+    timeout: float | None = None,
+) -> list[dict]:
+    """发送一个请求并读取响应，直到 done/error/pong/stats/bye；返回收到的全部事件。"""
+    terminal = {"done", "error", "pong", "stats", "bye"}
+    events: list[dict] = []
+    # 不向其他用户创建的套接字发送请求（路径与选项会泄露给对方）
+    check_socket_owner(socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(str(socket_path))
+        s.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        with s.makefile("rb") as rf:
+            for line in rf:
+                event = json.loads(line)
+                events.append(event)
+                if on_event is not None:
+                    on_event(event)
+                if event.get("event") in terminal:
+                    break
+    return events
+
+
+def _parse_value(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main_daemon(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="ming-ncm daemon", description="常驻转换服务（Unix 域套接字，JSON 行协议）")
+    parser.add_argument("--socket", default=None, help="socket：套接字路径（默认 $XDG_RUNTIME_DIR/ncmdc.sock）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="workers：常驻转换线程数")
+    parser.add_argument("--queue-size", type=int, default=None, help="queue-size：全局在途文件上限（默认 workers×4，满则阻塞提交方）")
+    parser.add_argument("--log-file", default=None, help="log-file：日志同时写入文件")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if not hasattr(socket, "AF_UNIX"):
+        print("daemon requires Unix domain sockets", file=sys.stderr)
+        return 2
+
+    from .logqueue import LogPipeline
+
+    pipeline = LogPipeline(logging.INFO, log_file=args.log_file).start()
+    try:
+        Daemon(args.socket, args.workers, args.queue_size).serve_forever()
+    except RuntimeError as e:
+        _LOGGER.error("%s", e)
+        return 2
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+    return 0
+
+
+def main_submit(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="ming-ncm submit", description="向常驻转换服务提交文件")
+    parser.add_argument("paths", nargs="*", metavar="PATH", help="paths：要转换的 .ncm 文件")
+    parser.add_argument("--socket", default=None, help="socket：套接字路径（默认与 daemon 相同）")
+    parser.add_argument("-o", "--output", default=None, help="output：输出目录（默认源文件旁；不支持归档、S3 与 -）")
+    parser.add_argument("--root", default=None, help="root：输出镜像相对该目录的子路径")
+    parser.add_argument("--overwrite", action="store_true", help="overwrite：覆盖已存在的输出")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="set：其他转换选项（与 ConvertOptions 字段同名，VALUE 按 JSON 解析，可多次指定）")
+    parser.add_argument("--json", action="store_true", help="json：逐行输出服务返回的原始事件")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--ping", action="store_true", help="ping：检查服务是否在运行")
+    group.add_argument("--stats", action="store_true", help="stats：查看服务状态")
+    group.add_argument("--stop", action="store_true", help="stop：停止服务")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    sock = args.socket or default_socket_path()
+    if args.ping or args.stats or args.stop:
+        request: dict = {"op": "ping" if args.ping else "stats" if args.stats else "shutdown"}
+    else:
+        if not args.paths:
+            parser.error("at least one PATH is required")
+        options: dict = {"overwrite": True} if args.overwrite else {}
+        for item in args.set:
+            key, sep, value = item.partition("=")
+            if not sep:
+                parser.error(f"--set expects KEY=VALUE: {item}")
+            options[key.strip().replace("-", "_")] = _parse_value(value)
+        request = {
+            "op": "convert",
+            "paths": [str(Path(p).absolute()) for p in args.paths],
+            "options": options,
+            "output": str(Path(args.output).absolute()) if args.output else None,
+            "root": str(Path(args.root).absolute()) if args.root else None,
+        }
+
+    def show(event: dict) -> None:
+        if args.json:
+            print(json.dumps(event, ensure_ascii=False), flush=True)
+            return
+        kind = event.get("event")
+        if kind == "result":
+            dest = event.get("output") or event.get("error") or ""
+            print(f"{event['status']}\t{event['source']}\t{dest}", flush=True)
+        elif kind == "error":
+            print(f"error: {event.get('error')}", file=sys.stderr)
+        elif kind in ("pong", "stats", "bye"):
+            print(json.dumps(event, ensure_ascii=False))
+
+    try:
+        events = submit(sock, request, on_event=show)
+    except OSError as e:
+        print(f"cannot reach daemon at {sock}: {e}", file=sys.stderr)
+        return 2
+    last = events[-1] if events else {}
+    if last.get("event") == "error":
+        return 2
+    if last.get("event") == "done" and not args.json:
+        from .progress import summary_line
+
+        s = last["summary"]
+        print(summary_line(s["ok"], s["skip"], s["fail"], s["bytes_out"]))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_daemon())
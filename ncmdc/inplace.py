@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+# 说明：
+# 就地转换（--in-place）：磁盘几乎被曲库占满、放不下整份并排输出时，逐个文件“转换 → 核验 → 移除源文件”。
+# - 同一时刻只处理一个文件，额外占用不超过单个文件的大小（输出写完、核验通过后源文件即被删除或移走），
+#   峰值占用从约 2 倍曲库降到约 1 倍；
+# - 开始每个文件前检查输出所在文件系统的剩余空间：剩余 - 文件大小 低于 --min-free-mb 时跳过该文件；
+# - 核验复用 verify_sampled（长度精确相等 + 首尾块与随机区间逐字节比对），通过后 fsync 输出再处理源文件；
+#   --write-meta 的标签在核验之后写入（标签会改变输出字节）；
+# - 日志（journal，JSON 行，每条 fsync）记录每个文件的阶段：begin → ready（输出已核验并落盘）→ done。
+#   中断后重新运行时先回放日志：停在 begin 的文件删除本次新建的半成品输出（源文件此时必然完好），
+#   随后照常重新转换；停在 ready 的文件补做源文件删除/归档。源文件只会在 ready 记录落盘之后才被移除。
+
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+
+from .api import ConvertOptions, ConvertResult, convert_file
+from .output import DirectorySink
+
+DEFAULT_JOURNAL = ".ncmdc-inplace.journal"
+
+
+def free_bytes(path: str | Path) -> int:
+    return shutil.disk_usage(str(path)).free
+
+
+def fsync_path(path: str | Path, directory: bool = False) -> None:
+    """把文件（或目录项）刷到磁盘；平台不支持对目录 fsync 时忽略。"""
+    flags = os.O_RDONLY | (getattr(os, "O_DIRECTORY", 0) if directory else 0)
+    try:
+        fd = os.open(str(path), flags)
+    except OSError:
+        if directory:
+            return
+        raise
+    try:
+        os.fsync(fd)
+    except OSError:
+        if not directory:
+            raise
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """追加写的 JSON 行日志；每条记录写入后 fsync，崩溃后最多丢失正在写的那一条。"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._trim_torn_tail()
+        self._fp = self.path.open("a", encoding="utf-8")
+
+    def _trim_torn_tail(self) -> None:
+        # 崩溃时写了一半的最后一行若不截掉，下一条记录会被拼接到它后面而无法解析
+        try:
+            with self.path.open("rb+") as fp:
+                data = fp.read()
+                if data and not data.endswith(b"\n"):
+                    fp.truncate(data.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def append(self, op: str, source: str, **fields) -> None:
+        line = json.dumps({"op": op, "source": source, "ts": round(time.time(), 3), **fields}, ensure_ascii=False)
+        with self._lock:
+            self._fp.write(line + "\n")
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+
+    def pending(self) -> dict[str, dict]:
+        """每个源文件的最后一条记录中，尚未结束（begin / ready）的那些。"""
+        last: dict[str, dict] = {}
+        with self.path.open("r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的最后一行
+                    continue
+                last[entry["source"]] = entry
+        return {src: e for src, e in last.items() if e["op"] in ("begin", "ready")}
+
+    def close(self, remove_if_clean: bool = True) -> None:
+        with self._lock:
+            self._fp.close()
+        # 全部结束时删除日志，下次运行不必回放
+        if remove_if_clean and not self.pending():
+            self.path.unlink()
+
+
+class InPlaceConverter:
+    def __init__(
+        self,
+        options: ConvertOptions,
+        sink: DirectorySink,
+        journal: Journal,
+        root: Path | None = None,
+        min_free: int = 1024 * 1024 * 1024,
+        archive_dir: Path | None = None,
+        logger=None,
+    ) -> None:
+        import logging
+
+        self.options = options
+        self.sink = sink
+        self.journal = journal
+        self.root = root
+        self.min_free = min_free
+        self.archive_dir = archive_dir
+        self.logger = logger or logging.getLogger("ncmdc")
+
+    def _archive_target(self, src: Path) -> Path:
+        try:
+            rel = src.absolute().relative_to(self.root.absolute()) if self.root else Path(src.name)
+        except ValueError:
+            rel = Path(src.name)
+        return self.archive_dir.joinpath(rel)  # type: ignore[union-attr]
+
+    def _retire(self, src: Path) -> str:
+        """删除源文件，或移到归档目录（保留相对路径）；返回 'deleted' 或归档位置。"""
+        if self.archive_dir is None:
+            src.unlink()
+            fsync_path(src.parent, directory=True)
+            return "deleted"
+        target = self._archive_target(src)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(src), str(target))
+        return str(target)
+
+    def recover(self) -> int:
+        """回放上次中断留下的日志，返回处理的条目数。"""
+        pending = self.journal.pending()
+        for source, entry in pending.items():
+            src, out = Path(source), Path(entry["output"])
+            if entry["op"] == "begin":
+                # 输出尚未核验：删除本次新建的半成品，源文件稍后照常重新转换
+                if entry.get("created") and out.exists():
+                    out.unlink()
+                    self.logger.warning("removed partial output: %s", str(out))
+                self.journal.append("abort", source, output=str(out))
+            elif src.exists():
+                retired = self._retire(src)
+                self.logger.info("recovered %s -> %s", source, retired)
+                self.journal.append("done", source, output=str(out), retired=retired)
+            else:
+                self.journal.append("done", source, output=str(out))
+        return len(pending)
+
+    def _verify(self, src: Path, out: Path):
+        from .ncm.parser import NcmDecoder
+        from .verify import verify_sampled
+
+        opts = self.options
+        with src.open("rb") as fp:
+            dec = NcmDecoder(fp, logger=self.logger)
+            dec.validate()
+            return verify_sampled(dec, out, samples=opts.verify_samples, block=opts.verify_block_kb * 1024)
+
+    def convert(self, src: Path) -> ConvertResult:
+        source = str(src)
+        opts, logger = self.options, self.logger
+        try:
+            size = src.stat().st_size
+            self.sink.root.mkdir(parents=True, exist_ok=True)
+            free = free_bytes(self.sink.root)
+        except OSError as e:
+            return ConvertResult(source=source, status="fail", error=str(e))
+        if free - size < self.min_free:
+            logger.warning("insufficient free space, skip: %s (free %d MB)", source, free // 1048576)
+            return ConvertResult(source=source, status="skip", error="insufficient space", bytes_in=size)
+
+        # 先只解析头部得到输出位置，日志中记下是否由本次新建
+        plan = convert_file(src, replace(opts, dry_run=True, meta=False), self.sink, self.root, logger)
+        if plan.status != "plan" or plan.output is None:
+            return plan
+        out = Path(plan.output)
+        created = not out.exists() or opts.overwrite
+        self.journal.append("begin", source, output=str(out), created=created, size=size)
+
+        # 标签改变输出字节，核验之后再写
+        res = convert_file(src, replace(opts, write_meta=False), self.sink, self.root, logger)
+        existing = res.status == "skip" and res.error is None and res.output is not None
+        if not (res.ok or existing):
+            self._abort(source, out, created)
+            return res
+        try:
+            check = self._verify(src, out)
+        except Exception as e:
+            logger.error("verify failed", extra={"source": source}, exc_info=True)
+            check = None
+            detail = str(e)
+        else:
+            detail = check.detail
+        if check is None or not check.ok:
+            logger.warning("in-place verify failed, source kept: %s (%s)", source, detail)
+            self._abort(source, out, created)
+            res.status, res.error = "fail", f"verify: {detail}"
+            return res
+        res.status, res.bytes, res.checked = "ok", check.actual_size, check.checked_bytes
+
+        # 核验只比对音频负载，已带标签的既有输出同样能通过；标签只写进本次新建的输出，不改动用户已有文件
+        if opts.write_meta and created:
+            tags = convert_file(
+                src,
+                replace(opts, artifacts_only=True, meta=False, cover=False, dump_meta=False, export_lyrics=False),
+                self.sink,
+                self.root,
+                logger,
+            )
+            res.warnings += tags.warnings
+        fsync_path(out)
+        fsync_path(out.parent, directory=True)
+        self.journal.append("ready", source, output=str(out))
+        try:
+            res.retired = self._retire(src)
+        except OSError as e:
+            # 输出已完好，源文件留待下次运行（日志停在 ready）补做
+            logger.error("failed to remove source: %s (%s)", source, e)
+            res.warnings.append("retire")
+            return res
+        self.journal.append("done", source, output=str(out), retired=res.retired)
+        return res
+
+    def _abort(self, source: str, out: Path, created: bool) -> None:
+        if created and out.exists():
+            try:
+                out.unlink()
+            except OSError:
+                pass
+        self.journal.append("abort", source, output=str(out))
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+# 说明：
+# 批量转换的内核 I/O 提示（--io-hints）。源文件与输出都只读写一遍，留在页缓存里只会挤掉同机其他服务的热数据：
+# - 输入：posix_fadvise(SEQUENTIAL) 加大预读，读过的区间随后 DONTNEED；
+# - 输出：按头部得出的最终大小 posix_fallocate，避免边写边扩展造成碎片；写过的区间分两次 DONTNEED——
+#   第一次对脏页发起异步回写，下一个窗口再次提示时这些页已干净，才会真正被丢弃；
+# - 可选页对齐缓冲（--aligned-buffers）：解密循环复用一块 mmap 匿名内存（按页对齐）readinto，不再逐块分配。
+# 不支持 posix_fadvise/posix_fallocate 的平台（Windows、macOS）上各项提示为空操作，计数器保持为 0。
+
+import errno
+import mmap
+import os
+import threading
+from dataclasses import dataclass, field, fields
+from typing import BinaryIO
+
+PAGE_SIZE = mmap.PAGESIZE
+# 每推进该字节数对已处理区间提示一次
+DROP_WINDOW = 8 * 1024 * 1024
+
+
+@dataclass
+class IoCounters:
+    """进程内累计的 I/O 提示计数（线程安全）。"""
+
+    files: int = 0
+    sequential: int = 0
+    dropped_read_bytes: int = 0
+    dropped_write_bytes: int = 0
+    preallocated_bytes: int = 0
+    aligned_files: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **deltas: int) -> None:
+        with self._lock:
+            for k, v in deltas.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith("_")}
+
+    def summary(self) -> str:
+        s = self.snapshot()
+        mb = 1024 * 1024
+        return (
+            f"I/O 提示：{s['files']} 个文件，顺序预读 {s['sequential']}，"
+            f"释放缓存 读 {s['dropped_read_bytes'] / mb:.1f} MB / 写 {s['dropped_write_bytes'] / mb:.1f} MB，"
+            f"预分配 {s['preallocated_bytes'] / mb:.1f} MB，对齐缓冲 {s['aligned_files']}"
+        )
+
+
+COUNTERS = IoCounters()
+
+
+def fileno(fp: object) -> int | None:
+    """返回底层文件描述符；内存流、归档成员等没有真实 fd 时返回 None。"""
+    try:
+        fd = fp.fileno()  # type: ignore[attr-defined]
+    except (AttributeError, OSError, ValueError):
+        return None
+    return fd if isinstance(fd, int) and fd >= 0 else None
+
+
+def fadvise(fd: int | None, offset: int, length: int, advice_name: str) -> bool:
+    advice = getattr(os, advice_name, None)
+    if fd is None or advice is None or not hasattr(os, "posix_fadvise"):
+        return False
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        # 管道、部分网络文件系统等不支持
+        return False
+    return True
+
+
+def fallocate(fd: int | None, size: int) -> bool:
+    """预分配 [0, size)；文件系统不支持时返回 False，空间不足（ENOSPC）照常抛出。"""
+    if fd is None or size <= 0 or not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as e:
+        if e.errno in (errno.EINVAL, errno.EOPNOTSUPP):
+            return False
+        raise
+    return True
+
+
+def aligned_buffer(size: int) -> mmap.mmap:
+    """按页对齐的可写缓冲（匿名映射天然页对齐），大小向上取整到整页。"""
+    return mmap.mmap(-1, max(PAGE_SIZE, -(-size // PAGE_SIZE) * PAGE_SIZE))
+
+
+class IoHints:
+    """单个文件一次顺序解密的 I/O 提示，作为 stream_decrypt 的 observer 使用。
+
+    src：源文件（audio_start 为音频区起点）；out：输出文件对象；size：预期写出的字节数（用于预分配）。
+    结束时须调用 finish(written)：实际写出少于预分配大小（如中途失败）时截断到已写长度，
+    避免留下“长度正确、尾部全零”的输出被下次运行当作已完成。
+    """
+
+    def __init__(
+        self,
+        src: BinaryIO,
+        audio_start: int,
+        out: BinaryIO,
+        size: int | None,
+        window: int = DROP_WINDOW,
+        counters: IoCounters = COUNTERS,
+    ) -> None:
+        self._src_fd = fileno(src)
+        self._out = out
+        self._out_fd = fileno(out)
+        self._base = audio_start
+        self._window = max(PAGE_SIZE, window)
+        self._counters = counters
+        self.pos = 0
+        # 输出：_kicked 之前的区间已发起过回写，_dropped 之前的区间已提示丢弃
+        self._kicked = 0
+        self._dropped = 0
+        self._read_dropped = 0
+        self._mark = 0
+        self.sequential = fadvise(self._src_fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+        self.preallocated = fallocate(self._out_fd, size or 0)
+        self._size = size or 0
+        counters.add(
+            files=1,
+            sequential=int(self.sequential),
+            preallocated_bytes=self._size if self.preallocated else 0,
+        )
+
+    def __call__(self, data) -> None:
+        self.pos += len(data)
+        if self.pos - self._mark >= self._window:
+            self._drop()
+
+    def _drop(self) -> None:
+        self._mark = self.pos
+        # 输入：只释放读取位置之前的内容（预读窗口保留）
+        read_end = self._base + self.pos
+        if fadvise(self._src_fd, self._read_dropped, read_end - self._read_dropped, "POSIX_FADV_DONTNEED"):
+            self._counters.add(dropped_read_bytes=read_end - self._read_dropped)
+        self._read_dropped = read_end
+        if self._out_fd is None:
+            return
+        try:
+            self._out.flush()
+        except (OSError, ValueError):
+            return
+        # 输出：上一窗口发起过回写的区间现在再次提示即可丢弃；本窗口的新区间先发起回写
+        lo, hi = self._dropped, self._kicked
+        if hi > lo and fadvise(self._out_fd, lo, hi - lo, "POSIX_FADV_DONTNEED"):
+            self._counters.add(dropped_write_bytes=hi - lo)
+            self._dropped = hi
+        if self.pos > self._kicked:
+            fadvise(self._out_fd, self._kicked, self.pos - self._kicked, "POSIX_FADV_DONTNEED")
+            self._kicked = self.pos
+
+    def finish(self, written: int | None = None) -> None:
+        """收尾：截断未写满的预分配，并对剩余区间做最后一次提示（最后一个窗口只发起回写，不等待落盘）。"""
+        written = self.pos if written is None else written
+        if self.preallocated and written < self._size and self._out_fd is not None:
+            try:
+                self._out.flush()
+                os.ftruncate(self._out_fd, written)
+            except (OSError, ValueError):
+                pass
+        self._drop()
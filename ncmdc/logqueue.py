@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+# 说明：
+# 非阻塞日志：转换线程/进程只把日志记录放进队列（QueueHandler），
+# 由后台监听线程（QueueListener）统一格式化并写到终端或文件，慢终端/慢磁盘不会拖住解密。
+# 多进程 worker 使用 multiprocessing 队列（首次需要时才创建），子进程通过 worker_initializer 接入同一条管道；
+# 进程池可用 on_stop 登记关闭动作，管道停止前先让子进程退出，保证其剩余日志送达。
+
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from typing import Any, Callable
+
+LOGGER_NAME = "ncmdc"
+LOG_FORMAT = "%(levelname)s %(message)s"
+
+# 当前运行中的管道（供进程池在创建时接入）
+_ACTIVE: LogPipeline | None = None
+
+
+class LogPipeline:
+    """CLI 运行期间的日志管道；stop() 后恢复 ncmdc logger 原有配置。"""
+
+    def __init__(
+        self,
+        level: int = logging.INFO,
+        stream: Any = None,
+        log_file: str | None = None,
+        progress: Any = None,
+        for_processes: bool = False,
+    ) -> None:
+        self.level = level
+        self.queue: Any = queue.SimpleQueue()
+        self._for_processes = for_processes
+        self._proc_queue: Any = None
+        self._proc_listener: logging.handlers.QueueListener | None = None
+        self._stop_hooks: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+        fmt = logging.Formatter(LOG_FORMAT)
+        if progress is not None:
+            from .progress import ProgressHandler
+
+            console: logging.Handler = ProgressHandler(progress)
+        else:
+            console = logging.StreamHandler(stream or sys.stderr)
+        console.setFormatter(fmt)
+        handlers = [console]
+        if log_file:
+            fh = logging.FileHandler(log_file, encoding="utf-8")
+            fh.setFormatter(fmt)
+            handlers.append(fh)
+        self._handlers = handlers
+        self._listener = logging.handlers.QueueListener(self.queue, *handlers)
+        self._logger = logging.getLogger(LOGGER_NAME)
+        self._saved: tuple | None = None
+
+    def start(self) -> LogPipeline:
+        lg = self._logger
+        self._saved = (lg.handlers[:], lg.level, lg.propagate)
+        lg.handlers[:] = [logging.handlers.QueueHandler(self.queue)]
+        lg.setLevel(self.level)
+        # 不再经由根 logger 输出，避免同一条日志被打印两次
+        lg.propagate = False
+        self._listener.start()
+        if self._for_processes:
+            self.worker_args()
+        global _ACTIVE
+        _ACTIVE = self
+        return self
+
+    def on_stop(self, hook: Callable[[], None]) -> None:
+        """登记在停止监听之前执行的动作（如关闭接入本管道的进程池）。"""
+        with self._lock:
+            self._stop_hooks.append(hook)
+
+    def stop(self) -> None:
+        if self._saved is None:
+            return
+        global _ACTIVE
+        if _ACTIVE is self:
+            _ACTIVE = None
+        with self._lock:
+            hooks, self._stop_hooks = self._stop_hooks, []
+        for hook in hooks:
+            try:
+                hook()
+            except Exception:
+                logging.getLogger(LOGGER_NAME).warning("log pipeline stop hook failed", exc_info=True)
+        lg = self._logger
+        lg.handlers[:], level, lg.propagate = self._saved
+        lg.setLevel(level)
+        self._saved = None
+        # 监听线程在退出前会把队列中剩余的记录处理完
+        self._listener.stop()
+        if self._proc_listener is not None:
+            self._proc_listener.stop()
+        for h in self._handlers:
+            h.close()
+
+    def worker_args(self) -> tuple:
+        """供 ProcessPoolExecutor(initializer=worker_initializer, initargs=...) 使用；首次调用时创建跨进程队列。"""
+        with self._lock:
+            if self._proc_queue is None:
+                import multiprocessing
+
+                # spawn 上下文的队列可交给 spawn 与 fork 两种子进程（反之不行）
+                self._proc_queue = multiprocessing.get_context("spawn").Queue(-1)
+                self._proc_listener = logging.handlers.QueueListener(self._proc_queue, *self._handlers)
+                self._proc_listener.start()
+        return (self._proc_queue, self.level)
+
+
+def active_pipeline() -> LogPipeline | None:
+    """当前运行中的日志管道；没有时子进程日志保持默认配置。"""
+    return _ACTIVE
+
+
+def worker_initializer(log_queue: Any, level: int = logging.INFO) -> None:
+    """子进程初始化：ncmdc 日志全部转发到父进程的监听线程。"""
+    lg = logging.getLogger(LOGGER_NAME)
+    lg.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    lg.setLevel(level)
+    lg.propagate = False
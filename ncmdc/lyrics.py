@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+# 说明：
+# LRC 歌词解析/合并/序列化。
+# - 时间戳统一解析为整数毫秒：[1:05.00]、[01:05.000]、[01:05:00]、[01:05] 视为同一时刻，
+#   分钟数不限两位，排序按数值而非字符串；
+# - 一行多个时间戳（[00:10.00][00:20.00]副歌）展开为多行；
+# - 元数据标签（[ar:]/[ti:]/[al:]/[by:] 等）单独保存，[offset:] 在解析时折算进时间戳；
+# - 原文与翻译按“容差内最近时间戳”配对，两个有序序列双指针线性归并；
+# - 输出格式固定（元数据在前，时间戳 [mm:ss.xx]），同样输入得到同样输出。
+
+import re
+from dataclasses import dataclass, field
+
+_TIME_RE = re.compile(r"(\d+):(\d+)(?:[.:](\d+))?")
+
+# 原文与翻译视为同一行的最大时间差（毫秒）
+DEFAULT_TOLERANCE_MS = 100
+
+
+@dataclass
+class LrcLine:
+    time_ms: int
+    text: str
+
+
+@dataclass
+class Lyrics:
+    # 元数据标签（键小写），按出现顺序
+    tags: dict[str, str] = field(default_factory=dict)
+    # 按时间升序（同一时刻保持原文顺序）
+    lines: list[LrcLine] = field(default_factory=list)
+
+
+def _parse_time(tag: str) -> int | None:
+    m = _TIME_RE.fullmatch(tag.strip())
+    if m is None:
+        return None
+    minutes, seconds, frac = m.groups()
+    ms = int(frac[:3].ljust(3, "0")) if frac else 0
+    return (int(minutes) * 60 + int(seconds)) * 1000 + ms
+
+
+def parse_lrc(text: str | None, apply_offset: bool = True) -> Lyrics:
+    """解析 LRC 文本。不带时间戳的普通文本行被忽略。
+
+    apply_offset：将 [offset:N]（毫秒，正值表示歌词提前）折算进各行时间并移除该标签。
+    """
+    lyrics = Lyrics()
+    if not text:
+        return lyrics
+    lines = lyrics.lines
+    tags = lyrics.tags
+    in_order = True
+    last = -1
+    for raw in text.splitlines():
+        line = raw.strip()
+        pos = 0
+        times: list[int] = []
+        while line.startswith("[", pos):
+            end = line.find("]", pos)
+            if end < 0:
+                break
+            tag = line[pos + 1 : end]
+            t = _parse_time(tag)
+            if t is not None:
+                times.append(t)
+                pos = end + 1
+                continue
+            key, sep, value = tag.partition(":")
+            if times or not sep or not key.strip():
+                # 时间戳之后的方括号属于歌词正文
+                break
+            tags[key.strip().lower()] = value.strip()
+            pos = end + 1
+        if not times:
+            continue
+        body = line[pos:].strip()
+        for t in times:
+            if t < last:
+                in_order = False
+            last = t
+            lines.append(LrcLine(t, body))
+
+    if apply_offset and "offset" in tags:
+        try:
+            offset = int(tags.pop("offset"))
+        except ValueError:
+            offset = 0
+        if offset:
+            for ln in lines:
+                ln.time_ms = max(0, ln.time_ms - offset)
+    if not in_order:
+        # 多时间戳行或乱序文件才需要排序（稳定排序保持同刻行的原顺序）
+        lines.sort(key=lambda ln: ln.time_ms)
+    return lyrics
+
+
+def format_timestamp(ms: int, digits: int = 2) -> str:
+    """毫秒 → mm:ss.xx（digits=3 时为 mm:ss.xxx）；分钟超过 99 时按实际位数输出。"""
+    ms = max(0, ms)
+    minutes, rem = divmod(ms, 60000)
+    seconds, millis = divmod(rem, 1000)
+    frac = f"{millis:03d}" if digits == 3 else f"{millis // 10:02d}"
+    return f"{minutes:02d}:{seconds:02d}.{frac}"
+
+
+def dump_lrc(lyrics: Lyrics, digits: int = 2) -> str:
+    out = [f"[{k}:{v}]" for k, v in lyrics.tags.items()]
+    out.extend(f"[{format_timestamp(ln.time_ms, digits)}]{ln.text}" for ln in lyrics.lines)
+    return "\n".join(out)
+
+
+def _join(a: str, b: str, sep: str) -> str:
+    if a and b:
+        return f"{a}{sep}{b}"
+    return a or b
+
+
+def merge(
+    original: Lyrics,
+    translation: Lyrics,
+    tolerance_ms: int = DEFAULT_TOLERANCE_MS,
+    sep: str = " / ",
+) -> Lyrics:
+    """将翻译并入原文：时间差不超过 tolerance_ms 的最近两行合并为“原文 / 翻译”，
+    无法配对的行原样保留。两侧行列表须已按时间升序（parse_lrc 的输出即满足）。"""
+    a, b = original.lines, translation.lines
+    out: list[LrcLine] = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        x, y = a[i], b[j]
+        if y.time_ms < x.time_ms - tolerance_ms:
+            out.append(LrcLine(y.time_ms, y.text))
+            j += 1
+            continue
+        if y.time_ms > x.time_ms + tolerance_ms:
+            out.append(LrcLine(x.time_ms, x.text))
+            i += 1
+            continue
+        d = abs(x.time_ms - y.time_ms)
+        if i + 1 < len(a) and abs(a[i + 1].time_ms - y.time_ms) < d:
+            # 翻译行离下一行原文更近
+            out.append(LrcLine(x.time_ms, x.text))
+            i += 1
+            continue
+        if j + 1 < len(b) and abs(b[j + 1].time_ms - x.time_ms) < d:
+            out.append(LrcLine(y.time_ms, y.text))
+            j += 1
+            continue
+        out.append(LrcLine(x.time_ms, _join(x.text, y.text, sep)))
+        i += 1
+        j += 1
+    out.extend(LrcLine(x.time_ms, x.text) for x in a[i:])
+    out.extend(LrcLine(y.time_ms, y.text) for y in b[j:])
+
+    tags = dict(original.tags)
+    for k, v in translation.tags.items():
+        tags.setdefault(k, v)
+    return Lyrics(tags, out)
+
+
+def merge_lrc(lrc: str, tlyric: str, tolerance_ms: int = DEFAULT_TOLERANCE_MS) -> str:
+    """合并原文与翻译两段 LRC 文本并序列化。"""
+    return dump_lrc(merge(parse_lrc(lrc), parse_lrc(tlyric), tolerance_ms))
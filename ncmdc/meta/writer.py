@@ -72,6 +72,50 @@ def write_metadata(
         logger.warning("写入元数据失败，已跳过：%s", e)
 
 
+def read_tag_state(path: str | Path) -> dict[str, bool] | None:
+    """读取已有标签中标题/封面/歌词是否存在（中文注释）
+
+    未安装 mutagen、容器不支持或无法解析时返回 None（调用方视为需要写入）。
+    Ogg 不嵌入封面，封面一项恒为 True。
+    """
+    if mutagen is None:
+        return None
+    p = Path(path)
+    ext = p.suffix.lower()
+    try:
+        if ext == ".mp3":
+            from mutagen.id3 import ID3, ID3NoHeaderError  # type: ignore
+
+            try:
+                tags = ID3(str(p))
+            except ID3NoHeaderError:
+                return {"title": False, "cover": False, "lyrics": False}
+            return {
+                "title": bool(tags.getall("TIT2")),
+                "cover": bool(tags.getall("APIC")),
+                "lyrics": bool(tags.getall("USLT")),
+            }
+        if ext == ".flac":
+            from mutagen.flac import FLAC  # type: ignore
+
+            audio = FLAC(str(p))
+            return {"title": "title" in audio, "cover": bool(audio.pictures), "lyrics": "lyrics" in audio}
+        if ext in (".m4a", ".mp4"):
+            from mutagen.mp4 import MP4  # type: ignore
+
+            tags = MP4(str(p)).tags or {}
+            return {"title": "\xa9nam" in tags, "cover": "covr" in tags, "lyrics": "\xa9lyr" in tags}
+        if ext in (".ogg", ".oga"):
+            audio = mutagen.File(str(p))  # type: ignore
+            if audio is None:
+                return None
+            tags = audio.tags or {}
+            return {"title": "title" in tags, "cover": True, "lyrics": "lyrics" in tags}
+    except Exception:
+        return None
+    return None
+
+
 def _write_mp3(
     path: Path,
     title: str,
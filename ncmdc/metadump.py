@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+# 说明：
+# --dump-meta 的聚合输出。默认每首生成一个 <stem>.meta.json；对象存储 / NFS 上十万个小文件的开销
+# 远大于其字节数，下游也只是再把它们拼起来。聚合模式下整次运行只写一个文件：
+# - jsonl：每首一行 {"source", "output", "parsed", "raw"}，带大缓冲顺序追加；重复运行追加到已有文件末尾，
+#   同一 source 以最后一行为准；
+# - sqlite：tracks_meta 表（以 source 为主键，重复运行覆盖旧记录），按批提交事务。
+# 两者都每满一批或每隔 _FLUSH_SECONDS 秒（后台线程，空闲时同样生效）落一次，--watch / daemon 这类常驻运行被中止时最多丢失最近一批。
+# 多个转换线程共用同一个写入器，内部加锁；调用方负责 close()（未满一批的记录在此提交）。
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+DUMP_META_FORMATS = ("json", "jsonl", "sqlite")
+DEFAULT_FILENAMES = {"jsonl": "ncm-meta.jsonl", "sqlite": "ncm-meta.sqlite"}
+
+# jsonl 写缓冲大小；每批的记录数（jsonl 刷新、sqlite 事务）与最长落盘间隔（秒）
+_BUFFER = 1024 * 1024
+_BATCH = 500
+_FLUSH_SECONDS = 5.0
+
+
+def meta_record(source: str, output: str | None, parsed: dict | None, raw: dict | None) -> dict:
+    return {"source": source, "output": output, "parsed": parsed or {}, "raw": raw or {}}
+
+
+class MetaWriter:
+    """聚合 meta 写入器基类（线程安全）。"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._closed = threading.Event()
+        self._flusher: threading.Thread | None = None
+
+    def _added(self) -> None:
+        # 在锁内调用：满一批立即落盘，否则由后台线程按间隔落盘（空闲时也不会一直留在缓冲里）
+        self._unflushed += 1
+        if self._unflushed >= _BATCH:
+            self._flush_locked()
+        elif self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="ncmdc-metadump", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(_FLUSH_SECONDS):
+            with self._lock:
+                if self._unflushed and not self._closed.is_set():
+                    self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._unflushed = 0
+        self._flush()
+
+    def _flush(self) -> None:
+        pass
+
+    def _stop_flusher(self) -> None:
+        self._closed.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+
+    def add(self, record: dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> MetaWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class JsonlMetaWriter(MetaWriter):
+    def __init__(self, path: str | Path) -> None:
+        super().__init__(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = self.path.open("a", encoding="utf-8", buffering=_BUFFER)
+        # 上次运行被中止时可能留下不完整的末行：另起一行，不与新记录拼在一起
+        if self._fp.tell() > 0 and not _ends_with_newline(self.path):
+            self._fp.write("\n")
+
+    def add(self, record: dict) -> None:
+        # 先在锁外序列化，锁内只做一次写入，行不会交错
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._fp.write(line)
+            self.count += 1
+            self._added()
+
+    def _flush(self) -> None:
+        self._fp.flush()
+
+    def close(self) -> None:
+        self._stop_flusher()
+        with self._lock:
+            if not self._fp.closed:
+                self._fp.close()
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with path.open("rb") as fp:
+        fp.seek(-1, 2)
+        return fp.read(1) == b"\n"
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks_meta (
+    source TEXT PRIMARY KEY,
+    output TEXT,
+    song_id INTEGER,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    format TEXT,
+    parsed_json TEXT NOT NULL,
+    raw_json TEXT NOT NULL
+);
+"""
+
+_INSERT = (
+    "INSERT INTO tracks_meta (source, output, song_id, title, artist, album, format, parsed_json, raw_json) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(source) DO UPDATE SET output = excluded.output, song_id = excluded.song_id, "
+    "title = excluded.title, artist = excluded.artist, album = excluded.album, format = excluded.format, "
+    "parsed_json = excluded.parsed_json, raw_json = excluded.raw_json"
+)
+
+
+class SqliteMetaWriter(MetaWriter):
+    def __init__(self, path: str | Path) -> None:
+        super().__init__(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 连接由多个转换线程共用，所有访问都在锁内
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._pending: list[tuple] = []
+
+    def add(self, record: dict) -> None:
+        parsed = record.get("parsed") or {}
+        try:
+            song_id = int(parsed["song_id"]) if parsed.get("song_id") not in (None, "") else None
+        except (TypeError, ValueError):
+            song_id = None
+        row = (
+            record["source"],
+            record.get("output"),
+            song_id,
+            parsed.get("title") or None,
+            " / ".join(parsed.get("artists") or []) or None,
+            parsed.get("album") or None,
+            parsed.get("format") or None,
+            json.dumps(parsed, ensure_ascii=False),
+            json.dumps(record.get("raw") or {}, ensure_ascii=False),
+        )
+        with self._lock:
+            self._pending.append(row)
+            self.count += 1
+            self._added()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(_INSERT, self._pending)
+        self._pending.clear()
+
+    def close(self) -> None:
+        self._stop_flusher()
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                if self._pending:
+                    self._flush()
+            finally:
+                self._conn.close()
+                self._conn = None  # type: ignore[assignment]
+
+
+def open_meta_writer(fmt: str, path: str | Path) -> MetaWriter:
+    if fmt == "jsonl":
+        return JsonlMetaWriter(path)
+    if fmt == "sqlite":
+        return SqliteMetaWriter(path)
+    raise ValueError(f"unsupported aggregate meta format: {fmt}")
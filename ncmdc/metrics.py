@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+# 说明：
+# 长时间运行的实时指标（Prometheus 文本格式 0.0.4）：
+# - 计数：按状态的文件数、输入/输出字节、在线歌词/封面获取失败次数；
+# - 直方图：各阶段耗时（header / decrypt / verify / lyrics / tags / post / total，取自 ConvertResult.timings）；
+# - 仪表：已派发但未完成的文件数（worker 队列深度）。
+# 两种导出方式：本地 HTTP 端点（--metrics-listen，GET /metrics），
+# 或定期原子重写的文本文件（--metrics-textfile，交给 node-exporter 的 textfile collector）。
+# 只用标准库；转换线程只在锁内累加数值，格式化在抓取/写文件时进行。
+
+import bisect
+import os
+import threading
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if isinstance(v, float) and not v.is_integer():
+        # 与整数一样用定点写法（repr 对很小/很大的值会给出 1e-05 这类科学计数法）
+        return format(Decimal(repr(v)), "f")
+    return str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[k]) for k in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每个标签组合：(各桶计数（非累计）, 总和, 样本数)
+        self._series: dict[tuple[str, ...], tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, n = self._series.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[i] += 1
+            self._series[key] = (counts, total + value, n + 1)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            s = self._series.get(self._key(labels))
+        return s[2] if s else 0
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, (list(c), t, n)) for k, (c, t, n) in self._series.items())
+        out: list[str] = []
+        for key, (counts, total, n) in items:
+            acc = 0
+            for bound, c in zip((*self.buckets, float("inf")), counts):
+                acc += c
+                le = 'le="' + _num(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"duplicate metric: {metric.name}")
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: list[str] = []
+        for m in metrics:
+            lines += m.header()
+            lines += m.samples()
+        return "\n".join(lines) + "\n"
+
+
+class ConversionMetrics:
+    """转换流程的指标集合；record() 接收 ConvertResult。"""
+
+    STAGES = ("header", "decrypt", "verify", "lyrics", "tags", "post", "total")
+
+    def __init__(self, registry: Registry | None = None) -> None:
+        self.registry = registry or Registry()
+        r = self.registry
+        self.files = r.register(Counter("ncmdc_files_total", "Processed .ncm files by status.", ["status"]))
+        self.bytes_in = r.register(Counter("ncmdc_bytes_in_total", "Bytes of .ncm input read by completed conversions."))
+        self.bytes_out = r.register(Counter("ncmdc_bytes_out_total", "Bytes of decrypted audio written."))
+        self.stage = r.register(Histogram("ncmdc_stage_seconds", "Per-file stage latency in seconds.", ["stage"]))
+        self.fetch_errors = r.register(
+            Counter("ncmdc_fetch_errors_total", "Failed online lookups (lyrics, cover).", ["kind"])
+        )
+        self.queue_depth = r.register(Gauge("ncmdc_queue_depth", "Files dispatched to workers but not finished."))
+        for status in ("ok", "skip", "fail"):
+            self.files.inc(0, status=status)
+        for kind in ("lyrics", "cover"):
+            self.fetch_errors.inc(0, kind=kind)
+
+    def record(self, result) -> None:
+        if result.status in ("ok", "skip", "fail"):
+            self.files.inc(status=result.status)
+        if result.status == "ok":
+            # 中文注释：只统计真正解密过的输入；跳过、失败（可能在读取头部时就已失败）与只补附加产物均不计
+            if result.bytes_in and result.bytes:
+                self.bytes_in.inc(result.bytes_in)
+            self.bytes_out.inc(result.bytes)
+        for stage, seconds in result.timings.items():
+            if stage in self.STAGES:
+                self.stage.observe(seconds, stage=stage)
+        for w in result.warnings:
+            if w.endswith("_fetch"):
+                self.fetch_errors.inc(kind=w[: -len("_fetch")])
+
+
+class MetricsServer:
+    """本地 HTTP 端点：GET /metrics 返回 registry.render()。port 为 0 时由系统分配（见 .port）。"""
+
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9464) -> None:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        reg = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = reg.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ncmdc-metrics", daemon=True)
+
+    def start(self) -> MetricsServer:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class TextfileExporter:
+    """定期把指标原子写入文本文件（先写临时文件再 os.replace，node-exporter 不会读到半个文件）。"""
+
+    def __init__(self, registry: Registry, path: str | Path, interval: float = 15.0) -> None:
+        self.registry = registry
+        self.path = Path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="ncmdc-metrics-textfile", daemon=True)
+
+    def write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.registry.render(), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                pass
+
+    def start(self) -> TextfileExporter:
+        self.write()
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        # 结束时写出最终值
+        self.write()
+
+
+def parse_listen(spec: str) -> tuple[str, int]:
+    """'PORT' 或 'HOST:PORT'（默认只监听 127.0.0.1）。"""
+    host, sep, port = spec.rpartition(":")
+    try:
+        return (host.strip("[]") if sep else "127.0.0.1"), int(port)
+    except ValueError:
+        raise ValueError(f"invalid --metrics-listen: {spec!r} (expected PORT or HOST:PORT)") from None
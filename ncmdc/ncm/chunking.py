@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+# 说明：
+# stream_decrypt 的自适应块大小。最合适的块大小因存储（本地 NVMe / NFS）、解密实现和文件大小而差别很大，
+# 固定 256 KB 往往不是最优。ChunkTuner 在整次运行内共享（线程安全）：
+# - 探测：从最小到上限（内存上限，每个转换线程同时只持有一块）依次试用各个 2 的幂大小，
+#   每个大小累计 probe_bytes 后计算“读取 + 解密 + 写出”的整体吞吐（MB/s）；
+# - 选定吞吐最高的大小；此后每处理 recheck_bytes 重新探测当前值及其相邻的 1/2、2 倍，
+#   存储负载或缓存状态变化后可以移动到新的最优值（爬山）。
+# 只有完整块参与统计（文件尾部的短块会拉低吞吐）。
+
+import threading
+
+DEFAULT_CHUNK = 256 * 1024
+MIN_CHUNK = 64 * 1024
+DEFAULT_MAX_CHUNK = 4 * 1024 * 1024
+
+_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024**2, "MB": 1024**2, "G": 1024**3, "GB": 1024**3}
+
+
+def parse_size(text: str) -> int:
+    """解析 '262144'、'256K'、'1M'、'2G' 这类大小（1024 进制）。"""
+    t = text.strip().upper()
+    num = t.rstrip("KMGB")
+    unit = t[len(num):]
+    if unit not in _UNITS or not num.isdigit() or int(num) <= 0:
+        raise ValueError(f"invalid size: {text!r} (expected e.g. 256K, 1M, 2G)")
+    return int(num) * _UNITS[unit]
+
+
+def parse_chunk_size(text: str) -> int | None:
+    """--chunk-size：'auto' 返回 None（自适应），否则为固定字节数。"""
+    if text.strip().lower() == "auto":
+        return None
+    return parse_size(text)
+
+
+class ChunkTuner:
+    def __init__(
+        self,
+        max_chunk: int = DEFAULT_MAX_CHUNK,
+        min_chunk: int = MIN_CHUNK,
+        initial: int = DEFAULT_CHUNK,
+        probe_bytes: int = 8 * 1024 * 1024,
+        recheck_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        max_chunk = max(min_chunk, max_chunk)
+        self.candidates: list[int] = []
+        size = min_chunk
+        while size <= max_chunk:
+            self.candidates.append(size)
+            size *= 2
+        self.max_chunk = self.candidates[-1]
+        self.probe_bytes = probe_bytes
+        self.recheck_bytes = recheck_bytes
+        self._lock = threading.Lock()
+        # 每个候选大小本轮探测累计的 (字节, 秒)
+        self._window: dict[int, list[float]] = {}
+        # 每个候选最近一次完成探测的吞吐（B/s）
+        self.throughput: dict[int, float] = {}
+        # 本轮待探测的大小（探测完毕后为空）与本轮参与比较的大小
+        self._queue = list(self.candidates)
+        self._round = list(self.candidates)
+        self._current = self._queue[0]
+        self.chosen: int = min(max(initial, self.candidates[0]), self.max_chunk)
+        self._since = 0
+        self.rounds = 0
+
+    def size(self) -> int:
+        """下一块使用的大小。"""
+        with self._lock:
+            return self._current if self._queue else self.chosen
+
+    def record(self, size: int, nbytes: int, seconds: float) -> None:
+        """上报一块的处理结果（读取 + 解密 + 写出的耗时）。"""
+        if nbytes < size or seconds <= 0:
+            return
+        with self._lock:
+            if not self._queue:
+                self._since += nbytes
+                if self._since >= self.recheck_bytes:
+                    self._start_recheck()
+                return
+            if size != self._current:
+                # 其他线程在切换前取到的旧大小
+                return
+            win = self._window.setdefault(size, [0.0, 0.0])
+            win[0] += nbytes
+            win[1] += seconds
+            if win[0] < self.probe_bytes:
+                return
+            self.throughput[size] = win[0] / win[1]
+            self._queue.pop(0)
+            if self._queue:
+                self._current = self._queue[0]
+                return
+            # 同吞吐时取较小的块（占用内存更少）
+            self.chosen = max(self._round, key=lambda s: (self.throughput[s], -s))
+            self.rounds += 1
+            self._since = 0
+
+    def _start_recheck(self) -> None:
+        i = self.candidates.index(self.chosen)
+        around = [self.chosen, *self.candidates[max(0, i - 1):i], *self.candidates[i + 1:i + 2]]
+        for s in around:
+            self._window.pop(s, None)
+        self._queue = list(around)
+        self._round = around
+        self._current = around[0]
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "mode": "auto",
+                "size": self.chosen,
+                "max": self.max_chunk,
+                "rounds": self.rounds,
+                "mb_per_s": {str(s): round(v / 1048576, 2) for s, v in sorted(self.throughput.items())},
+            }
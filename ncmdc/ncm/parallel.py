@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+# 说明：
+# 单个大文件的分段并行解密。密钥流只依赖音频内的绝对偏移（decrypt_inplace(buf, offset, key_box)），
+# 因此音频区可以切成若干区间各自解密：每个区间由 worker 自行打开源文件与输出文件，
+# 用 pread 读取、解密后 pwrite 写到输出的同一偏移，输出文件事先按最终大小预分配。
+# - process（默认）：decrypt_inplace 是纯 Python 循环，持有 GIL，只有多进程才能用满多核；
+# - thread：在同一进程内并行，仅在解密不占 GIL 的实现下（或 I/O 占主导时）有收益。
+# 进程池在同一进程内共享（按后端与 worker 数），同时转换多个大文件时不会各自再开一组进程；
+# 创建时若有运行中的日志管道（logqueue），子进程日志经其跨进程队列汇入，管道停止前关闭进程池。
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from .cipher import decrypt_inplace
+
+# 每个区间的大小（任务粒度，区间数多于 worker 数以均衡负载）
+RANGE_SIZE = 32 * 1024 * 1024
+# 区间内每次读写的块大小
+_CHUNK = 1024 * 1024
+
+BACKENDS = ("process", "thread")
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def split_ranges(size: int, range_size: int = RANGE_SIZE) -> list[tuple[int, int]]:
+    """把 [0, size) 切成不超过 range_size 的区间（边界按 256 对齐，与密钥流周期一致）。"""
+    step = max(256, range_size // 256 * 256)
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def _pread(fd: int, n: int, pos: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, n, pos)
+    os.lseek(fd, pos, os.SEEK_SET)
+    return os.read(fd, n)
+
+
+def _pwrite(fd: int, data, pos: int) -> None:
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            n = os.pwrite(fd, view, pos)
+        else:
+            os.lseek(fd, pos, os.SEEK_SET)
+            n = os.write(fd, view)
+        view, pos = view[n:], pos + n
+
+
+def decrypt_range(
+    src: str,
+    dst: str,
+    audio_start: int,
+    key_box: bytes,
+    start: int,
+    end: int,
+) -> int:
+    """解密音频区间 [start, end) 并写入 dst 的相同偏移，返回处理的字节数（进程池任务，参数需可 pickle）。"""
+    flags = getattr(os, "O_BINARY", 0)
+    src_fd = os.open(src, os.O_RDONLY | flags)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | flags)
+        try:
+            pos = start
+            while pos < end:
+                chunk = _pread(src_fd, min(_CHUNK, end - pos), audio_start + pos)
+                if not chunk:
+                    raise EOFError(f"unexpected EOF at audio offset {pos}")
+                buf = bytearray(chunk)
+                decrypt_inplace(buf, pos, key_box)
+                _pwrite(dst_fd, buf, pos)
+                pos += len(buf)
+        except Exception as e:
+            # 父进程只拿到异常本身；出错的区间与进程在这里记下
+            _LOGGER.warning("split range [%d, %d) failed in pid %d: %s: %s", start, end, os.getpid(), src, e)
+            raise
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return end - start
+
+
+def preallocate(path: str | Path, size: int) -> None:
+    """创建（截断）输出文件并预分配到 size 字节：支持 posix_fallocate 时分配真实块，否则只设置长度。"""
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        if size <= 0:
+            return
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                # 部分文件系统（如 tmpfs 旧内核、网络文件系统）不支持，退回 ftruncate
+                pass
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+_POOLS: dict[tuple[str, int], Executor] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def shared_executor(backend: str, workers: int) -> Executor:
+    """按 (后端, worker 数) 复用同一个池；进程池使用 spawn，避免在多线程进程中 fork。"""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown split backend: {backend}")
+    key = (backend, workers)
+    with _POOLS_LOCK:
+        ex = _POOLS.get(key)
+        if ex is None:
+            if backend == "process":
+                ex = _process_pool(key, workers)
+            else:
+                ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ncmdc-split")
+            _POOLS[key] = ex
+        return ex
+
+
+def _process_pool(key: tuple[str, int], workers: int) -> Executor:
+    # 在 _POOLS_LOCK 内调用
+    from ..logqueue import active_pipeline, worker_initializer
+
+    ctx = multiprocessing.get_context("spawn")
+    pipeline = active_pipeline()
+    if pipeline is None:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+    ex = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=worker_initializer, initargs=pipeline.worker_args())
+    # 中文注释：子进程日志指向该管道的队列，管道停止前关闭进程池（子进程退出时送出剩余日志）
+    pipeline.on_stop(lambda: _drop_pool(key, ex))
+    return ex
+
+
+def _drop_pool(key: tuple[str, int], ex: Executor) -> None:
+    with _POOLS_LOCK:
+        if _POOLS.get(key) is ex:
+            del _POOLS[key]
+    ex.shutdown(wait=True)
+
+
+def parallel_decrypt(
+    src: str | Path,
+    dst: str | Path,
+    audio_start: int,
+    size: int,
+    key_box: bytes,
+    workers: int,
+    backend: str = "process",
+    range_size: int = RANGE_SIZE,
+) -> int:
+    """分段并行解密 src 的音频区到 dst（预分配后按偏移写入），返回写出的字节数。
+
+    任一区间失败时取消其余区间、删除不完整的输出并抛出异常（预分配的文件长度已是最终大小，
+    若保留会被下次运行误认为已完成）。
+    """
+    src, dst = str(src), str(dst)
+    preallocate(dst, size)
+    ex = shared_executor(backend, max(1, workers))
+    futures = [ex.submit(decrypt_range, src, dst, audio_start, key_box, a, b) for a, b in split_ranges(size, range_size)]
+    try:
+        written = sum(f.result() for f in futures)
+    except BaseException:
+        for f in futures:
+            f.cancel()
+        wait(futures)
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        raise
+    return written
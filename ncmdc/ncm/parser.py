@@ -5,12 +5,16 @@ import json
 import io
 import logging
 import struct
+import time
 from dataclasses import dataclass
-from typing import BinaryIO
+from typing import TYPE_CHECKING, BinaryIO, Callable, Iterable
 
 from ..crypto.aes import aes128_ecb_decrypt, pkcs7_unpad
 from .cipher import build_key_box, decrypt_inplace
 
+if TYPE_CHECKING:
+    from .chunking import ChunkTuner
+
 
 MAGIC_HEADER = b"CTENFDAM"
 
@@ -47,39 +51,84 @@ class NcmMeta:
     raw_json: bytes | None
 
 
+def _is_seekable(fp: BinaryIO) -> bool:
+    try:
+        return bool(fp.seekable())
+    except Exception:
+        return False
+
+
 class NcmDecoder:
-    def __init__(self, fp: BinaryIO, logger: logging.Logger | None = None) -> None:
+    """NCM 解析与解密。
+
+    seekable=False 时只做前向读取（如 tar/zip 归档成员流、管道）：头部按顺序读取，
+    嗅探用的 64 字节暂存起来，stream_decrypt 时先输出暂存部分再继续读取；
+    此模式下 stream_decrypt 只能调用一次。
+    """
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        logger: logging.Logger | None = None,
+        seekable: bool | None = None,
+        size: int | None = None,
+    ) -> None:
         self._fp = fp
         self._logger = logger or logging.getLogger(__name__)
+        self._seekable = _is_seekable(fp) if seekable is None else seekable
+        # 源数据总大小（前向模式下由调用方提供，如归档成员大小）
+        self._size = size
+        # 前向模式下已从流中消费的字节数
         self._offset = 0
         self._key_box: bytes | None = None
         self._audio_start: int | None = None
         self._meta: NcmMeta | None = None
         self._cover: bytes | None = None
+        # 前向模式：嗅探时读出的音频头（密文），以及音频流是否已被消费
+        self._head: bytes | None = None
+        self._consumed = False
 
     def validate(self) -> None:
         # magic header
-        header = self._fp.read(len(MAGIC_HEADER))
+        header = self._read(len(MAGIC_HEADER))
         if header != MAGIC_HEADER:
             raise NcmMagicHeaderError("ncm magic header not match")
 
         # skip 2 bytes gap
-        self._fp.seek(2, io.SEEK_CUR)
+        self._skip(2)
 
         key = self._read_key_data()
         self._read_meta_data()
         # skip 5 bytes gap (align to cover frame start)
-        self._fp.seek(5, io.SEEK_CUR)
+        self._skip(5)
         self._read_cover_data()
 
         self._key_box = build_key_box(key)
 
+    def _read(self, n: int) -> bytes:
+        buf = self._fp.read(n) or b""
+        self._offset += len(buf)
+        return buf
+
     def _read_exact(self, n: int) -> bytes:
-        buf = self._fp.read(n)
-        if buf is None or len(buf) != n:
+        buf = self._read(n)
+        if len(buf) != n:
             raise EOFError("unexpected EOF")
         return buf
 
+    def _tell(self) -> int:
+        return self._fp.seek(0, io.SEEK_CUR) if self._seekable else self._offset
+
+    def _skip(self, n: int) -> None:
+        if self._seekable:
+            self._fp.seek(n, io.SEEK_CUR)
+            return
+        while n > 0:
+            got = len(self._read(min(n, 64 * 1024)))
+            if not got:
+                raise EOFError("unexpected EOF")
+            n -= got
+
     def _read_key_data(self) -> bytes:
         b_key_len = self._read_exact(4)
         i_key_len = struct.unpack("<I", b_key_len)[0]
@@ -131,7 +180,7 @@ class NcmDecoder:
         cover_frame_len = struct.unpack("<I", b_cover_frame_len)[0]
 
         # mark cover frame start offset
-        cover_frame_start = self._fp.seek(0, io.SEEK_CUR)
+        cover_frame_start = self._tell()
 
         # cover length
         b_cover_len = self._read_exact(4)
@@ -142,7 +191,13 @@ class NcmDecoder:
 
         # audio start offset = cover_frame_start + cover_frame_len + 4
         offset_audio_data = cover_frame_start + cover_frame_len + 4
-        self._fp.seek(offset_audio_data, io.SEEK_SET)
+        if self._seekable:
+            self._fp.seek(offset_audio_data, io.SEEK_SET)
+        else:
+            gap = offset_audio_data - self._offset
+            if gap < 0:
+                raise NcmCoverReadError("cover frame shorter than cover data")
+            self._skip(gap)
         self._audio_start = offset_audio_data
 
     def sniff_audio_ext(self) -> str:
@@ -151,33 +206,117 @@ class NcmDecoder:
         if self._audio_start is None:
             raise RuntimeError("decoder not validated")
         # read 64 bytes header from audio start
-        pos = self._fp.seek(0, io.SEEK_CUR)
-        try:
-            self._fp.seek(self._audio_start, io.SEEK_SET)
-            header = self._fp.read(64) or b""
-            # decrypt header for proper sniff
-            if self._key_box is not None and header:
-                buf = bytearray(header)
-                decrypt_inplace(buf, 0, self._key_box)
-                header = bytes(buf)
-        finally:
-            self._fp.seek(pos, io.SEEK_SET)
+        if self._seekable:
+            pos = self._fp.seek(0, io.SEEK_CUR)
+            try:
+                self._fp.seek(self._audio_start, io.SEEK_SET)
+                header = self._fp.read(64) or b""
+            finally:
+                self._fp.seek(pos, io.SEEK_SET)
+        else:
+            if self._head is None:
+                if self._consumed:
+                    raise RuntimeError("audio stream already consumed")
+                self._head = self._read(64)
+            header = self._head
+        # decrypt header for proper sniff
+        if self._key_box is not None and header:
+            buf = bytearray(header)
+            decrypt_inplace(buf, 0, self._key_box)
+            header = bytes(buf)
         return sniff_audio_extension(header, fallback=".mp3")
 
-    def stream_decrypt(self, out: BinaryIO, chunk_size: int = 256 * 1024) -> None:
+    def audio_size(self) -> int | None:
+        """解密后音频的字节数（源大小 - audio_start）；前向模式且未提供 size 时返回 None。"""
+        if self._audio_start is None:
+            raise RuntimeError("decoder not validated")
+        total = self._size
+        if total is None:
+            if not self._seekable:
+                return None
+            pos = self._fp.seek(0, io.SEEK_CUR)
+            total = self._fp.seek(0, io.SEEK_END)
+            self._fp.seek(pos, io.SEEK_SET)
+        return max(0, total - self._audio_start)
+
+    @property
+    def audio_start(self) -> int | None:
+        """音频区在源数据中的起始偏移（validate 之后有效）。"""
+        return self._audio_start
+
+    @property
+    def key_box(self) -> bytes | None:
+        return self._key_box
+
+    def read_decrypted(self, offset: int, size: int) -> bytes:
+        """随机读取解密后音频 [offset, offset+size) 区间（密钥流只依赖绝对偏移，需可 seek）。"""
+        if self._key_box is None or self._audio_start is None:
+            raise RuntimeError("decoder not validated")
+        if not self._seekable:
+            raise RuntimeError("random access requires a seekable source")
+        self._fp.seek(self._audio_start + offset, io.SEEK_SET)
+        buf = bytearray(self._fp.read(size) or b"")
+        decrypt_inplace(buf, offset, self._key_box)
+        return bytes(buf)
+
+    def stream_decrypt(
+        self,
+        out: BinaryIO,
+        chunk_size: int = 256 * 1024,
+        observers: Iterable[Callable[[bytes], None]] | None = None,
+        buffer: bytearray | memoryview | None = None,
+        tuner: ChunkTuner | None = None,
+    ) -> int:
+        """将音频解密写入 out，返回写出的字节数。
+
+        observers：每个解密后的块写出后依次回调（如摘要、容器校验），与写出同一遍完成。
+        buffer：给定时（如页对齐的 mmap）以 readinto 复用这块缓冲、不再逐块分配，块大小即缓冲大小；
+        此时回调收到的是缓冲的视图，下一块会覆盖其内容，observer 不得保留引用。
+        tuner：给定时每块的大小由 tuner 决定，并把每块“读取 + 解密 + 写出”的耗时报告给它（自适应块大小）。
+        """
+        observers = tuple(observers or ())
         if self._key_box is None or self._audio_start is None:
             raise RuntimeError("decoder not validated")
-        self._fp.seek(self._audio_start, io.SEEK_SET)
         offset = 0
         kb = self._key_box
+        if self._seekable:
+            self._fp.seek(self._audio_start, io.SEEK_SET)
+        else:
+            if self._consumed:
+                raise RuntimeError("audio stream already consumed")
+            self._consumed = True
+            head, self._head = self._head, None
+            if head:
+                buf = bytearray(head)
+                decrypt_inplace(buf, 0, kb)
+                out.write(buf)
+                for cb in observers:
+                    cb(buf)
+                offset = len(buf)
+        readinto = getattr(self._fp, "readinto", None) if buffer is not None else None
+        view = memoryview(buffer) if readinto is not None else None  # type: ignore[arg-type]
         while True:
-            chunk = self._fp.read(chunk_size)
-            if not chunk:
-                break
-            buf = bytearray(chunk)
+            if tuner is not None:
+                chunk_size = tuner.size()
+                t = time.perf_counter()
+            if view is not None:
+                n = readinto(view[:chunk_size] if tuner is not None else view)  # type: ignore[misc]
+                if not n:
+                    break
+                buf = view[:n]
+            else:
+                chunk = self._fp.read(chunk_size)
+                if not chunk:
+                    break
+                buf = bytearray(chunk)
             decrypt_inplace(buf, offset, kb)
             out.write(buf)
+            for cb in observers:
+                cb(buf)
             offset += len(buf)
+            if tuner is not None:
+                tuner.record(chunk_size, len(buf), time.perf_counter() - t)
+        return offset
 
     def get_audio_meta(self) -> dict | None:
         if not self._meta or not self._meta.raw_json:
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+# 说明：
+# 输出落地方式的抽象。转换流程只面向“相对路径 + 写入流”，具体落到
+# 目录、tar/zip 归档还是 stdout（tar 流）由这里的实现决定。
+# - DirectorySink：默认行为，写到输出目录下；
+# - TarSink：成员大小已知且目标可回写（未压缩的 .tar 文件）时直接写 tar 头再流式写数据，不经过临时文件；
+#   写入中途失败则回到成员头，改写为 <name>.partial 并带 PAX 记录 ncmdc.failed，解包得不到同名的残缺音轨。
+#   stdout / .tar.gz 无法回写成员头，大小未知时也一样：先缓冲（内存/临时文件），成功后才整体写入；
+# - ZipSink：按成员流式写入（ZIP_STORED，音频本身已压缩）；
+# - S3Sink（ncmdc/s3.py）：s3://bucket/prefix，分片并发上传到 S3 兼容对象存储。
+# 归档类输出是单一数据流，内部用锁保证同一时刻只写一个成员。
+# tarfile/zipfile/gzip 仅在选择归档输出时才导入，普通目录输出不承担其导入开销。
+
+import io
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, BinaryIO, Iterator
+
+if TYPE_CHECKING:
+    import zipfile
+
+ARCHIVE_OUTPUT_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".zip")
+
+
+class OutputSink:
+    """输出目标基类；rel 为相对输出根目录的 POSIX 路径。"""
+
+    def describe(self, rel: PurePosixPath) -> str:
+        raise NotImplementedError
+
+    def exists(self, rel: PurePosixPath) -> bool:
+        raise NotImplementedError
+
+    def local_path(self, rel: PurePosixPath) -> Path | None:
+        """若输出落在本地文件系统，返回其路径（供 mutagen 写标签、查找同名歌词）。"""
+        return None
+
+    @contextmanager
+    def open(self, rel: PurePosixPath, size: int | None = None) -> Iterator[BinaryIO]:
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    def write_bytes(self, rel: PurePosixPath, data: bytes) -> None:
+        with self.open(rel, size=len(data)) as fp:
+            fp.write(data)
+
+    def write_text(self, rel: PurePosixPath, text: str, encoding: str = "utf-8") -> None:
+        self.write_bytes(rel, text.encode(encoding))
+
+    def close(self) -> None:
+        pass
+
+
+class DirectorySink(OutputSink):
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def local_path(self, rel: PurePosixPath) -> Path:
+        return self.root.joinpath(*rel.parts)
+
+    def describe(self, rel: PurePosixPath) -> str:
+        return str(self.local_path(rel))
+
+    def exists(self, rel: PurePosixPath) -> bool:
+        return self.local_path(rel).exists()
+
+    @contextmanager
+    def open(self, rel: PurePosixPath, size: int | None = None) -> Iterator[BinaryIO]:
+        p = self.local_path(rel)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        with p.open("wb") as fp:
+            yield fp
+
+
+class _ArchiveSink(OutputSink):
+    def __init__(self, target: str | Path | BinaryIO) -> None:
+        self._target = target
+        self._lock = threading.Lock()
+        self._names: set[str] = set()
+
+    def describe(self, rel: PurePosixPath) -> str:
+        name = "-" if not isinstance(self._target, (str, Path)) else str(self._target)
+        return f"{name}!{rel}"
+
+    def exists(self, rel: PurePosixPath) -> bool:
+        # 归档每次运行都是新建的，只会与本次已写入的成员冲突
+        return str(rel) in self._names
+
+
+class _CountingWriter(io.RawIOBase):
+    def __init__(self, fp: BinaryIO, limit: int) -> None:
+        self._fp = fp
+        self._limit = limit
+        self.written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        n = len(b)
+        if self.written + n > self._limit:
+            # 超出声明大小会破坏后续成员的对齐，写出前拒绝
+            raise OSError(f"tar member overflow: declared {self._limit}, got more")
+        self._fp.write(b)
+        self.written += n
+        return n
+
+
+class TarSink(_ArchiveSink):
+    """手写 ustar/pax 成员头，使成员数据可以边解密边写出（无需先落盘统计大小）。"""
+
+    # 与 tarfile.BLOCKSIZE / tarfile.RECORDSIZE 相同
+    _BLOCK = 512
+    _RECORD = 20 * 512
+
+    def __init__(self, target: str | Path | BinaryIO, compress: bool = False) -> None:
+        super().__init__(target)
+        self._compress = compress
+        self._raw: BinaryIO | None = None
+        self._fp: BinaryIO | None = None
+        self._offset = 0
+
+    def _stream(self) -> BinaryIO:
+        if self._fp is None:
+            if isinstance(self._target, (str, Path)):
+                self._raw = open(self._target, "wb")
+                fp: BinaryIO = self._raw
+            else:
+                fp = self._target
+            if self._compress:
+                import gzip
+
+                fp = gzip.GzipFile(fileobj=fp, mode="wb")  # type: ignore[assignment]
+            self._fp = fp
+        return self._fp
+
+    def _write(self, data: bytes) -> None:
+        self._stream().write(data)
+        self._offset += len(data)
+
+    @staticmethod
+    def _header(name: str, size: int, pax: dict[str, str] | None = None) -> bytes:
+        import tarfile
+
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mode = 0o644
+        info.mtime = int(time.time())
+        if pax:
+            info.pax_headers = pax
+        return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+    def _add_header(self, rel: PurePosixPath, size: int) -> None:
+        self._write(self._header(str(rel), size))
+
+    def _member_headers(self, rel: PurePosixPath, size: int) -> tuple[bytes, bytes]:
+        """(正常成员头, 失败时改写用的成员头)；两者长度相同，失败时可原地覆盖。"""
+        failed = self._header(f"{rel}.partial", size, {"ncmdc.failed": "incomplete member"})
+        ok = self._header(str(rel), size)
+        # 中文注释：用 PAX comment 记录把较短的一方补到相同块数（每次增加不足一块，不会越过目标长度）
+        pad = 0
+        while len(ok) != len(failed):
+            pad += 64
+            if len(ok) < len(failed):
+                ok = self._header(str(rel), size, {"comment": " " * pad})
+            else:
+                failed = self._header(f"{rel}.partial", size, {"ncmdc.failed": "incomplete member", "comment": " " * pad})
+        return ok, failed
+
+    def _rewritable(self) -> bool:
+        # 未压缩且可 seek 的目标才能回到成员头改写；stdout 管道、gzip 流不行
+        if self._compress:
+            return False
+        try:
+            return self._stream().seekable()
+        except (AttributeError, ValueError, OSError):
+            return False
+
+    def _pad(self, size: int) -> None:
+        rem = size % self._BLOCK
+        if rem:
+            self._write(b"\0" * (self._BLOCK - rem))
+
+    @contextmanager
+    def open(self, rel: PurePosixPath, size: int | None = None) -> Iterator[BinaryIO]:
+        with self._lock:
+            self._names.add(str(rel))
+            if size is None or not self._rewritable():
+                import tempfile
+
+                # 大小未知或无法回写成员头：先缓冲（超过 32MB 落到临时文件），成功后整体写入；
+                # 失败时什么都不写
+                try:
+                    with tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024) as spool:
+                        yield spool  # type: ignore[misc]
+                        n = spool.tell()
+                        if size is not None and n != size:
+                            raise OSError(f"tar member size mismatch for {rel}: declared {size}, wrote {n}")
+                        spool.seek(0)
+                        self._add_header(rel, n)
+                        while True:
+                            chunk = spool.read(1024 * 1024)
+                            if not chunk:
+                                break
+                            self._write(chunk)
+                        self._pad(n)
+                except BaseException:
+                    self._names.discard(str(rel))
+                    raise
+                return
+
+            fp = self._stream()
+            header, failed_header = self._member_headers(rel, size)
+            start = fp.tell()
+            self._write(header)
+            w = _CountingWriter(fp, size)
+            done = False
+            try:
+                yield w  # type: ignore[misc]
+                done = w.written == size
+            finally:
+                # 写入中途失败或不足：补零到声明大小，保证后续成员仍可被正确读取
+                self._offset += w.written
+                if w.written < size:
+                    self._write(b"\0" * (size - w.written))
+                self._pad(size)
+                if not done:
+                    # 已写出的成员头改成 <name>.partial（长度相同，原地覆盖）
+                    end = fp.tell()
+                    fp.seek(start)
+                    fp.write(failed_header)
+                    fp.seek(end)
+                    self._names.discard(str(rel))
+            if w.written != size:
+                raise OSError(f"tar member size mismatch for {rel}: declared {size}, wrote {w.written}")
+
+    def close(self) -> None:
+        with self._lock:
+            fp = self._stream()
+            # 两个全零块作为结束标记，再补齐到 record 边界（与 tarfile 行为一致）
+            self._write(b"\0" * (self._BLOCK * 2))
+            rem = self._offset % self._RECORD
+            if rem:
+                self._write(b"\0" * (self._RECORD - rem))
+            if self._compress:
+                fp.close()
+            if self._raw is not None:
+                self._raw.close()
+            else:
+                self._target.flush()  # type: ignore[union-attr]
+
+
+class ZipSink(_ArchiveSink):
+    def __init__(self, target: str | Path | BinaryIO) -> None:
+        super().__init__(target)
+        self._zf: zipfile.ZipFile | None = None
+
+    def _zip(self) -> zipfile.ZipFile:
+        import zipfile
+
+        if self._zf is None:
+            self._zf = zipfile.ZipFile(self._target, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        return self._zf
+
+    @contextmanager
+    def open(self, rel: PurePosixPath, size: int | None = None) -> Iterator[BinaryIO]:
+        import zipfile
+
+        with self._lock:
+            self._names.add(str(rel))
+            info = zipfile.ZipInfo(str(rel), date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            if size is not None:
+                info.file_size = size
+            force64 = size is None or size >= zipfile.ZIP64_LIMIT
+            with self._zip().open(info, "w", force_zip64=force64) as fp:
+                yield fp  # type: ignore[misc]
+
+    def close(self) -> None:
+        with self._lock:
+            self._zip().close()
+
+
+def is_archive_output(spec: str) -> bool:
+    return spec == "-" or spec.lower().endswith(ARCHIVE_OUTPUT_SUFFIXES)
+
+
+def is_s3_url(spec: str) -> bool:
+    return spec[:5].lower() == "s3://"
+
+
+def open_output(spec: str) -> OutputSink:
+    """根据 -o 参数创建输出：'-' 为写到 stdout 的 tar 流，.tar/.tar.gz/.tgz/.zip 为归档，
+    s3://bucket/prefix 为对象存储（凭据取自环境变量），其余为目录。"""
+    if spec == "-":
+        return TarSink(sys.stdout.buffer)
+    if is_s3_url(spec):
+        from .s3 import S3Sink
+
+        return S3Sink.from_url(spec)
+    lower = spec.lower()
+    if lower.endswith(".zip"):
+        return ZipSink(spec)
+    if lower.endswith((".tar.gz", ".tgz")):
+        return TarSink(spec, compress=True)
+    if lower.endswith(".tar"):
+        return TarSink(spec)
+    return DirectorySink(spec)
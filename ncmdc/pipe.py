@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+# 说明：
+# --pipe-to：解密结果直接写入外部命令的 stdin（转码器、指纹工具等），不落临时文件。
+# - 命令模板先按 shell 规则切分为参数，再逐个参数替换占位符（不经过 shell，元数据中的特殊字符不会被解释）；
+# - 占位符：{ext} {stem} {source} {output} {title} {artist} {album} {song_id} {size}，字面花括号写作 {{ }}；
+# - 同样的字段以 NCMDC_EXT、NCMDC_TITLE 等环境变量传给子进程；
+# - 子进程提前关闭 stdin（只读取开头部分）不视为错误，结果以退出码为准；调用方据写入字节数标记 partial。
+
+import os
+import shlex
+import subprocess
+from typing import BinaryIO, Callable
+
+PIPE_FIELDS = ("ext", "stem", "source", "output", "title", "artist", "album", "song_id", "size")
+
+
+class _PipeClosed(Exception):
+    pass
+
+
+class _PipeWriter:
+    def __init__(self, fp: BinaryIO) -> None:
+        self._fp = fp
+        self.written = 0
+
+    def write(self, b) -> int:
+        try:
+            self._fp.write(b)
+        except (BrokenPipeError, ConnectionResetError):
+            raise _PipeClosed() from None
+        except OSError as e:
+            # Windows 下对已退出进程的管道写入报 EINVAL
+            if e.errno == 22:
+                raise _PipeClosed() from None
+            raise
+        self.written += len(b)
+        return len(b)
+
+
+def _split(template: str) -> list[str]:
+    return shlex.split(template, posix=os.name != "nt")
+
+
+def check_template(template: str) -> None:
+    """启动前检查模板：语法错误或未知占位符抛 ValueError。"""
+    try:
+        args = _split(template)
+        for a in args:
+            a.format_map(dict.fromkeys(PIPE_FIELDS, ""))
+    except KeyError as e:
+        raise ValueError(f"unknown placeholder in --pipe-to: {{{e.args[0]}}}") from None
+    except (ValueError, IndexError) as e:
+        raise ValueError(f"invalid --pipe-to command: {e}") from None
+    if not args:
+        raise ValueError("empty --pipe-to command")
+
+
+def build_command(template: str, fields: dict[str, str]) -> list[str]:
+    return [a.format_map(fields) for a in _split(template)]
+
+
+def pipe_env(fields: dict[str, str]) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update({f"NCMDC_{k.upper()}": v for k, v in fields.items()})
+    return env
+
+
+def run_pipe(template: str, fields: dict[str, str], feed: Callable[[BinaryIO], object]) -> tuple[int, int]:
+    """启动命令并由 feed 向其 stdin 写入数据；返回 (写入字节数, 退出码)。"""
+    proc = subprocess.Popen(build_command(template, fields), stdin=subprocess.PIPE, env=pipe_env(fields))
+    writer = _PipeWriter(proc.stdin)  # type: ignore[arg-type]
+    try:
+        feed(writer)  # type: ignore[arg-type]
+    except _PipeClosed:
+        pass
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        try:
+            proc.stdin.close()  # type: ignore[union-attr]
+        except OSError:
+            pass
+        code = proc.wait()
+    return writer.written, code
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+# 说明：
+# 批量转换的进度显示：已完成文件数、输入字节、吞吐（MB/s）与剩余时间（ETA）。
+# 转换线程只在锁内累加计数，不触碰终端；刷新由后台线程按固定间隔完成，
+# 终端输出再慢也不会拖住解密循环。终端（TTY）上原地刷新一行，否则定期输出整行。
+# 日志与进度行共用同一把锁：打印日志前先擦掉进度行，打印后再重绘。
+
+import logging
+import sys
+import threading
+import time
+from typing import Callable, TextIO
+
+
+def human_bytes(n: int) -> str:
+    units = ["B", "KB", "MB", "GB"]
+    v = float(n)
+    for u in units:
+        if v < 1024 or u == units[-1]:
+            return f"{v:.2f} {u}"
+        v /= 1024
+    # 显式返回（静态分析友好）
+    return f"{v:.2f} {units[-1]}"
+
+
+def summary_line(ok: int, skip: int, fail: int, bytes_out: int) -> str:
+    """CLI、daemon 客户端与 merge-reports 共用的结果汇总行。"""
+    return f"结果汇总：成功 {ok}，跳过 {skip}，失败 {fail}，输出 {human_bytes(bytes_out)}"
+
+
+def _fmt_eta(seconds: float) -> str:
+    s = int(seconds + 0.5)
+    h, rem = divmod(s, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+class Progress:
+    def __init__(
+        self,
+        stream: TextIO | None = None,
+        interval: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.stream = stream or sys.stderr
+        isatty = getattr(self.stream, "isatty", None)
+        self._tty = bool(isatty and isatty())
+        self.interval = interval if interval is not None else (0.2 if self._tty else 5.0)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._start = clock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._shown = False
+        self._closed = False
+        self.total_files: int | None = None
+        self.total_bytes: int | None = None
+        self.files_done = 0
+        self.bytes_done = 0
+
+    def set_total(self, files: int | None, nbytes: int | None) -> None:
+        with self._lock:
+            self.total_files, self.total_bytes = files, nbytes
+            # 计时从总量确定（扫描 + stat 完成）之后开始
+            self._start = self._clock()
+
+    def advance(self, nbytes: int = 0, files: int = 1) -> None:
+        with self._lock:
+            self.files_done += files
+            self.bytes_done += nbytes
+
+    def line(self) -> str:
+        with self._lock:
+            files, done = self.files_done, self.bytes_done
+            total_files, total_bytes = self.total_files, self.total_bytes
+            elapsed = max(self._clock() - self._start, 1e-9)
+        rate = done / elapsed
+        parts = [f"进度：{files}/{total_files} 文件" if total_files is not None else f"进度：{files} 文件"]
+        if total_bytes is not None:
+            parts.append(f"{done / 1048576:.1f}/{total_bytes / 1048576:.1f} MB")
+        else:
+            parts.append(f"{done / 1048576:.1f} MB")
+        parts.append(f"{rate / 1048576:.1f} MB/s")
+        if total_bytes is not None and rate > 0:
+            parts.append(f"剩余 {_fmt_eta(max(total_bytes - done, 0) / rate)}")
+        return "，".join(parts)
+
+    def _erase(self) -> None:
+        if self._tty and self._shown:
+            self.stream.write("\r\033[K")
+            self._shown = False
+
+    def _draw(self, text: str) -> None:
+        if self._tty:
+            self.stream.write("\r" + text)
+            self._shown = True
+        else:
+            self.stream.write(text + "\n")
+        self.stream.flush()
+
+    def render(self) -> None:
+        text = self.line()
+        with self._lock:
+            self._erase()
+            self._draw(text)
+
+    def write(self, message: str) -> None:
+        """输出一行其他内容（如日志），不与进度行交错。"""
+        text = self.line() if self._tty else None
+        with self._lock:
+            was_shown = self._shown
+            self._erase()
+            self.stream.write(message + "\n")
+            if was_shown and text is not None:
+                self._draw(text)
+            else:
+                self.stream.flush()
+
+    def start(self) -> Progress:
+        def tick() -> None:
+            while not self._stop.wait(self.interval):
+                self.render()
+
+        self._thread = threading.Thread(target=tick, name="ncmdc-progress", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._closed or self._thread is None:
+            return
+        self._closed = True
+        self._stop.set()
+        self._thread.join()
+        # 结束时输出最终状态并换行
+        text = self.line()
+        with self._lock:
+            self._erase()
+            self.stream.write(text + "\n")
+            self.stream.flush()
+
+
+class ProgressHandler(logging.Handler):
+    """经由 Progress 输出日志，避免日志行与进度行交错。"""
+
+    def __init__(self, progress: Progress) -> None:
+        super().__init__()
+        self.progress = progress
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.progress.write(self.format(record))
+        except Exception:
+            self.handleError(record)
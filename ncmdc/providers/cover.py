@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+# 说明：
+# 在线封面：内嵌封面缺失或过小时，按 meta 中的 album_pic_url 下载（附加 ?param=NxN 尺寸参数）。
+# - HTTP 连接按 (scheme, host, port) 复用（keep-alive 连接池），并发数受信号量限制；
+# - 缓存两级：URL → 内容哈希（sha256），内容哈希 → 图片数据；同一专辑的多首曲目只下载一次，
+#   并发请求同一 URL 时只有一个线程真正发起请求，其余等待其结果；
+# - 失败（非 200、内容不是图片、网络异常）按 URL 在内存中记住 failure_ttl 秒，
+#   同一专辑的其余曲目直接复用该结果，不再逐首重试；
+# - 指定 cache_dir 时缓存落盘（by-url/ 与 blobs/），跨运行复用；不同 URL 指向相同图片时只存一份。
+
+import hashlib
+import http.client
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from ..sniff.image import sniff_image_extension
+
+_USER_AGENT = "Mozilla/5.0"
+# 内存中保留的图片数（落盘缓存不受此限制）
+_MEMORY_ITEMS = 256
+
+
+def with_size(url: str, size: int | None) -> str:
+    """为网易云图片地址附加尺寸参数（已带 param 时保持不变）。"""
+    if not size:
+        return url
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if any(k == "param" for k, _ in query):
+        return url
+    query.append(("param", f"{size}y{size}"))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class HttpPool:
+    """极简 keep-alive 连接池（标准库 http.client），线程安全。"""
+
+    def __init__(self, max_connections: int = 4, timeout: float = 8.0) -> None:
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_connections))
+        self._idle: dict[tuple[str, str, int | None], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _conn(self, key: tuple[str, str, int | None]) -> http.client.HTTPConnection:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+            self.connections_opened += 1
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def _release(self, key, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    def get(self, url: str, max_redirects: int = 3) -> tuple[int, bytes]:
+        for _ in range(max_redirects + 1):
+            parts = urlsplit(url)
+            status, headers, body = self.request("GET", url)
+            location = headers.get("location")
+            if status in (301, 302, 303, 307, 308) and location:
+                url = location if "://" in location else urlunsplit((parts.scheme, parts.netloc, location, "", ""))
+                continue
+            return status, body
+        raise OSError(f"too many redirects: {url}")
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str] | None = None,
+        body: bytes | None = None,
+    ) -> tuple[int, dict[str, str], bytes]:
+        """发送一次请求并读完响应体；返回 (状态码, 小写键的响应头, 响应体)。不跟随重定向。"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported url: {url}")
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        hdrs = {"User-Agent": _USER_AGENT, "Connection": "keep-alive", **(headers or {})}
+        with self._slots:
+            return self._request(key, method, path, hdrs, body)
+
+    def _request(self, key, method: str, path: str, headers: dict[str, str], body: bytes | None):
+        # 复用的空闲连接可能已被服务端关闭：失败时换新连接重试一次
+        for attempt in (0, 1):
+            conn = self._conn(key)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            return resp.status, {k.lower(): v for k, v in resp.getheaders()}, data
+        raise OSError("unreachable")  # pragma: no cover
+
+    def close(self) -> None:
+        with self._lock:
+            for conns in self._idle.values():
+                for c in conns:
+                    c.close()
+            self._idle.clear()
+
+
+class CoverFetcher:
+    def __init__(
+        self,
+        cache_dir: str | Path | None = None,
+        size: int | None = 500,
+        max_connections: int = 4,
+        timeout: float = 8.0,
+        failure_ttl: float = 300.0,
+    ) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.size = size
+        self.pool = HttpPool(max_connections, timeout)
+        self._lock = threading.Lock()
+        self._by_url: dict[str, str] = {}
+        self._blobs: OrderedDict[str, bytes] = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self.failure_ttl = failure_ttl
+        # url -> (过期时间（monotonic）, 异常；None 表示响应不可用)
+        self._failed: dict[str, tuple[float, BaseException | None]] = {}
+        self.downloads = 0
+
+    def _disk_url(self, url: str) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / "by-url" / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _disk_blob(self, digest: str) -> Path | None:
+        return None if self.cache_dir is None else self.cache_dir / "blobs" / digest
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _cached(self, url: str) -> bytes | None:
+        with self._lock:
+            digest = self._by_url.get(url)
+            if digest and digest in self._blobs:
+                self._blobs.move_to_end(digest)
+                return self._blobs[digest]
+        p = self._disk_url(url)
+        if p is None or not p.exists():
+            return None
+        try:
+            digest = p.read_text(encoding="ascii").strip()
+            data = self._disk_blob(digest).read_bytes()  # type: ignore[union-attr]
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != digest:
+            return None
+        self._remember(url, digest, data)
+        return data
+
+    def _remember(self, url: str, digest: str, data: bytes) -> None:
+        with self._lock:
+            self._by_url[url] = digest
+            self._blobs[digest] = data
+            self._blobs.move_to_end(digest)
+            while len(self._blobs) > _MEMORY_ITEMS:
+                self._blobs.popitem(last=False)
+
+    def _remember_failure(self, url: str, error: BaseException | None) -> None:
+        if self.failure_ttl > 0:
+            with self._lock:
+                self._failed[url] = (time.monotonic() + self.failure_ttl, error)
+
+    def _download(self, url: str) -> bytes | None:
+        status, body = self.pool.get(url)
+        with self._lock:
+            self.downloads += 1
+        if status != 200 or sniff_image_extension(body, fallback="") == "":
+            return None
+        digest = hashlib.sha256(body).hexdigest()
+        blob = self._disk_blob(digest)
+        if blob is not None:
+            if not blob.exists():
+                self._atomic_write(blob, body)
+            self._atomic_write(self._disk_url(url), digest.encode("ascii"))  # type: ignore[arg-type]
+        self._remember(url, digest, body)
+        return body
+
+    def get(self, album_pic_url: str) -> bytes | None:
+        """返回封面图片数据；下载失败或内容不是图片时返回 None（网络异常向上抛出）。"""
+        url = with_size(album_pic_url, self.size)
+        data = self._cached(url)
+        if data is not None:
+            return data
+        with self._lock:
+            failed = self._failed.get(url)
+            if failed is not None and failed[0] <= time.monotonic():
+                del self._failed[url]
+                failed = None
+            fut = self._inflight.get(url)
+            owner = fut is None and failed is None
+            if owner:
+                fut = self._inflight[url] = Future()
+        if failed is not None:
+            if failed[1] is not None:
+                raise failed[1]
+            return None
+        if not owner:
+            return fut.result()  # type: ignore[union-attr]
+        try:
+            data = self._download(url)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self._remember_failure(url, e)
+            fut.set_exception(e)  # type: ignore[union-attr]
+            raise
+        else:
+            if data is None:
+                self._remember_failure(url, None)
+            fut.set_result(data)  # type: ignore[union-attr]
+            return data
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+_FETCHERS: dict[tuple, CoverFetcher] = {}
+_FETCHERS_LOCK = threading.Lock()
+
+
+def shared_fetcher(cache_dir: str | Path | None = None, size: int | None = 500) -> CoverFetcher:
+    """按 (缓存目录, 尺寸) 复用同一个 CoverFetcher，使同一进程内的所有转换共享连接池与缓存。"""
+    key = (str(cache_dir) if cache_dir else None, size)
+    with _FETCHERS_LOCK:
+        f = _FETCHERS.get(key)
+        if f is None:
+            f = _FETCHERS[key] = CoverFetcher(cache_dir, size)
+        return f
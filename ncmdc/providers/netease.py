@@ -5,6 +5,8 @@ import urllib.parse
 import urllib.request
 from typing import Any
 
+from ..lyrics import merge_lrc
+
 
 def fetch_lyrics_by_song_id(song_id: int, cookie: str | None = None, timeout: float = 8.0) -> dict[str, str | None]:
     """根据网易云 song_id 获取歌词（中文注释）
@@ -35,37 +37,11 @@ def fetch_lyrics_by_song_id(song_id: int, cookie: str | None = None, timeout: fl
 
 
 def merge_lyrics(lrc: str | None, tlyric: str | None) -> str | None:
-    """简单合并原文与翻译（若存在同一时间戳，拼接为 原文 / 翻译）"""
+    """合并原文与翻译：时间戳按毫秒对齐（容差内取最近），同一时刻拼接为 原文 / 翻译"""
     if not lrc and not tlyric:
         return None
     if lrc and not tlyric:
         return lrc
     if tlyric and not lrc:
         return tlyric
-
-    # 建立时间戳->行 映射
-    def parse_map(s: str) -> dict[str, list[str]]:
-        mapping: dict[str, list[str]] = {}
-        for line in (s or "").splitlines():
-            if line.startswith("[") and "]" in line:
-                ts = line[1:line.find("]")]
-                text = line[line.find("]") + 1 :]
-                mapping.setdefault(ts, []).append(text)
-        return mapping
-
-    m1 = parse_map(lrc or "")
-    m2 = parse_map(tlyric or "")
-    keys = sorted(set(m1.keys()) | set(m2.keys()))
-    out_lines: list[str] = []
-    for ts in keys:
-        a = "/".join(m1.get(ts, []))
-        b = "/".join(m2.get(ts, []))
-        if a and b:
-            out_lines.append(f"[{ts}]{a} / {b}")
-        elif a:
-            out_lines.append(f"[{ts}]{a}")
-        else:
-            out_lines.append(f"[{ts}]{b}")
-    return "\n".join(out_lines)
-
-
+    return merge_lrc(lrc or "", tlyric or "")
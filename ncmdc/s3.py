@@ -0,0 +1,546 @@
+from __future__ import annotations
+
+# 说明：
+# S3 兼容对象存储（AWS S3 / MinIO / Ceph RGW 等）作为输入来源与输出目标，只用标准库：
+# - 请求按 AWS Signature V4 签名（hmac + sha256），路径风格寻址（<endpoint>/<bucket>/<key>），
+#   自建存储与 AWS 都可用；HTTP 连接复用 providers.cover.HttpPool（keep-alive 连接池）；
+# - S3Sink：-o s3://bucket/prefix 时使用。音频边解密边写入分片缓冲，攒满一片（默认 8 MB）
+#   即交给上传线程池作为 multipart 的一个 part 上传，每个文件同时在途的分片数有上限，
+#   单个文件的内存占用约为 part_size × (max_inflight + 1)，与文件大小无关；
+#   不足一片的文件（以及封面、歌词、meta、摘要旁车等小文件）直接单次 PUT；
+#   转换失败时 AbortMultipartUpload，不留下半截对象或未完成的分片；
+# - S3Reader：-i s3://bucket/prefix 时的输入。对象的可 seek 只读视图，按需发 Range 请求：
+#   随机访问每次只取一个小块（默认 64 KB），--dry-run / --meta / 扫描只需头部与 64 字节音频，
+#   通常一两个请求即可，不下载整个文件；连续顺序读时预读窗口逐次翻倍（上限 8 MB），
+#   完整转换退化为少量大块顺序读取。最近取回的若干区间留在缓存中，头部解析的回退/跳读不重复请求；
+# - list_objects 以 ListObjectsV2 分页列举前缀下的对象，代替本地的目录遍历；
+# - 5xx / 连接错误按指数退避重试（分片数据在内存中，可原样重发）。
+# 凭据与端点取自环境变量：AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY / AWS_SESSION_TOKEN，
+# AWS_REGION（或 AWS_DEFAULT_REGION，默认 us-east-1），AWS_ENDPOINT_URL_S3（或 AWS_ENDPOINT_URL）。
+
+import hashlib
+import hmac
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from typing import BinaryIO, Iterator
+from urllib.parse import quote, urlsplit
+from xml.sax.saxutils import escape
+
+from .output import OutputSink, is_s3_url
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+# S3 限制：单个 multipart 上传最多 10000 个分片
+MAX_PARTS = 10000
+READ_BLOCK = 64 * 1024
+MAX_READAHEAD = 8 * 1024 * 1024
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+class S3Error(OSError):
+    def __init__(self, status: int, code: str, message: str = "") -> None:
+        super().__init__(f"S3 {status} {code}: {message}".rstrip(": "))
+        self.status = status
+        self.code = code
+
+
+@dataclass(frozen=True)
+class Credentials:
+    access_key: str
+    secret_key: str
+    session_token: str | None = None
+
+    @classmethod
+    def from_env(cls) -> Credentials:
+        access = os.environ.get("AWS_ACCESS_KEY_ID")
+        secret = os.environ.get("AWS_SECRET_ACCESS_KEY")
+        if not access or not secret:
+            raise ValueError("S3 credentials missing: set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY")
+        return cls(access, secret, os.environ.get("AWS_SESSION_TOKEN") or None)
+
+
+def parse_s3_url(spec: str) -> tuple[str, str]:
+    """'s3://bucket/some/prefix' → ('bucket', 'some/prefix')（前缀不含首尾斜杠）。"""
+    if not is_s3_url(spec):
+        raise ValueError(f"not an s3 url: {spec!r}")
+    bucket, _, prefix = spec[5:].partition("/")
+    if not bucket:
+        raise ValueError(f"s3 url without bucket: {spec!r}")
+    return bucket, prefix.strip("/")
+
+
+def _uri_encode(text: str, safe: str = "") -> str:
+    return quote(text, safe="-_.~" + safe)
+
+
+def _local(tag: str) -> str:
+    # S3 响应带命名空间，自建存储有时不带：按本地名匹配
+    return tag.rsplit("}", 1)[-1]
+
+
+def _xml_find(body: bytes, tag: str) -> str | None:
+    import xml.etree.ElementTree as ET
+
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return None
+    for el in root.iter():
+        if _local(el.tag) == tag:
+            return el.text or ""
+    return None
+
+
+@dataclass(frozen=True)
+class S3Object:
+    key: str
+    size: int
+
+
+def sign_v4(
+    method: str,
+    host: str,
+    path: str,
+    query: dict[str, str],
+    headers: dict[str, str],
+    payload_hash: str,
+    credentials: Credentials,
+    region: str,
+    now: datetime | None = None,
+    service: str = "s3",
+) -> dict[str, str]:
+    """返回加上 x-amz-date / x-amz-content-sha256 / Authorization 的请求头（headers 中的其他头一并签名）。
+
+    path 为未编码的路径（如 '/bucket/a b.flac'），按 S3 规则逐段编码一次。
+    """
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    day = amz_date[:8]
+    out = {k.lower(): str(v).strip() for k, v in headers.items()}
+    out["host"] = host
+    out["x-amz-date"] = amz_date
+    out["x-amz-content-sha256"] = payload_hash
+    if credentials.session_token:
+        out["x-amz-security-token"] = credentials.session_token
+    names = sorted(out)
+    canonical = "\n".join(
+        [
+            method,
+            _uri_encode(path, safe="/"),
+            "&".join(f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items())),
+            "".join(f"{k}:{out[k]}\n" for k in names),
+            ";".join(names),
+            payload_hash,
+        ]
+    )
+    scope = f"{day}/{region}/{service}/aws4_request"
+    to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode("utf-8")).hexdigest()])
+    key = ("AWS4" + credentials.secret_key).encode("utf-8")
+    for part in (day, region, service, "aws4_request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    signature = hmac.new(key, to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    out["authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={credentials.access_key}/{scope}, "
+        f"SignedHeaders={';'.join(names)}, Signature={signature}"
+    )
+    return out
+
+
+class S3Client:
+    """最小的 S3 REST 客户端：对象 PUT/HEAD/DELETE 与 multipart 上传。线程安全。"""
+
+    def __init__(
+        self,
+        endpoint: str,
+        credentials: Credentials,
+        region: str = "us-east-1",
+        max_connections: int = 8,
+        timeout: float = 60.0,
+        retries: int = 3,
+    ) -> None:
+        from .providers.cover import HttpPool
+
+        parts = urlsplit(endpoint)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            raise ValueError(f"invalid S3 endpoint: {endpoint!r}")
+        self.endpoint = f"{parts.scheme}://{parts.netloc}"
+        self.host = parts.netloc
+        self.credentials = credentials
+        self.region = region
+        self.retries = retries
+        self.pool = HttpPool(max_connections, timeout)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> S3Client:
+        region = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or "us-east-1"
+        endpoint = (
+            os.environ.get("AWS_ENDPOINT_URL_S3")
+            or os.environ.get("AWS_ENDPOINT_URL")
+            or f"https://s3.{region}.amazonaws.com"
+        )
+        return cls(endpoint, Credentials.from_env(), region, **kwargs)
+
+    def request(
+        self,
+        method: str,
+        bucket: str,
+        key: str = "",
+        query: dict[str, str] | None = None,
+        body: bytes = b"",
+        headers: dict[str, str] | None = None,
+        ok: tuple[int, ...] = (200,),
+    ) -> tuple[int, dict[str, str], bytes]:
+        query = query or {}
+        path = f"/{bucket}/{key}" if key else f"/{bucket}"
+        url = self.endpoint + _uri_encode(path, safe="/")
+        if query:
+            url += "?" + "&".join(f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items()))
+        payload_hash = hashlib.sha256(body).hexdigest() if body else EMPTY_SHA256
+        for attempt in range(self.retries + 1):
+            # 每次重试重新签名（x-amz-date 需接近当前时间）
+            signed = sign_v4(method, self.host, path, query, headers or {}, payload_hash, self.credentials, self.region)
+            try:
+                status, resp_headers, data = self.pool.request(method, url, signed, body if method in ("PUT", "POST") else None)
+            except OSError:
+                if attempt == self.retries:
+                    raise
+            else:
+                if status in ok:
+                    return status, resp_headers, data
+                if status < 500 or attempt == self.retries:
+                    raise S3Error(status, _xml_find(data, "Code") or "", _xml_find(data, "Message") or path)
+            time.sleep(0.2 * 2**attempt)
+        raise OSError("unreachable")  # pragma: no cover
+
+    def put_object(self, bucket: str, key: str, data: bytes, content_type: str | None = None) -> str:
+        headers = {"content-type": content_type} if content_type else None
+        _, h, _ = self.request("PUT", bucket, key, body=data, headers=headers)
+        return h.get("etag", "")
+
+    def head_object(self, bucket: str, key: str) -> dict[str, str] | None:
+        """对象存在时返回响应头，不存在返回 None。"""
+        status, h, _ = self.request("HEAD", bucket, key, ok=(200, 404))
+        return h if status == 200 else None
+
+    def get_range(self, bucket: str, key: str, start: int, end: int) -> bytes:
+        """读取 [start, end) 区间。"""
+        _, _, data = self.request("GET", bucket, key, headers={"range": f"bytes={start}-{end - 1}"}, ok=(200, 206))
+        return data
+
+    def list_objects(self, bucket: str, prefix: str = "") -> Iterator[S3Object]:
+        """按 ListObjectsV2 分页列举（每页最多 1000 个），按键名顺序边取边产出。"""
+        import xml.etree.ElementTree as ET
+
+        token: str | None = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix}
+            if token:
+                query["continuation-token"] = token
+            _, _, body = self.request("GET", bucket, query=query)
+            root = ET.fromstring(body)
+            token = None
+            for el in root:
+                name = _local(el.tag)
+                if name == "Contents":
+                    fields = {_local(c.tag): c.text or "" for c in el}
+                    yield S3Object(fields.get("Key", ""), int(fields.get("Size") or 0))
+                elif name == "NextContinuationToken":
+                    token = el.text
+            if not token:
+                return
+
+    def delete_object(self, bucket: str, key: str) -> None:
+        self.request("DELETE", bucket, key, ok=(200, 204))
+
+    def create_multipart_upload(self, bucket: str, key: str) -> str:
+        _, _, body = self.request("POST", bucket, key, query={"uploads": ""})
+        upload_id = _xml_find(body, "UploadId")
+        if not upload_id:
+            raise S3Error(200, "InvalidResponse", "CreateMultipartUpload without UploadId")
+        return upload_id
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, number: int, data: bytes) -> str:
+        _, h, _ = self.request("PUT", bucket, key, query={"partNumber": str(number), "uploadId": upload_id}, body=data)
+        return h.get("etag", "")
+
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str, etags: list[str]) -> None:
+        parts = "".join(
+            f"<Part><PartNumber>{i}</PartNumber><ETag>{escape(etag)}</ETag></Part>" for i, etag in enumerate(etags, 1)
+        )
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode("utf-8")
+        _, _, data = self.request("POST", bucket, key, query={"uploadId": upload_id}, body=body)
+        # S3 可能先返回 200、再在响应体里给出错误
+        if _xml_find(data, "Code") is not None:
+            raise S3Error(200, _xml_find(data, "Code") or "", _xml_find(data, "Message") or key)
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str) -> None:
+        self.request("DELETE", bucket, key, query={"uploadId": upload_id}, ok=(200, 204, 404))
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class S3Reader(io.RawIOBase):
+    """对象的只读、可 seek 视图；每个实例只供一个线程使用。"""
+
+    def __init__(
+        self,
+        client: S3Client,
+        bucket: str,
+        key: str,
+        size: int | None = None,
+        block_size: int = READ_BLOCK,
+        max_readahead: int = MAX_READAHEAD,
+        cache_spans: int = 4,
+    ) -> None:
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.name = f"s3://{bucket}/{key}"
+        if size is None:
+            head = client.head_object(bucket, key)
+            if head is None:
+                raise FileNotFoundError(self.name)
+            size = int(head.get("content-length") or 0)
+        self.size = size
+        self.block_size = block_size
+        self.max_readahead = max(block_size, max_readahead)
+        self._cache_spans = max(1, cache_spans)
+        # 区间起点 → 数据（LRU）
+        self._spans: OrderedDict[int, bytes] = OrderedDict()
+        self._pos = 0
+        self._window = block_size
+        # 上一次请求的结束位置：下一次缺失恰好从这里开始即视为顺序读
+        self._next = -1
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"invalid whence: {whence}")
+        if offset < 0:
+            raise OSError("negative seek position")
+        self._pos = offset
+        return offset
+
+    def _span(self, pos: int) -> tuple[int, bytes]:
+        for start, data in self._spans.items():
+            if start <= pos < start + len(data):
+                self._spans.move_to_end(start)
+                return start, data
+        if pos == self._next:
+            self._window = min(self._window * 2, self.max_readahead)
+        else:
+            self._window = self.block_size
+        start = pos - pos % self.block_size
+        end = min(self.size, max(start + self._window, pos + 1))
+        data = self.client.get_range(self.bucket, self.key, start, end)
+        if not data:
+            raise EOFError(f"empty range response: {self.name} [{start}, {end})")
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        self._next = start + len(data)
+        self._spans[start] = data
+        while len(self._spans) > self._cache_spans:
+            self._spans.popitem(last=False)
+        return start, data
+
+    def readinto(self, b) -> int:
+        # 尽量填满（解析头部时要求一次读够），只在对象末尾返回短读
+        view = memoryview(b).cast("B")
+        n = 0
+        while n < len(view) and self._pos < self.size:
+            start, data = self._span(self._pos)
+            off = self._pos - start
+            k = min(len(view) - n, len(data) - off)
+            view[n:n + k] = data[off:off + k]
+            n += k
+            self._pos += k
+        return n
+
+    def close(self) -> None:
+        self._spans.clear()
+        super().close()
+
+
+def iter_ncm_objects(client: S3Client, bucket: str, prefix: str) -> Iterator[S3Object]:
+    """前缀指向单个 .ncm 对象时只产出它，否则列举 prefix/ 下所有 .ncm 对象。"""
+    if prefix.lower().endswith(".ncm"):
+        head = client.head_object(bucket, prefix)
+        if head is not None:
+            yield S3Object(prefix, int(head.get("content-length") or 0))
+            return
+    for obj in client.list_objects(bucket, f"{prefix}/" if prefix else ""):
+        if obj.key.lower().endswith(".ncm"):
+            yield obj
+
+
+class MultipartWriter(io.RawIOBase):
+    """把顺序写入切成固定大小的分片并发上传；close() 完成上传，abort() 放弃。
+
+    只写过不足一片的数据时不发起 multipart，close() 以单次 PUT 写出。
+    """
+
+    def __init__(
+        self,
+        client: S3Client,
+        bucket: str,
+        key: str,
+        executor: ThreadPoolExecutor,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_inflight: int = 4,
+        size: int | None = None,
+    ) -> None:
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self._executor = executor
+        # 已知大小时放大分片，避免超过 10000 个分片的上限
+        if size is not None:
+            part_size = max(part_size, -(-size // MAX_PARTS))
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self._slots = threading.BoundedSemaphore(max(1, max_inflight))
+        self._buf = bytearray()
+        self._upload_id: str | None = None
+        self._parts: list[Future] = []
+        self.written = 0
+        self._finished = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        n = len(b)
+        self._buf += b
+        self.written += n
+        while len(self._buf) >= self.part_size:
+            data = bytes(self._buf[: self.part_size])
+            del self._buf[: self.part_size]
+            self._submit(data)
+        return n
+
+    def _submit(self, data: bytes) -> None:
+        if len(self._parts) >= MAX_PARTS:
+            raise OSError(f"too many parts for {self.key} (increase --s3-part-size)")
+        # 在途分片已满时阻塞解密线程（背压），内存占用不随文件增长
+        self._slots.acquire()
+        try:
+            for f in self._parts:
+                if f.done() and f.exception() is not None:
+                    raise f.exception()  # type: ignore[misc]
+            if self._upload_id is None:
+                self._upload_id = self.client.create_multipart_upload(self.bucket, self.key)
+            fut = self._executor.submit(
+                self.client.upload_part, self.bucket, self.key, self._upload_id, len(self._parts) + 1, data
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _f: self._slots.release())
+        self._parts.append(fut)
+
+    def finish(self) -> None:
+        if self._finished:
+            return
+        if self._upload_id is None:
+            self.client.put_object(self.bucket, self.key, bytes(self._buf))
+        else:
+            if self._buf:
+                self._submit(bytes(self._buf))
+                self._buf = bytearray()
+            etags = [f.result() for f in self._parts]
+            self.client.complete_multipart_upload(self.bucket, self.key, self._upload_id, etags)
+        # 失败时保持未完成状态，交由 abort() 清理
+        self._finished = True
+        self._buf = bytearray()
+
+    def abort(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        self._buf = bytearray()
+        for f in self._parts:
+            f.cancel()
+        for f in self._parts:
+            if not f.cancelled():
+                f.exception()
+        if self._upload_id is not None:
+            self.client.abort_multipart_upload(self.bucket, self.key, self._upload_id)
+
+
+class S3Sink(OutputSink):
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        client: S3Client | None = None,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_inflight: int = 4,
+        upload_workers: int = 8,
+    ) -> None:
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = client or S3Client.from_env(max_connections=upload_workers)
+        self.part_size = part_size
+        self.max_inflight = max_inflight
+        self._executor = ThreadPoolExecutor(max_workers=max(1, upload_workers), thread_name_prefix="ncmdc-s3")
+
+    @classmethod
+    def from_url(cls, spec: str, **kwargs) -> S3Sink:
+        bucket, prefix = parse_s3_url(spec)
+        return cls(bucket, prefix, **kwargs)
+
+    def key(self, rel: PurePosixPath) -> str:
+        return f"{self.prefix}/{rel}" if self.prefix else str(rel)
+
+    def describe(self, rel: PurePosixPath) -> str:
+        return f"s3://{self.bucket}/{self.key(rel)}"
+
+    def exists(self, rel: PurePosixPath) -> bool:
+        return self.client.head_object(self.bucket, self.key(rel)) is not None
+
+    @contextmanager
+    def open(self, rel: PurePosixPath, size: int | None = None) -> Iterator[BinaryIO]:
+        writer = MultipartWriter(
+            self.client, self.bucket, self.key(rel), self._executor, self.part_size, self.max_inflight, size
+        )
+        try:
+            yield writer  # type: ignore[misc]
+            # 已上传的分片失败也可能在收尾时才暴露，同样需要放弃上传
+            writer.finish()
+        except BaseException:
+            try:
+                writer.abort()
+            except OSError:
+                pass
+            raise
+
+    def write_bytes(self, rel: PurePosixPath, data: bytes) -> None:
+        self.client.put_object(self.bucket, self.key(rel), data)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.client.close()
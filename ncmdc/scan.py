@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+# 说明：
+# 并发目录扫描器，替代串行 os.walk。面向 NFS 等高延迟大目录树：
+# - 多个线程并行列举子目录（os.scandir），列举延迟相互重叠；
+# - 只依据 DirEntry 的类型信息与文件名过滤后缀，不额外 stat；
+# - 以生成器形式边扫边产出路径，调用方可以在第一个文件出现时就开始转换；
+# - 支持 include/exclude 通配（相对路径或文件名）与最大深度。
+# 与 os.walk 一致：不跟随目录符号链接，避免环路。
+# 过滤规则集中在 ScanFilter，watch 模式的目录扫描复用同一套规则。
+
+import fnmatch
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+_DONE = object()
+
+
+def _match_any(rel: str, name: str, patterns: tuple[str, ...]) -> bool:
+    for pat in patterns:
+        # 不含路径分隔符的模式按文件/目录名匹配，否则按相对路径匹配
+        target = rel if "/" in pat else name
+        if fnmatch.fnmatch(target, pat):
+            return True
+    return False
+
+
+@dataclass(frozen=True)
+class ScanFilter:
+    """include/exclude 通配与最大深度；rel 为相对扫描根目录、以 / 分隔的路径。"""
+
+    include: tuple[str, ...] = ()
+    exclude: tuple[str, ...] = ()
+    max_depth: int | None = None
+
+    def descend(self, rel: str, name: str, depth: int) -> bool:
+        """depth 为所在目录的深度（根目录为 0）：是否进入子目录 rel。"""
+        if self.max_depth is not None and depth >= self.max_depth:
+            return False
+        return not (self.exclude and _match_any(rel, name, self.exclude))
+
+    def accept(self, rel: str, name: str) -> bool:
+        if self.exclude and _match_any(rel, name, self.exclude):
+            return False
+        return not (self.include and not _match_any(rel, name, self.include))
+
+
+def scan_tree(
+    root: str | Path,
+    suffixes: Iterable[str] = (".ncm",),
+    include: Iterable[str] = (),
+    exclude: Iterable[str] = (),
+    max_depth: int | None = None,
+    workers: int = 8,
+) -> Iterator[Path]:
+    """并发遍历 root，产出后缀匹配的文件路径（顺序不保证）。
+
+    max_depth：0 表示只看 root 本层，1 表示再向下一层，None 不限。
+    exclude 同时作用于目录（命中即剪枝）与文件；include 非空时文件需至少命中一条。
+    """
+    root = Path(root)
+    suffixes = tuple(s.lower() for s in suffixes)
+    filters = ScanFilter(tuple(include), tuple(exclude), max_depth)
+    results: queue.Queue = queue.Queue()
+    dirs: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    lock = threading.Lock()
+    # 已入队但尚未列举完成的目录数；归零即扫描结束
+    pending = 1
+    dirs.put((str(root), "", 0))
+
+    def finish_one() -> None:
+        nonlocal pending
+        with lock:
+            pending -= 1
+            done = pending == 0
+        if done:
+            for _ in range(n_workers):
+                dirs.put(None)
+            results.put(_DONE)
+
+    def list_dir(path: str, rel: str, depth: int) -> None:
+        nonlocal pending
+        try:
+            it = os.scandir(path)
+        except OSError:
+            # 无权限/已删除的目录：与 os.walk 默认行为一致，静默跳过
+            return
+        with it:
+            for entry in it:
+                if stop.is_set():
+                    return
+                name = entry.name
+                entry_rel = f"{rel}/{name}" if rel else name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not filters.descend(entry_rel, name, depth):
+                            continue
+                        with lock:
+                            pending += 1
+                        dirs.put((entry.path, entry_rel, depth + 1))
+                        continue
+                    if not name.lower().endswith(suffixes) or not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if not filters.accept(entry_rel, name):
+                    continue
+                results.put(Path(entry.path))
+
+    def worker() -> None:
+        while True:
+            item = dirs.get()
+            if item is None or stop.is_set():
+                return
+            try:
+                list_dir(*item)
+            finally:
+                finish_one()
+
+    n_workers = max(1, workers)
+    threads = [threading.Thread(target=worker, name=f"ncmdc-scan-{i}", daemon=True) for i in range(n_workers)]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        # 调用方提前结束迭代时通知工作线程退出
+        stop.set()
+        for _ in threads:
+            dirs.put(None)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+# 说明：
+# 按文件大小调度的批量转换：
+# - 先 stat 全部输入，按大小降序派发（LPT，最长处理时间优先），避免大文件落在队尾拉长总耗时；
+# - 小文件合并成一个任务，摊薄每个任务的派发开销；
+# - 以字节预算限制同时在途的输入总量（封面 + 读写缓冲随文件大小增长），单个超预算任务在空闲时独占执行；
+# - 结束后用实测吞吐量推算理想 LPT 完成时间，与实际耗时对比；
+# - 单个文件抛出的异常只影响该文件：记录日志并计数，同批其余文件照常处理。
+
+import heapq
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable
+
+
+@dataclass
+class Task:
+    paths: list[Path]
+    size: int
+
+
+def plan_tasks(
+    paths: Iterable[Path],
+    small_bytes: int = 1024 * 1024,
+    batch_bytes: int = 8 * 1024 * 1024,
+) -> list[Task]:
+    """stat 所有输入并生成按大小降序排列的任务；小于 small_bytes 的文件合批（每批不超过 batch_bytes）。"""
+    sized: list[tuple[int, Path]] = []
+    for p in paths:
+        try:
+            sized.append((os.stat(p).st_size, p))
+        except OSError:
+            # 无法 stat 的文件仍交给转换流程，由其记录失败
+            sized.append((0, p))
+    sized.sort(key=lambda x: x[0], reverse=True)
+
+    tasks: list[Task] = []
+    batch: list[Path] = []
+    batch_size = 0
+    for size, p in sized:
+        if size >= small_bytes:
+            tasks.append(Task([p], size))
+            continue
+        if batch and batch_size + size > batch_bytes:
+            tasks.append(Task(batch, batch_size))
+            batch, batch_size = [], 0
+        batch.append(p)
+        batch_size += size
+    if batch:
+        tasks.append(Task(batch, batch_size))
+    tasks.sort(key=lambda t: t.size, reverse=True)
+    return tasks
+
+
+class ByteBudget:
+    """在途字节预算。超出上限的单个请求在没有其他在途任务时放行，避免死锁。"""
+
+    def __init__(self, limit: int | None) -> None:
+        self._limit = limit
+        self._inflight = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int) -> None:
+        with self._cond:
+            if self._limit is not None:
+                while self._inflight > 0 and self._inflight + n > self._limit:
+                    self._cond.wait()
+            self._inflight += n
+            self.peak = max(self.peak, self._inflight)
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self._inflight -= n
+            self._cond.notify_all()
+
+
+def lpt_makespan(sizes: Iterable[int], workers: int, rate: float) -> float:
+    """按给定顺序贪心分配到最早空闲的 worker，返回预计完成时间（秒）；rate 为单 worker 字节/秒。"""
+    if rate <= 0:
+        return 0.0
+    loads = [0.0] * max(1, workers)
+    for size in sizes:
+        t = heapq.heappop(loads)
+        heapq.heappush(loads, t + size / rate)
+    return max(loads)
+
+
+@dataclass
+class ScheduleReport:
+    tasks: int = 0
+    files: int = 0
+    total_bytes: int = 0
+    workers: int = 1
+    peak_inflight_bytes: int = 0
+    busy_seconds: float = 0.0
+    actual_seconds: float = 0.0
+    expected_seconds: float = 0.0
+    failed: int = 0
+    task_sizes: list[int] = field(default_factory=list, repr=False)
+
+    def summary(self) -> str:
+        ratio = (self.actual_seconds / self.expected_seconds) if self.expected_seconds > 0 else 0.0
+        return (
+            f"调度：{self.files} 个文件 / {self.tasks} 个任务，{self.workers} 个 worker，"
+            f"预计 {self.expected_seconds:.2f}s，实际 {self.actual_seconds:.2f}s（{ratio:.2f}x），"
+            f"在途峰值 {self.peak_inflight_bytes / 1048576:.1f} MB"
+            + (f"，异常 {self.failed} 个" if self.failed else "")
+        )
+
+
+def run_scheduled(
+    tasks: list[Task],
+    fn: Callable[[Path], None],
+    workers: int = 1,
+    max_inflight_bytes: int | None = None,
+    on_error: Callable[[Path, Exception], None] | None = None,
+    logger: logging.Logger | None = None,
+) -> ScheduleReport:
+    """按 tasks 顺序派发执行 fn；fn 抛出的异常记录日志、计入 report.failed 并交给 on_error。"""
+    logger = logger or logging.getLogger("ncmdc")
+    workers = max(1, workers)
+    budget = ByteBudget(max_inflight_bytes)
+    slots = threading.BoundedSemaphore(workers)
+    lock = threading.Lock()
+    report = ScheduleReport(
+        tasks=len(tasks),
+        files=sum(len(t.paths) for t in tasks),
+        total_bytes=sum(t.size for t in tasks),
+        workers=workers,
+        task_sizes=[t.size for t in tasks],
+    )
+
+    def run(task: Task) -> None:
+        t0 = time.perf_counter()
+        try:
+            for p in task.paths:
+                try:
+                    fn(p)
+                except Exception as e:
+                    # 中文注释：合批任务中某个文件出错不能连带丢掉同批其余文件
+                    logger.error("scheduled task failed", extra={"source": str(p)}, exc_info=True)
+                    with lock:
+                        report.failed += 1
+                    if on_error is not None:
+                        on_error(p, e)
+        finally:
+            elapsed = time.perf_counter() - t0
+            with lock:
+                report.busy_seconds += elapsed
+            budget.release(task.size)
+            slots.release()
+
+    start = time.perf_counter()
+    futures: list[Future] = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ncmdc-sched") as ex:
+        for task in tasks:
+            # 先占 worker 槽位再占字节预算：派发顺序即执行顺序，保持 LPT
+            slots.acquire()
+            budget.acquire(task.size)
+            futures.append(ex.submit(run, task))
+    # on_error 自身抛出的异常不静默吞掉
+    for f in futures:
+        f.result()
+    report.actual_seconds = time.perf_counter() - start
+    report.peak_inflight_bytes = budget.peak
+    if report.busy_seconds > 0:
+        rate = report.total_bytes / report.busy_seconds
+        report.expected_seconds = lpt_makespan(report.task_sizes, workers, rate)
+    return report
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+# 说明：
+# 多机分片：各节点共享同一目录树（如 NFS），用 --shard INDEX/COUNT 只处理属于自己的那一份，
+# 不需要协调服务，也不会在输出上互相竞争。
+# - hash（默认）：按“相对输入根目录的 POSIX 路径”的稳定哈希取模，边扫描边过滤，节点间无需交换任何信息；
+# - size：所有节点各自 stat 全部文件，按大小降序 + 路径排序后贪心分给当前负载最小的分片（LPT），
+#   各节点得到完全相同的分配结果，总字节更均衡。
+# 各分片的 --report 可用 `ming-ncm merge-reports` 合并为一份汇总。
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """解析 'INDEX/COUNT'（INDEX 从 1 开始）。"""
+    try:
+        a, b = spec.split("/", 1)
+        index, count = int(a), int(b)
+    except ValueError:
+        raise ValueError(f"invalid shard spec: {spec!r} (expected INDEX/COUNT, e.g. 1/4)") from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"invalid shard spec: {spec!r} (INDEX must be within 1..COUNT)")
+    return index, count
+
+
+def shard_key(path: Path, root: Path | None) -> str:
+    # 相对路径与挂载点无关，各节点挂载位置不同也能得到相同分配
+    p = Path(path).absolute()
+    if root is not None:
+        try:
+            return p.relative_to(Path(root).absolute()).as_posix()
+        except ValueError:
+            pass
+    return p.as_posix()
+
+
+def shard_of(key: str, count: int) -> int:
+    """稳定哈希（不受 PYTHONHASHSEED 影响），返回 1..count。"""
+    h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+    return h % count + 1
+
+
+def assign_by_size(sized: Iterable[tuple[str, int]], count: int) -> dict[str, int]:
+    """大小降序（同大小按 key）依次分给当前总字节最小的分片（同负载取编号小者）。"""
+    loads = [(0, i) for i in range(1, count + 1)]
+    out: dict[str, int] = {}
+    for key, size in sorted(sized, key=lambda x: (-x[1], x[0])):
+        load, i = heapq.heappop(loads)
+        out[key] = i
+        heapq.heappush(loads, (load + size, i))
+    return out
+
+
+def select_shard(
+    paths: Iterable[Path],
+    index: int,
+    count: int,
+    root: Path | None = None,
+    by: str = "hash",
+) -> Iterator[Path]:
+    if count == 1:
+        yield from paths
+        return
+    if by == "hash":
+        for p in paths:
+            if shard_of(shard_key(p, root), count) == index:
+                yield p
+        return
+    items: list[tuple[str, Path, int]] = []
+    for p in paths:
+        try:
+            size = os.stat(p).st_size
+        except OSError:
+            size = 0
+        items.append((shard_key(p, root), p, size))
+    assignment = assign_by_size(((k, s) for k, _, s in items), count)
+    for k, p, _ in items:
+        if assignment[k] == index:
+            yield p
+
+
+def merge_reports(reports: Iterable[dict]) -> dict:
+    """合并各分片的 --report：汇总字段求和，逐文件条目按源路径排序。"""
+    summary = {"ok": 0, "skip": 0, "fail": 0, "bytes_out": 0}
+    files: list[dict] = []
+    shards: list = []
+    for rep in reports:
+        for k in summary:
+            summary[k] += int(rep.get("summary", {}).get(k, 0))
+        files.extend(rep.get("files") or [])
+        if "shard" in rep:
+            shards.append(rep["shard"])
+    files.sort(key=lambda e: str(e.get("source", "")))
+    merged: dict = {"summary": summary, "files": files}
+    if shards:
+        merged["shards"] = sorted(shards, key=lambda s: s.get("index", 0))
+        count = shards[0].get("count")
+        missing = sorted(set(range(1, (count or 0) + 1)) - {s.get("index") for s in shards})
+        if missing:
+            merged["missing_shards"] = missing
+    return merged
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="ming-ncm merge-reports", description="合并各分片的 JSON 运行报告")
+    parser.add_argument("reports", nargs="+", metavar="REPORT", help="reports：各分片 --report 生成的 JSON 文件")
+    parser.add_argument("-o", "--output", default=None, metavar="FILE", help="output：合并结果写入文件（默认仅打印汇总）")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    merged = merge_reports(json.loads(Path(p).read_text(encoding="utf-8")) for p in args.reports)
+    if args.output:
+        out = Path(args.output)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(merged, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    from .progress import summary_line
+
+    s = merged["summary"]
+    print(f"{summary_line(s['ok'], s['skip'], s['fail'], s['bytes_out'])}（合并 {len(args.reports)} 份报告）")
+    if merged.get("missing_shards"):
+        print(f"缺少分片：{', '.join(map(str, merged['missing_shards']))}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,565 @@
+from __future__ import annotations
+
+# 说明：
+# 解密流的“顺路”校验：在 stream_decrypt 写出的同时计算摘要并做轻量容器检查，
+# 省去转换完成后再完整读一遍输出文件。所有检查器都是增量式的（update 接收任意切分的块）。
+# - FLAC：fLaC 标记、STREAMINFO 为首个元数据块、元数据块链完整；首帧帧头同步码 + CRC-8，
+#   并统计后续 CRC-8 合法的帧头数量；
+# - MP3：跳过 ID3v2，按帧长逐帧行走检查帧同步连续性（容忍末尾 ID3v1/APE 标签）；
+# - MP4/M4A：顶层 box 行走（ftyp 在首、含 moov、大小闭合）。
+# 另提供已转换输出的抽样核验（verify_sampled）：只解密首尾块与若干随机区间进行比对。
+# 比对范围是音频负载（payload_span）：跳过 ID3v2/ID3v1 标签、FLAC 元数据块，MP4 只取 mdat，
+# 因此 --write-meta 写过标签的输出同样可以核验。
+
+import hashlib
+import random
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+DIGEST_ALGORITHMS = ("sha256", "blake2b")
+
+
+@dataclass
+class CheckResult:
+    container: str
+    ok: bool
+    detail: str = ""
+    stats: dict = field(default_factory=dict)
+
+
+class ContainerCheck:
+    container = ""
+
+    def update(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> CheckResult:
+        raise NotImplementedError
+
+
+def _crc8_table() -> list[int]:
+    table = []
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            c = ((c << 1) ^ 0x07) & 0xFF if c & 0x80 else (c << 1) & 0xFF
+        table.append(c)
+    return table
+
+
+_CRC8 = _crc8_table()
+
+
+def _crc8(data: bytes) -> int:
+    c = 0
+    for b in data:
+        c = _CRC8[c ^ b]
+    return c
+
+
+def parse_flac_frame_header(buf: bytes, i: int) -> int | None:
+    """校验 buf[i:] 处的 FLAC 帧头；合法返回帧头长度（含 CRC-8），否则 None，数据不足返回 -1。"""
+    if len(buf) - i < 6:
+        return -1
+    if buf[i] != 0xFF or (buf[i + 1] & 0xFE) != 0xF8:
+        return None
+    bs_code = buf[i + 2] >> 4
+    sr_code = buf[i + 2] & 0x0F
+    ch = buf[i + 3] >> 4
+    ss = (buf[i + 3] >> 1) & 0x07
+    if bs_code == 0 or sr_code == 15 or ch > 10 or ss == 3 or (buf[i + 3] & 1):
+        return None
+    # UTF-8 风格的帧号/样本号
+    lead = buf[i + 4]
+    if lead < 0x80:
+        extra = 0
+    elif 0xC0 <= lead < 0xE0:
+        extra = 1
+    elif 0xE0 <= lead < 0xF0:
+        extra = 2
+    elif 0xF0 <= lead < 0xF8:
+        extra = 3
+    elif 0xF8 <= lead < 0xFC:
+        extra = 4
+    elif 0xFC <= lead < 0xFE:
+        extra = 5
+    elif lead == 0xFE:
+        extra = 6
+    else:
+        return None
+    n = 5 + extra
+    n += 1 if bs_code == 6 else 2 if bs_code == 7 else 0
+    n += 1 if sr_code == 12 else 2 if sr_code in (13, 14) else 0
+    if len(buf) - i < n + 1:
+        return -1
+    for k in range(5, 5 + extra):
+        if (buf[i + k] & 0xC0) != 0x80:
+            return None
+    if _crc8(buf[i:i + n]) != buf[i + n]:
+        return None
+    return n + 1
+
+
+class FlacCheck(ContainerCheck):
+    container = "flac"
+    _SYNC = re.compile(rb"\xff[\xf8\xf9]")
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._state = "magic"
+        self._block_left = 0
+        self._streaminfo: dict = {}
+        self._first_block = True
+        self._frames = 0
+        self._error = ""
+
+    def _fail(self, msg: str) -> None:
+        self._error = msg
+        self._state = "error"
+        self._buf.clear()
+
+    def update(self, data: bytes) -> None:
+        if self._state == "error":
+            return
+        if self._state == "meta" and self._block_left:
+            k = min(self._block_left, len(data))
+            self._block_left -= k
+            data = data[k:]
+        self._buf += data
+        self._advance()
+
+    def _advance(self) -> None:
+        buf = self._buf
+        while True:
+            if self._state == "magic":
+                if len(buf) < 4:
+                    return
+                if bytes(buf[:4]) != b"fLaC":
+                    return self._fail("missing fLaC marker")
+                del buf[:4]
+                self._state = "meta"
+                self._first_block = True
+            elif self._state == "meta":
+                if self._block_left:
+                    k = min(self._block_left, len(buf))
+                    del buf[:k]
+                    self._block_left -= k
+                    if self._block_left:
+                        return
+                if len(buf) < 4:
+                    return
+                last = bool(buf[0] & 0x80)
+                btype = buf[0] & 0x7F
+                length = int.from_bytes(buf[1:4], "big")
+                if self._first_block:
+                    if btype != 0 or length != 34:
+                        return self._fail("first metadata block is not STREAMINFO")
+                    if len(buf) < 4 + 34:
+                        return
+                    si = bytes(buf[4:38])
+                    packed = int.from_bytes(si[10:18], "big")
+                    self._streaminfo = {
+                        "min_blocksize": int.from_bytes(si[0:2], "big"),
+                        "max_blocksize": int.from_bytes(si[2:4], "big"),
+                        "sample_rate": packed >> 44,
+                        "channels": ((packed >> 41) & 0x7) + 1,
+                        "bits_per_sample": ((packed >> 36) & 0x1F) + 1,
+                        "total_samples": packed & 0xFFFFFFFFF,
+                    }
+                    if self._streaminfo["sample_rate"] == 0:
+                        return self._fail("STREAMINFO sample rate is zero")
+                    self._first_block = False
+                elif btype == 127:
+                    return self._fail("invalid metadata block type")
+                del buf[:4]
+                self._block_left = length
+                if last:
+                    # 元数据块长度先消费完，再进入帧区
+                    k = min(self._block_left, len(buf))
+                    del buf[:k]
+                    self._block_left -= k
+                    self._state = "first_frame" if not self._block_left else "meta_tail"
+            elif self._state == "meta_tail":
+                k = min(self._block_left, len(buf))
+                del buf[:k]
+                self._block_left -= k
+                if self._block_left:
+                    return
+                self._state = "first_frame"
+            elif self._state == "first_frame":
+                n = parse_flac_frame_header(bytes(buf[:32]), 0)
+                if n == -1:
+                    return
+                if not n:
+                    return self._fail("first frame header invalid (sync/CRC-8)")
+                self._frames = 1
+                del buf[:n]
+                self._state = "frames"
+            elif self._state == "frames":
+                self._scan_frames()
+                return
+            else:
+                return
+
+    def _scan_frames(self) -> None:
+        buf = bytes(self._buf)
+        keep_from = max(0, len(buf) - 31)
+        for m in self._SYNC.finditer(buf):
+            i = m.start()
+            if i >= keep_from:
+                break
+            n = parse_flac_frame_header(buf, i)
+            if n and n > 0:
+                self._frames += 1
+        # 保留末尾可能跨块的帧头片段
+        del self._buf[:keep_from]
+
+    def finish(self) -> CheckResult:
+        if self._state == "frames":
+            buf = bytes(self._buf)
+            for m in self._SYNC.finditer(buf):
+                n = parse_flac_frame_header(buf, m.start())
+                if n and n > 0:
+                    self._frames += 1
+        elif self._state != "error":
+            self._error = self._error or f"truncated before audio frames ({self._state})"
+        stats = dict(self._streaminfo)
+        stats["frames"] = self._frames
+        return CheckResult(self.container, not self._error, self._error, stats)
+
+
+_MP3_BITRATES = {
+    # (version_is_mpeg1, layer) -> kbps 表（索引 1..14）
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def mp3_frame_length(h: bytes) -> int | None:
+    """解析 4 字节 MPEG 音频帧头，返回帧长；非法或自由码率返回 None（自由码率返回 0）。"""
+    if len(h) < 4 or h[0] != 0xFF or (h[1] & 0xE0) != 0xE0:
+        return None
+    version = (h[1] >> 3) & 0x3
+    layer_bits = (h[1] >> 1) & 0x3
+    br_idx = h[2] >> 4
+    sr_idx = (h[2] >> 2) & 0x3
+    pad = (h[2] >> 1) & 0x1
+    if version == 1 or layer_bits == 0 or br_idx == 15 or sr_idx == 3:
+        return None
+    layer = 4 - layer_bits
+    mpeg1 = version == 3
+    if br_idx == 0:
+        return 0
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][br_idx] * 1000
+    rate = _MP3_RATES[version][sr_idx]
+    if layer == 1:
+        return (12 * bitrate // rate + pad) * 4
+    if layer == 3 and not mpeg1:
+        return 72 * bitrate // rate + pad
+    return 144 * bitrate // rate + pad
+
+
+class Mp3Check(ContainerCheck):
+    container = "mp3"
+    _TRAILERS = (b"TAG", b"APETAGEX", b"LYRICSBEGIN")
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._skip = 0
+        self._pos = 0
+        self._state = "id3"
+        self._frames = 0
+        self._sync_errors = 0
+        # 失步位置的前几个字节，用于判断是否为末尾标签
+        self._desync_head: bytes | None = None
+        self._free_format = False
+
+    def update(self, data: bytes) -> None:
+        if self._free_format:
+            return
+        if self._skip:
+            k = min(self._skip, len(data))
+            self._skip -= k
+            data = data[k:]
+        self._buf += data
+        self._advance()
+
+    def _advance(self, final: bool = False) -> None:
+        buf = self._buf
+        while True:
+            if self._skip:
+                k = min(self._skip, len(buf))
+                del buf[:k]
+                self._skip -= k
+                if self._skip:
+                    return
+            if self._state == "id3":
+                if len(buf) < 10:
+                    return
+                if bytes(buf[:3]) == b"ID3":
+                    size = 0
+                    for b in buf[6:10]:
+                        size = (size << 7) | (b & 0x7F)
+                    footer = 10 if buf[5] & 0x10 else 0
+                    self._skip = 10 + size + footer
+                self._state = "frames"
+                continue
+            if len(buf) < 4:
+                return
+            n = mp3_frame_length(bytes(buf[:4]))
+            if n == 0:
+                # 自由码率无法从帧头得到帧长，停止行走（不视为错误）
+                self._free_format = True
+                buf.clear()
+                return
+            if n is None:
+                if self._desync_head is None:
+                    if len(buf) < 16 and not final:
+                        return
+                    self._desync_head = bytes(buf[:16])
+                # 寻找下一个可能的帧头
+                j = buf.find(b"\xff", 1)
+                if j == -1:
+                    buf.clear()
+                    return
+                del buf[:j]
+                continue
+            if self._desync_head is not None:
+                self._sync_errors += 1
+                self._desync_head = None
+            self._frames += 1
+            self._skip = n
+
+    def finish(self) -> CheckResult:
+        if not self._free_format:
+            self._advance(final=True)
+        stats = {"frames": self._frames, "sync_errors": self._sync_errors}
+        if self._skip:
+            # 最后一帧不完整：记录但不判错（部分编码器的尾帧如此）
+            stats["truncated_tail"] = True
+        if self._free_format:
+            stats["free_format"] = True
+            return CheckResult(self.container, True, "free-format bitrate, frame walk stopped", stats)
+        trailing = self._desync_head
+        if trailing is not None and not trailing.startswith(self._TRAILERS):
+            self._sync_errors += 1
+            stats["sync_errors"] = self._sync_errors
+        if self._frames == 0:
+            return CheckResult(self.container, False, "no MPEG audio frame found", stats)
+        if self._sync_errors:
+            return CheckResult(self.container, False, f"{self._sync_errors} frame sync loss(es)", stats)
+        return CheckResult(self.container, True, "", stats)
+
+
+class Mp4Check(ContainerCheck):
+    container = "mp4"
+
+    def __init__(self) -> None:
+        self._hdr = bytearray()
+        self._skip = 0
+        self._boxes: list[str] = []
+        self._to_end = False
+        self._error = ""
+
+    def update(self, data: bytes) -> None:
+        if self._error or self._to_end:
+            return
+        mv = memoryview(data)
+        i = 0
+        while i < len(mv):
+            if self._skip:
+                k = min(self._skip, len(mv) - i)
+                self._skip -= k
+                i += k
+                continue
+            need = 16 if len(self._hdr) >= 8 and int.from_bytes(self._hdr[:4], "big") == 1 else 8
+            k = min(need - len(self._hdr), len(mv) - i)
+            self._hdr += mv[i:i + k]
+            i += k
+            if len(self._hdr) < need:
+                continue
+            size = int.from_bytes(self._hdr[:4], "big")
+            if size == 1 and need == 8:
+                continue
+            btype = bytes(self._hdr[4:8]).decode("latin-1")
+            if size == 1:
+                size = int.from_bytes(self._hdr[8:16], "big")
+            if not self._boxes and btype != "ftyp":
+                self._error = f"first box is {btype!r}, expected 'ftyp'"
+                return
+            self._boxes.append(btype)
+            if size == 0:
+                # 延伸到文件末尾的 box
+                self._to_end = True
+                self._hdr.clear()
+                return
+            if size < need:
+                self._error = f"invalid box size {size} for {btype!r}"
+                return
+            self._skip = size - need
+            self._hdr.clear()
+
+    def finish(self) -> CheckResult:
+        stats = {"boxes": self._boxes}
+        if self._error:
+            return CheckResult(self.container, False, self._error, stats)
+        if self._skip or self._hdr:
+            return CheckResult(self.container, False, "truncated top-level box", stats)
+        if "moov" not in self._boxes:
+            return CheckResult(self.container, False, "missing moov box", stats)
+        return CheckResult(self.container, True, "", stats)
+
+
+def container_check_for(ext: str) -> ContainerCheck | None:
+    ext = ext.lower()
+    if ext == ".flac":
+        return FlacCheck()
+    if ext == ".mp3":
+        return Mp3Check()
+    if ext in (".m4a", ".mp4"):
+        return Mp4Check()
+    return None
+
+
+class StreamVerifier:
+    """组合摘要与容器检查，作为 stream_decrypt 的 observer 使用。"""
+
+    def __init__(self, ext: str, digest: str | None = None, container: bool = False) -> None:
+        if digest is not None and digest not in DIGEST_ALGORITHMS:
+            raise ValueError(f"unsupported digest: {digest}")
+        self.digest_name = digest
+        self._hash = hashlib.new(digest) if digest else None
+        self._check = container_check_for(ext) if container else None
+        self.result: CheckResult | None = None
+
+    def __call__(self, data: bytes) -> None:
+        if self._hash is not None:
+            self._hash.update(data)
+        if self._check is not None:
+            self._check.update(data)
+
+    def hexdigest(self) -> str | None:
+        return self._hash.hexdigest() if self._hash is not None else None
+
+    def finish(self) -> CheckResult | None:
+        if self._check is not None and self.result is None:
+            self.result = self._check.finish()
+        return self.result
+
+
+Observer = Callable[[bytes], None]
+
+
+@dataclass
+class SampleVerifyResult:
+    ok: bool
+    detail: str = ""
+    expected_size: int = 0
+    actual_size: int = 0
+    checked_bytes: int = 0
+
+
+def _id3v2_end(read_at: Callable[[int, int], bytes], size: int) -> int:
+    # 跳过开头（可能连续多个）的 ID3v2 标签
+    pos = 0
+    while pos + 10 <= size:
+        hdr = read_at(pos, 10)
+        if hdr[:3] != b"ID3" or len(hdr) < 10:
+            break
+        n = ((hdr[6] & 0x7F) << 21) | ((hdr[7] & 0x7F) << 14) | ((hdr[8] & 0x7F) << 7) | (hdr[9] & 0x7F)
+        pos += 10 + n + (10 if hdr[5] & 0x10 else 0)
+    return min(pos, size)
+
+
+def payload_span(read_at: Callable[[int, int], bytes], size: int) -> tuple[int, int]:
+    """音频负载在文件中的 (偏移, 长度)：写标签只会改动负载之外的部分。
+
+    read_at(offset, n) 读取任意区间；无法识别的结构按“去掉开头 ID3v2 后的全部内容”处理。
+    """
+    start = _id3v2_end(read_at, size)
+    if read_at(start, 4) == b"fLaC":
+        pos = start + 4
+        while pos + 4 <= size:
+            hdr = read_at(pos, 4)
+            pos += 4 + int.from_bytes(hdr[1:4], "big")
+            if hdr[0] & 0x80:
+                return min(pos, size), max(0, size - pos)
+        return start, size - start
+    if read_at(4, 4) == b"ftyp":
+        pos = 0
+        while pos + 8 <= size:
+            hdr = read_at(pos, 16)
+            n, btype, head = int.from_bytes(hdr[:4], "big"), hdr[4:8], 8
+            if n == 1 and len(hdr) >= 16:
+                n, head = int.from_bytes(hdr[8:16], "big"), 16
+            elif n == 0:
+                n = size - pos
+            if n < head:
+                break
+            if btype == b"mdat":
+                return pos + head, min(n, size - pos) - head
+            pos += n
+        return 0, size
+    end = size
+    if end - start >= 128 and read_at(end - 128, 3) == b"TAG":
+        end -= 128
+    return start, end - start
+
+
+def sample_ranges(size: int, samples: int, block: int, rng: random.Random) -> list[tuple[int, int]]:
+    """首块、末块加 samples 个随机区间（按偏移排序、去重）。"""
+    if size <= 0:
+        return []
+    block = max(1, min(block, size))
+    ranges = {(0, block), (size - block, block)}
+    for _ in range(samples):
+        ranges.add((rng.randrange(0, size - block + 1), block))
+    return sorted(ranges)
+
+
+def verify_sampled(
+    dec,
+    out_path: str | Path,
+    samples: int = 8,
+    block: int = 64 * 1024,
+    rng: random.Random | None = None,
+) -> SampleVerifyResult:
+    """抽样比对已存在的输出与源 NCM：音频负载（见 payload_span）长度必须精确相等，抽样区间逐字节一致。
+
+    dec 为已 validate 的可 seek NcmDecoder；任意偏移的明文可由 read_decrypted 直接得到，无需整段解密。
+    标签（ID3、FLAC 元数据块、MP4 moov）不参与比对，写过标签的输出同样可以核验。
+    """
+    rng = rng or random.Random()
+    expected = dec.audio_size()
+    p = Path(out_path)
+    actual = p.stat().st_size
+    if expected is None:
+        return SampleVerifyResult(False, "source size unknown", 0, actual)
+    src_off, src_len = payload_span(dec.read_decrypted, expected)
+    checked = 0
+    with p.open("rb") as fp:
+
+        def read_out(offset: int, n: int) -> bytes:
+            fp.seek(offset)
+            return fp.read(n)
+
+        out_off, out_len = payload_span(read_out, actual)
+        if out_len != src_len:
+            detail = f"size mismatch: expected {expected}, got {actual}"
+            if actual == expected:
+                detail = f"payload size mismatch: expected {src_len}, got {out_len}"
+            return SampleVerifyResult(False, detail, expected, actual)
+        for offset, n in sample_ranges(src_len, samples, block, rng):
+            got = read_out(out_off + offset, n)
+            want = dec.read_decrypted(src_off + offset, n)
+            checked += n
+            if got != want:
+                return SampleVerifyResult(False, f"content mismatch at offset {out_off + offset}", expected, actual, checked)
+    return SampleVerifyResult(True, "", expected, actual, checked)
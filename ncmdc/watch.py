@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+# 说明：
+# watch 模式：常驻监听输入目录，发现新增/变更且已“写完”的 .ncm 后交给转换流程。
+# - 写入判定：同一文件在相隔 settle 秒的两次扫描中 (size, mtime) 不变才视为稳定；
+# - 唤醒方式：Linux 下优先用 inotify 作为唤醒信号（空闲时不轮询），其他平台按间隔轮询；
+# - 背压：待转换事件进入有界队列，队列满时扫描循环阻塞，而不是无限堆积；
+# - 过滤：与一次性扫描共用 scan.ScanFilter（--include/--exclude/--max-depth）。
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable
+
+from .scan import ScanFilter
+
+
+@dataclass(frozen=True)
+class WatchEvent:
+    path: Path
+    # True 表示该路径此前已处理过，本次是内容变更
+    changed: bool
+
+
+class DirectoryWatcher:
+    def __init__(
+        self,
+        root: str | Path,
+        suffixes: Iterable[str] = (".ncm",),
+        settle: float = 3.0,
+        clock: Callable[[], float] = time.monotonic,
+        filters: ScanFilter | None = None,
+    ) -> None:
+        self.root = Path(root)
+        self._suffixes = tuple(s.lower() for s in suffixes)
+        self._filters = filters or ScanFilter()
+        self._settle = settle
+        self._clock = clock
+        # path -> ((size, mtime_ns), 首次观察到该签名的时间)
+        self._pending: dict[Path, tuple[tuple[int, int], float]] = {}
+        # path -> 已提交处理时的签名
+        self._done: dict[Path, tuple[int, int]] = {}
+        self.directories: set[Path] = set()
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        found: dict[Path, tuple[int, int]] = {}
+        dirs: set[Path] = set()
+        filters = self._filters
+        for root, subdirs, files in os.walk(self.root):
+            dirs.add(Path(root))
+            rel = os.path.relpath(root, self.root).replace(os.sep, "/")
+            rel = "" if rel == "." else rel
+            depth = rel.count("/") + 1 if rel else 0
+            # 就地剪枝，被排除/超出深度的子目录不再遍历，也不加入 inotify
+            subdirs[:] = [d for d in subdirs if filters.descend(f"{rel}/{d}" if rel else d, d, depth)]
+            for name in files:
+                if not name.lower().endswith(self._suffixes):
+                    continue
+                if not filters.accept(f"{rel}/{name}" if rel else name, name):
+                    continue
+                p = Path(root) / name
+                try:
+                    st = p.stat()
+                except OSError:
+                    # 扫描期间被删除/移动
+                    continue
+                found[p] = (st.st_size, st.st_mtime_ns)
+        self.directories = dirs
+        return found
+
+    def prime(self, quiet: float | None = None) -> None:
+        """将当前已存在的文件标记为已处理（只监听之后的新增/变更）。
+
+        给出 quiet 时，最近 quiet 秒内仍被修改的文件不做标记，留给 poll 按稳定判定处理。
+        """
+        found = self._scan()
+        if quiet is not None:
+            cutoff = time.time_ns() - int(quiet * 1e9)
+            found = {p: sig for p, sig in found.items() if sig[1] <= cutoff}
+        self._done = found
+        self._pending.clear()
+
+    def is_primed(self, path: str | Path) -> bool:
+        return Path(path) in self._done
+
+    def poll(self) -> list[WatchEvent]:
+        now = self._clock()
+        found = self._scan()
+        events: list[WatchEvent] = []
+        for p, sig in found.items():
+            if self._done.get(p) == sig:
+                self._pending.pop(p, None)
+                continue
+            prev = self._pending.get(p)
+            if prev is None or prev[0] != sig:
+                # 新出现或仍在写入：重新计时
+                self._pending[p] = (sig, now)
+                continue
+            if now - prev[1] >= self._settle:
+                del self._pending[p]
+                events.append(WatchEvent(p, changed=p in self._done))
+                self._done[p] = sig
+        for p in [p for p in self._pending if p not in found]:
+            del self._pending[p]
+        for p in [p for p in self._done if p not in found]:
+            del self._done[p]
+        return events
+
+
+_IN_CREATE = 0x00000100
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+
+
+class _InotifyWaker:
+    """仅作为“有变化，该扫描了”的唤醒信号；目录扫描结果才是事实来源。"""
+
+    _MASK = _IN_CREATE | _IN_CLOSE_WRITE | _IN_MOVED_TO
+
+    def __init__(self, libc: ctypes.CDLL, fd: int) -> None:
+        self._libc = libc
+        self._fd = fd
+        self._watched: set[Path] = set()
+
+    @classmethod
+    def create(cls) -> _InotifyWaker | None:
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except Exception:
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def add(self, dirs: Iterable[Path]) -> None:
+        dirs = set(dirs)
+        # 已删除目录的 watch 由内核自动移除；同名目录重建后需要重新添加
+        self._watched &= dirs
+        for d in dirs - self._watched:
+            if self._libc.inotify_add_watch(self._fd, os.fsencode(d), self._MASK) >= 0:
+                self._watched.add(d)
+
+    def wait(self, timeout: float) -> bool:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self._fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def run_watch(
+    watcher: DirectoryWatcher,
+    handler: Callable[[WatchEvent], None],
+    interval: float = 2.0,
+    workers: int = 1,
+    queue_size: int = 64,
+    logger: logging.Logger | None = None,
+    stop: threading.Event | None = None,
+    rescan: float = 300.0,
+) -> None:
+    """持续监听直至 stop 被设置（或 KeyboardInterrupt）。
+
+    handler 在工作线程中执行；rescan 为 inotify 可用时的兜底全量扫描周期（秒）。
+    """
+    logger = logger or logging.getLogger(__name__)
+    stop = stop or threading.Event()
+    q: queue.Queue[WatchEvent | None] = queue.Queue(maxsize=max(1, queue_size))
+
+    def worker() -> None:
+        while True:
+            ev = q.get()
+            try:
+                if ev is None:
+                    return
+                handler(ev)
+            except Exception:
+                logger.error("watch handler failed", extra={"source": str(ev.path) if ev else ""}, exc_info=True)
+            finally:
+                q.task_done()
+
+    threads = [
+        threading.Thread(target=worker, name=f"ncmdc-watch-{i}", daemon=True)
+        for i in range(max(1, workers))
+    ]
+    for t in threads:
+        t.start()
+
+    waker = _InotifyWaker.create()
+    try:
+        while not stop.is_set():
+            for ev in watcher.poll():
+                # 队列满时阻塞在这里，把背压传导到扫描循环
+                while not stop.is_set():
+                    try:
+                        q.put(ev, timeout=interval)
+                        break
+                    except queue.Full:
+                        continue
+            if waker is not None and not watcher.has_pending:
+                waker.add(watcher.directories)
+                # 没有待稳定文件：只等 inotify 事件（分段等待以便响应 stop）
+                deadline = time.monotonic() + rescan
+                while not stop.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or waker.wait(min(1.0, remaining)):
+                        break
+            else:
+                stop.wait(interval)
+    finally:
+        stop.set()
+        # 丢弃尚未开始的事件（下次启动的首轮遍历会补上），等待进行中的转换结束
+        try:
+            while True:
+                q.get_nowait()
+                q.task_done()
+        except queue.Empty:
+            pass
+        for _ in threads:
+            q.put(None)
+        for t in threads:
+            t.join()
+        if waker is not None:
+            waker.close()
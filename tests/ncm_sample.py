@@ -0,0 +1,46 @@
+# 测试辅助：按 NCM 结构构造最小可解析样本（非测试用例，不会被 discover 收集）
+import base64
+import json
+import struct
+
+from Crypto.Cipher import AES
+
+from ncmdc.ncm.cipher import build_key_box, decrypt_inplace
+from ncmdc.ncm.parser import KEY_CORE, KEY_META, MAGIC_HEADER
+
+
+def _pad(data: bytes) -> bytes:
+    n = 16 - len(data) % 16
+    return data + bytes([n]) * n
+
+
+def make_ncm(
+    audio: bytes,
+    meta: dict | None = None,
+    cover: bytes = b"\xff\xd8\xff\xe0cover",
+    key: bytes = b"0123456789abcdefRC4KEY",
+    meta_type: str = "music",
+) -> bytes:
+    raw_key = b"neteasecloudmusic" + key
+    enc_key = bytearray(AES.new(KEY_CORE, AES.MODE_ECB).encrypt(_pad(raw_key)))
+    for i in range(len(enc_key)):
+        enc_key[i] ^= 0x64
+
+    out = bytearray(MAGIC_HEADER + b"\x00\x00")
+    out += struct.pack("<I", len(enc_key)) + enc_key
+    if meta is None:
+        out += struct.pack("<I", 0)
+    else:
+        plain = meta_type.encode() + b":" + json.dumps(meta).encode("utf-8")
+        b64 = base64.b64encode(AES.new(KEY_META, AES.MODE_ECB).encrypt(_pad(plain)))
+        blob = b"163 key(Don't modify):" + bytes(x ^ 0x63 for x in b64)
+        out += struct.pack("<I", len(blob)) + blob
+    out += b"\x00" * 5
+    # cover frame: len(cover_len + cover + 4 字节填充) 与 parser 的音频起点计算一致
+    out += struct.pack("<I", len(cover) + 4)
+    out += struct.pack("<I", len(cover)) + cover
+    out += b"\x00" * 4
+    body = bytearray(audio)
+    decrypt_inplace(body, 0, build_key_box(key))
+    out += body
+    return bytes(out)
@@ -0,0 +1,190 @@
+# 测试辅助：本地内存版 S3 兼容服务（路径风格寻址），校验 SigV4 签名与负载哈希（非测试用例，不会被 discover 收集）
+import hashlib
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+from ncmdc.s3 import Credentials, S3Client, sign_v4
+
+ACCESS_KEY = "AKIDEXAMPLE"
+SECRET_KEY = "secret/EXAMPLEKEY"
+REGION = "us-east-1"
+
+
+class FakeS3:
+    def __init__(self) -> None:
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.requests: list[tuple[str, str, dict]] = []
+        # 故障注入：前 N 次分片上传返回 500；分片号命中时返回 403
+        self.fail_parts = 0
+        self.reject_part: int | None = None
+        self.max_concurrent_parts = 0
+        # ListObjectsV2 每页条数与 GET 返回的对象字节总数
+        self.page_size = 1000
+        self.bytes_served = 0
+        self._active_parts = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: bytes = b"", headers: dict | None = None) -> None:
+                self.send_response(status)
+                headers = {"Content-Length": str(len(body)), **(headers or {})}
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _error(self, status: int, code: str) -> None:
+                self._reply(status, f"<Error><Code>{code}</Code><Message>{code}</Message></Error>".encode())
+
+            def _handle(self) -> None:
+                parts = urlsplit(self.path)
+                query = dict(parse_qsl(parts.query, keep_blank_values=True))
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if not fake.check_signature(self.command, unquote(parts.path), query, self.headers, body):
+                    self._error(403, "SignatureDoesNotMatch")
+                    return
+                bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+                with fake._lock:
+                    fake.requests.append((self.command, key, query))
+                status, payload, headers = fake.dispatch(self.command, bucket, key, query, body, self.headers.get("Range"))
+                if status >= 400 and not payload:
+                    self._error(status, headers.pop("code", "Error"))
+                else:
+                    self._reply(status, payload, headers)
+
+            do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = _handle
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "FakeS3":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **kwargs) -> S3Client:
+        return S3Client(self.endpoint, Credentials(ACCESS_KEY, SECRET_KEY), REGION, **kwargs)
+
+    def env(self) -> dict[str, str]:
+        return {
+            "AWS_ACCESS_KEY_ID": ACCESS_KEY,
+            "AWS_SECRET_ACCESS_KEY": SECRET_KEY,
+            "AWS_REGION": REGION,
+            "AWS_ENDPOINT_URL_S3": self.endpoint,
+        }
+
+    def check_signature(self, method: str, path: str, query: dict, headers, body: bytes) -> bool:
+        auth = headers.get("Authorization") or ""
+        m = re.match(r"AWS4-HMAC-SHA256 Credential=([^/]+)/[^,]+, SignedHeaders=([^,]+), Signature=(\w+)", auth)
+        if not m or m.group(1) != ACCESS_KEY:
+            return False
+        if headers.get("x-amz-content-sha256") != hashlib.sha256(body).hexdigest():
+            return False
+        now = datetime.strptime(headers["x-amz-date"], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        signed = {k: headers[k] for k in m.group(2).split(";") if k not in ("host", "x-amz-date", "x-amz-content-sha256")}
+        expect = sign_v4(method, headers["Host"], path, query, signed, headers["x-amz-content-sha256"],
+                         Credentials(ACCESS_KEY, SECRET_KEY), REGION, now)
+        return expect["authorization"] == auth
+
+    def dispatch(self, method: str, bucket: str, key: str, query: dict, body: bytes, range_header: str | None = None):
+        with self._lock:
+            if method == "GET" and not key and query.get("list-type") == "2":
+                return self._list(bucket, query)
+            if method == "GET":
+                return self._get(bucket, key, range_header)
+            if method == "PUT" and "uploadId" in query:
+                return self._put_part(query, body)
+            if method == "PUT":
+                self.objects[(bucket, key)] = body
+                return 200, b"", {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}
+            if method == "HEAD":
+                data = self.objects.get((bucket, key))
+                if data is None:
+                    return 404, b"", {}
+                return 200, b"", {"Content-Length": str(len(data))}
+            if method == "POST" and "uploads" in query:
+                upload_id = uuid.uuid4().hex
+                self.uploads[upload_id] = {}
+                return 200, f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>".encode(), {}
+            if method == "POST" and "uploadId" in query:
+                parts = self.uploads.pop(query["uploadId"])
+                numbers = [int(n) for n in re.findall(rb"<PartNumber>(\d+)</PartNumber>", body)]
+                if numbers != sorted(parts):
+                    return 400, b"", {"code": "InvalidPart"}
+                self.objects[(bucket, key)] = b"".join(parts[n] for n in numbers)
+                return 200, b"<CompleteMultipartUploadResult/>", {}
+            if method == "DELETE" and "uploadId" in query:
+                self.uploads.pop(query["uploadId"], None)
+                return 204, b"", {}
+            if method == "DELETE":
+                self.objects.pop((bucket, key), None)
+                return 204, b"", {}
+        return 400, b"", {"code": "NotImplemented"}
+
+    def _put_part(self, query: dict, body: bytes):
+        # 在锁内调用；模拟慢速上传以观察并发分片数
+        number = int(query["partNumber"])
+        if self.reject_part == number:
+            return 403, b"", {"code": "AccessDenied"}
+        if self.fail_parts > 0:
+            self.fail_parts -= 1
+            return 500, b"", {"code": "InternalError"}
+        self._active_parts += 1
+        self.max_concurrent_parts = max(self.max_concurrent_parts, self._active_parts)
+        self._lock.release()
+        try:
+            threading.Event().wait(0.01)
+        finally:
+            self._lock.acquire()
+            self._active_parts -= 1
+        if query["uploadId"] not in self.uploads:
+            return 404, b"", {"code": "NoSuchUpload"}
+        self.uploads[query["uploadId"]][number] = body
+        return 200, b"", {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}
+
+    def _get(self, bucket: str, key: str, range_header: str | None):
+        data = self.objects.get((bucket, key))
+        if data is None:
+            return 404, b"", {"code": "NoSuchKey"}
+        if range_header is None:
+            self.bytes_served += len(data)
+            return 200, data, {}
+        m = re.fullmatch(r"bytes=(\d+)-(\d+)", range_header)
+        start, end = int(m.group(1)), min(int(m.group(2)), len(data) - 1)
+        if start >= len(data):
+            return 416, b"", {"code": "InvalidRange"}
+        self.bytes_served += end + 1 - start
+        return 206, data[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(data)}"}
+
+    def _list(self, bucket: str, query: dict):
+        keys = sorted(k for b, k in self.objects if b == bucket and k.startswith(query.get("prefix", "")))
+        start = int(query.get("continuation-token") or 0)
+        page = keys[start:start + self.page_size]
+        items = "".join(
+            f"<Contents><Key>{escape(k)}</Key><Size>{len(self.objects[(bucket, k)])}</Size></Contents>" for k in page
+        )
+        more = start + len(page) < len(keys)
+        token = f"<NextContinuationToken>{start + len(page)}</NextContinuationToken>" if more else ""
+        body = (
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<IsTruncated>{'true' if more else 'false'}</IsTruncated>{items}{token}</ListBucketResult>"
+        )
+        return 200, body.encode("utf-8"), {}
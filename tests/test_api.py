@@ -0,0 +1,161 @@
+import tempfile
+import threading
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc import ConvertOptions, ConvertResult, convert_archive, convert_file, convert_many
+
+AUDIO = b"fLaC" + bytes(range(256)) * 20
+
+
+class TestConvertFile(unittest.TestCase):
+    def test_defaults_to_source_dir(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "a.ncm"
+            src.write_bytes(make_ncm(AUDIO))
+            res = convert_file(src)
+            self.assertIsInstance(res, ConvertResult)
+            self.assertTrue(res.ok)
+            self.assertEqual(res.output, str(Path(td) / "a.flac"))
+            self.assertEqual(res.bytes, len(AUDIO))
+            self.assertEqual((Path(td) / "a.flac").read_bytes(), AUDIO)
+            self.assertIn("decrypt", res.timings)
+            self.assertGreaterEqual(res.timings["total"], res.timings["decrypt"])
+            # 已存在且未要求覆盖
+            self.assertEqual(convert_file(src).status, "skip")
+            self.assertTrue(convert_file(src, ConvertOptions(overwrite=True)).ok)
+
+    def test_artifacts_and_errors(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "in" / "sub" / "a.ncm"
+            src.parent.mkdir(parents=True)
+            src.write_bytes(make_ncm(AUDIO, {"musicName": "a"}))
+            out = Path(td) / "out"
+            opts = ConvertOptions(cover=True, dump_meta=True, checksum="sha256")
+            res = convert_file(src, opts, output=out, root=Path(td) / "in")
+            self.assertEqual(res.output, str(out / "sub" / "a.flac"))
+            self.assertEqual(
+                sorted(Path(a).name for a in res.artifacts), ["a.flac.sha256", "a.jpg", "a.meta.json"]
+            )
+            self.assertEqual(res.meta["title"], "a")
+            self.assertEqual(res.to_dict()["sha256"], res.digest)
+
+            bad = Path(td) / "bad.ncm"
+            bad.write_bytes(b"not an ncm file")
+            self.assertEqual(convert_file(bad).status, "skip")
+            missing = convert_file(Path(td) / "missing.ncm")
+            self.assertEqual(missing.status, "fail")
+            self.assertTrue(missing.error)
+
+    def test_dry_run(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "a.ncm"
+            src.write_bytes(make_ncm(AUDIO))
+            res = convert_file(src, ConvertOptions(dry_run=True))
+            self.assertEqual(res.status, "plan")
+            self.assertFalse((Path(td) / "a.flac").exists())
+
+
+class TestArtifactsOnly(unittest.TestCase):
+    def test_backfills_missing_artifacts(self):
+        from ncmdc.meta.writer import read_tag_state
+
+        audio = b"\xff\xfb\x90\x00" + bytes(4000)
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "a.ncm"
+            src.write_bytes(make_ncm(audio, {"musicName": "Song", "musicId": 7}))
+            lrc = Path(td) / "a-lyrics.lrc"
+            lrc.write_text("[00:01.00]hello\n", encoding="utf-8")
+            out = Path(td) / "out"
+            self.assertEqual(convert_file(Path(td) / "missing.ncm", ConvertOptions(artifacts_only=True), out).status, "fail")
+            self.assertEqual(convert_file(src, ConvertOptions(artifacts_only=True), out).error, "output missing")
+            self.assertTrue(convert_file(src, output=out).ok)
+            (out / "a.meta.json").write_text("{}", encoding="utf-8")
+
+            opts = ConvertOptions(
+                artifacts_only=True, cover=True, dump_meta=True, export_lyrics=True, lyrics=str(lrc), write_meta=True
+            )
+            res = convert_file(src, opts, out)
+            self.assertEqual(res.status, "ok")
+            # meta 旁车已存在，不重写；音频不重新解密
+            self.assertEqual(res.backfilled, ["cover", "lyrics", "tags"])
+            self.assertNotIn("decrypt", res.timings)
+            self.assertEqual(res.to_dict()["backfilled"], ["cover", "lyrics", "tags"])
+            self.assertEqual((out / "a.meta.json").read_text(encoding="utf-8"), "{}")
+            self.assertTrue((out / "a.jpg").exists())
+            self.assertIn("hello", (out / "a.lrc").read_text(encoding="utf-8"))
+            self.assertEqual(read_tag_state(out / "a.mp3"), {"title": True, "cover": True, "lyrics": True})
+            self.assertTrue((out / "a.mp3").read_bytes().endswith(audio))
+
+            again = convert_file(src, opts, out)
+            self.assertEqual((again.status, again.error, again.backfilled), ("skip", "artifacts complete", []))
+
+
+class TestConvertMany(unittest.TestCase):
+    def _inputs(self, root: Path, n: int) -> list[Path]:
+        paths = []
+        for i in range(n):
+            p = root / f"{i}.ncm"
+            p.write_bytes(make_ncm(AUDIO + bytes([i])))
+            paths.append(p)
+        return paths
+
+    def test_serial_is_lazy(self):
+        with tempfile.TemporaryDirectory() as td:
+            paths = self._inputs(Path(td), 3)
+            it = convert_many(iter(paths), output=Path(td) / "out")
+            first = next(it)
+            self.assertTrue(first.ok)
+            # 第一个结果产出时其余文件尚未转换
+            self.assertFalse((Path(td) / "out" / "2.flac").exists())
+            self.assertEqual(len(list(it)), 2)
+
+    def test_executor_yields_all_results(self):
+        with tempfile.TemporaryDirectory() as td:
+            paths = self._inputs(Path(td), 8)
+            seen = []
+            lock = threading.Lock()
+            with ThreadPoolExecutor(4) as ex:
+                for res in convert_many(paths, output=Path(td) / "out", executor=ex, window=2):
+                    with lock:
+                        seen.append(res)
+            self.assertEqual(len(seen), 8)
+            self.assertTrue(all(r.ok for r in seen))
+            self.assertEqual({r.source for r in seen}, {str(p) for p in paths})
+
+    def test_archive_output_closed(self):
+        with tempfile.TemporaryDirectory() as td:
+            paths = self._inputs(Path(td), 2)
+            out = Path(td) / "o.zip"
+            results = list(convert_many(paths, output=out))
+            self.assertTrue(all(r.ok for r in results))
+            with zipfile.ZipFile(out) as zf:
+                self.assertEqual(sorted(zf.namelist()), ["0.flac", "1.flac"])
+
+    def test_convert_archive(self):
+        with tempfile.TemporaryDirectory() as td:
+            arc = Path(td) / "in.zip"
+            with zipfile.ZipFile(arc, "w") as zf:
+                zf.writestr("d/a.ncm", make_ncm(AUDIO))
+            results = list(convert_archive(arc, output=Path(td) / "out"))
+            self.assertEqual([r.status for r in results], ["ok"])
+            self.assertEqual((Path(td) / "out" / "d" / "a.flac").read_bytes(), AUDIO)
+
+
+class TestOptions(unittest.TestCase):
+    def test_from_namespace(self):
+        import argparse
+
+        ns = argparse.Namespace(overwrite=True, checksum="blake2b", input="x", workers=3)
+        opts = ConvertOptions.from_namespace(ns)
+        self.assertTrue(opts.overwrite)
+        self.assertEqual(opts.checksum, "blake2b")
+        self.assertFalse(opts.dry_run)
+
+
+if __name__ == "__main__":
+    unittest.main()
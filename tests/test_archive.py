@@ -0,0 +1,92 @@
+import io
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path, PurePosixPath
+
+from ncm_sample import make_ncm
+
+from ncmdc.archive import is_archive, iter_ncm_members
+from ncmdc.cli import main
+from ncmdc.ncm.parser import NcmDecoder
+
+AUDIO = b"fLaC" + bytes(range(256)) * 40
+
+
+class NonSeekable(io.RawIOBase):
+    def __init__(self, data: bytes):
+        self._buf = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._buf.read(len(b))
+        b[: len(chunk)] = chunk
+        return len(chunk)
+
+
+class TestForwardOnlyDecoder(unittest.TestCase):
+    def test_stream_decrypt_without_seek(self):
+        dec = NcmDecoder(NonSeekable(make_ncm(AUDIO, {"musicName": "t"})))
+        dec.validate()
+        self.assertEqual(dec.sniff_audio_ext(), ".flac")
+        out = io.BytesIO()
+        dec.stream_decrypt(out, chunk_size=100)
+        self.assertEqual(out.getvalue(), AUDIO)
+        self.assertEqual(dec.get_audio_meta()["title"], "t")
+        with self.assertRaises(RuntimeError):
+            dec.stream_decrypt(io.BytesIO())
+
+
+class TestArchiveInput(unittest.TestCase):
+    def _write_tar(self, path: Path, members: dict[str, bytes]) -> None:
+        with tarfile.open(path, "w:gz") as tf:
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+
+    def test_is_archive(self):
+        self.assertTrue(is_archive("a.tar.gz"))
+        self.assertTrue(is_archive("A.ZIP"))
+        self.assertFalse(is_archive("a.ncm"))
+
+    def test_iter_skips_unsafe_and_non_ncm(self):
+        with tempfile.TemporaryDirectory() as td:
+            arc = Path(td) / "lib.zip"
+            with zipfile.ZipFile(arc, "w") as zf:
+                zf.writestr("a/x.ncm", b"1")
+                zf.writestr("../evil.ncm", b"2")
+                zf.writestr("readme.txt", b"3")
+            names = [(m.path, m.fp.read()) for m in iter_ncm_members(arc)]
+            self.assertEqual(names, [(PurePosixPath("a/x.ncm"), b"1")])
+
+    def test_cli_converts_tar_members(self):
+        with tempfile.TemporaryDirectory() as td:
+            arc = Path(td) / "lib.tar.gz"
+            self._write_tar(arc, {
+                "artist/one.ncm": make_ncm(AUDIO, {"musicName": "one"}),
+                "two.ncm": make_ncm(b"ID3" + b"\x00" * 500),
+                "notes.txt": b"skip me",
+            })
+            out = Path(td) / "out"
+            rc = main(["-i", str(arc), "-o", str(out), "--no-banner", "--quiet", "--dump-meta"])
+            self.assertEqual(rc, 0)
+            self.assertEqual((out / "artist" / "one.flac").read_bytes(), AUDIO)
+            self.assertTrue((out / "artist" / "one.meta.json").exists())
+            self.assertTrue((out / "two.mp3").exists())
+
+    def test_cli_converts_zip_members(self):
+        with tempfile.TemporaryDirectory() as td:
+            arc = Path(td) / "lib.zip"
+            with zipfile.ZipFile(arc, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr("d/one.ncm", make_ncm(AUDIO))
+            out = Path(td) / "out"
+            self.assertEqual(main(["-i", str(arc), "-o", str(out), "--no-banner", "--quiet"]), 0)
+            self.assertEqual((out / "d" / "one.flac").read_bytes(), AUDIO)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from ncm_sample import make_ncm
+
+from ncmdc.catalog import build_catalog, query_catalog
+from ncmdc.cli import main
+
+FLAC = b"fLaC" + bytes(512)
+MP3 = b"ID3" + bytes(512)
+
+
+def _track(path: Path, audio: bytes, title: str, artist: str, album: str, mid: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    meta = {"musicName": title, "artist": [[artist, 1]], "album": album, "musicId": mid, "duration": 1000 * mid}
+    path.write_bytes(make_ncm(audio, meta))
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self._td = tempfile.TemporaryDirectory()
+        self.root = Path(self._td.name) / "lib"
+        self.db = Path(self._td.name) / "lib.db"
+        _track(self.root / "a" / "1.ncm", FLAC, "Blue Sky", "Alice", "Colors", 1)
+        _track(self.root / "a" / "2.ncm", MP3, "Red Moon", "Alice", "Colors", 2)
+        _track(self.root / "b" / "3.ncm", FLAC, "晴天", "周杰伦", "叶惠美", 3)
+        (self.root / "b" / "bad.ncm").write_bytes(b"junk")
+
+    def tearDown(self):
+        self._td.cleanup()
+
+    def _build(self):
+        return build_catalog(self.db, sorted(self.root.rglob("*.ncm")), workers=2, prune_under=self.root)
+
+    def test_build_and_query(self):
+        stats = self._build()
+        self.assertEqual((stats.added, stats.failed), (4, 1))
+        rows = query_catalog(self.db, artist="alice", fmt="flac")
+        self.assertEqual([r["title"] for r in rows], ["Blue Sky"])
+        self.assertEqual(rows[0]["duration_ms"], 1000)
+        self.assertEqual({r["title"] for r in query_catalog(self.db, "moon")}, {"Red Moon"})
+        self.assertEqual([r["song_id"] for r in query_catalog(self.db, artist="杰伦")], [3])
+        # 用户输入不会被当作 FTS 语法
+        self.assertEqual(query_catalog(self.db, 'colors OR "'), [])
+
+    def test_incremental_and_prune(self):
+        self._build()
+        stats = self._build()
+        self.assertEqual((stats.added, stats.updated, stats.unchanged), (0, 0, 4))
+
+        p = self.root / "a" / "1.ncm"
+        _track(p, FLAC, "Green Field", "Alice", "Colors", 1)
+        st = p.stat()
+        os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        (self.root / "a" / "2.ncm").unlink()
+        stats = self._build()
+        self.assertEqual((stats.updated, stats.unchanged, stats.removed), (1, 2, 1))
+        # FTS 索引随更新/删除同步
+        self.assertEqual(query_catalog(self.db, "sky"), [])
+        self.assertEqual([r["title"] for r in query_catalog(self.db, "green")], ["Green Field"])
+        self.assertEqual(query_catalog(self.db, "moon"), [])
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("INSERT INTO tracks_fts(tracks_fts) VALUES ('integrity-check')")
+
+    def test_cli_query_feeds_converter(self):
+        rc = main(["catalog", "build", str(self.root), "--db", str(self.db)])
+        self.assertEqual(rc, 0)
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out):
+            rc = main(["catalog", "query", "--db", str(self.db), "--format", "flac", "--paths"])
+        self.assertEqual(rc, 0)
+        paths = out.getvalue().splitlines()
+        self.assertEqual(len(paths), 2)
+
+        with mock.patch("sys.stdout", io.StringIO()) as js:
+            main(["catalog", "query", "--db", str(self.db), "alice", "--json"])
+        self.assertEqual(len([json.loads(x) for x in js.getvalue().splitlines()]), 2)
+
+        dest = Path(self._td.name) / "out"
+        with mock.patch("sys.stdin", io.StringIO(out.getvalue())):
+            rc = main(["--from-list", "-", "-i", str(self.root), "-o", str(dest), "--no-banner", "--quiet"])
+        self.assertEqual(rc, 0)
+        self.assertEqual(
+            sorted(p.relative_to(dest).as_posix() for p in dest.rglob("*.flac")), ["a/1.flac", "b/3.flac"]
+        )
+        self.assertFalse(list(dest.rglob("*.mp3")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc.cli import main
+from ncmdc.iohints import aligned_buffer
+from ncmdc.ncm.chunking import ChunkTuner, parse_chunk_size, parse_size
+from ncmdc.ncm.parser import NcmDecoder
+
+K = 1024
+
+
+def _feed(tuner: ChunkTuner, speed, total: int) -> None:
+    # speed(size) -> 字节/秒；按 tuner 给出的大小模拟处理 total 字节
+    done = 0
+    while done < total:
+        size = tuner.size()
+        tuner.record(size, size, size / speed(size))
+        done += size
+
+
+class TestParse(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(parse_size("256K"), 256 * K)
+        self.assertEqual(parse_size("1mb"), K * K)
+        self.assertEqual(parse_size("4096"), 4096)
+        self.assertIsNone(parse_chunk_size("auto"))
+        self.assertEqual(parse_size("2G"), 2 * K * K * K)
+        for bad in ("", "K", "-1", "1T", "0"):
+            with self.assertRaises(ValueError):
+                parse_size(bad)
+
+
+class TestTuner(unittest.TestCase):
+    def test_picks_fastest_and_rechecks(self):
+        tuner = ChunkTuner(max_chunk=1024 * K, probe_bytes=2 * K * K, recheck_bytes=16 * K * K)
+        self.assertEqual(tuner.candidates, [64 * K, 128 * K, 256 * K, 512 * K, 1024 * K])
+        # 512K 最快
+        _feed(tuner, lambda s: 100e6 if s == 512 * K else 50e6, 20 * K * K)
+        self.assertEqual(tuner.chosen, 512 * K)
+        self.assertEqual(tuner.size(), 512 * K)
+        rep = tuner.report()
+        self.assertEqual((rep["mode"], rep["size"], rep["rounds"]), ("auto", 512 * K, 1))
+        # 存储特性变化：1M 变快，复查后移动过去
+        _feed(tuner, lambda s: 200e6 if s == 1024 * K else 50e6, 40 * K * K)
+        self.assertEqual(tuner.chosen, 1024 * K)
+        self.assertGreaterEqual(tuner.rounds, 2)
+
+    def test_short_chunks_ignored(self):
+        tuner = ChunkTuner(max_chunk=128 * K, probe_bytes=K)
+        tuner.record(64 * K, 100, 0.001)
+        self.assertEqual(tuner.size(), 64 * K)
+        self.assertEqual(tuner.throughput, {})
+
+
+class TestStreamWithTuner(unittest.TestCase):
+    def test_output_unchanged(self):
+        audio = b"fLaC" + bytes((i * 31) & 0xFF for i in range(600_000))
+        for buffer in (None, aligned_buffer(256 * K)):
+            tuner = ChunkTuner(max_chunk=256 * K, probe_bytes=64 * K)
+            dec = NcmDecoder(io.BytesIO(make_ncm(audio)))
+            dec.validate()
+            out = io.BytesIO()
+            self.assertEqual(dec.stream_decrypt(out, buffer=buffer, tuner=tuner), len(audio))
+            self.assertEqual(out.getvalue(), audio)
+            self.assertTrue(tuner.throughput)
+
+    def test_report_records_chunk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / "a.ncm").write_bytes(make_ncm(b"ID3" + bytes(300_000)))
+            report = Path(tmp) / "r.json"
+            main(["-i", tmp, "--no-banner", "--quiet", "--report", str(report)])
+            chunk = json.loads(report.read_text(encoding="utf-8"))["chunk"]
+            self.assertEqual(chunk, {"mode": "fixed", "size": 256 * K})
+            main(["-i", tmp, "--no-banner", "--quiet", "--overwrite", "--chunk-size", "auto", "--report", str(report)])
+            self.assertEqual(json.loads(report.read_text(encoding="utf-8"))["chunk"]["mode"], "auto")
+            main(["-i", tmp, "--no-banner", "--quiet", "--overwrite", "--chunk-size", "128K", "--report", str(report)])
+            chunk = json.loads(report.read_text(encoding="utf-8"))["chunk"]
+            self.assertEqual(chunk, {"mode": "fixed", "size": 128 * K})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc.cli import main
+from ncmdc.providers.cover import CoverFetcher, with_size
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(3000)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        srv = self.server
+        with srv.lock:
+            srv.hits.append(self.path)
+        time.sleep(0.05)
+        if self.path.startswith("/old"):
+            self.send_response(302)
+            self.send_header("Location", "/pic/a.jpg?param=10y10")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = PNG if self.path.startswith("/pic/") else b"not found"
+        self.send_response(200 if self.path.startswith("/pic/") else 404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CoverServerCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.hits = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestCoverFetcher(CoverServerCase):
+    def test_size_param(self):
+        self.assertEqual(with_size("http://x/a.jpg", 300), "http://x/a.jpg?param=300y300")
+        self.assertEqual(with_size("http://x/a.jpg?param=1y1", 300), "http://x/a.jpg?param=1y1")
+
+    def test_concurrent_requests_download_once(self):
+        f = CoverFetcher(size=300)
+        with ThreadPoolExecutor(8) as ex:
+            results = list(ex.map(f.get, [f"{self.base}/pic/a.jpg"] * 16))
+        self.assertTrue(all(r == PNG for r in results))
+        self.assertEqual(self.server.hits, ["/pic/a.jpg?param=300y300"])
+        self.assertIsNone(f.get(f"{self.base}/missing.jpg"))
+        # keep-alive：三次请求（含 404）复用连接
+        self.assertEqual(f.pool.connections_opened, 1)
+        f.close()
+
+    def test_failures_remembered_per_url(self):
+        f = CoverFetcher(size=None)
+        with ThreadPoolExecutor(4) as ex:
+            results = list(ex.map(f.get, [f"{self.base}/missing.jpg"] * 8))
+        self.assertEqual(results, [None] * 8)
+        self.assertEqual(self.server.hits, ["/missing.jpg"])
+        f.close()
+        g = CoverFetcher(size=None, failure_ttl=0)
+        self.assertIsNone(g.get(f"{self.base}/missing.jpg"))
+        self.assertIsNone(g.get(f"{self.base}/missing.jpg"))
+        self.assertEqual(len(self.server.hits), 3)
+        g.close()
+
+    def test_disk_cache_and_redirect(self):
+        with tempfile.TemporaryDirectory() as td:
+            f = CoverFetcher(td, size=None)
+            self.assertEqual(f.get(f"{self.base}/old"), PNG)
+            self.assertEqual(f.get(f"{self.base}/pic/b.jpg"), PNG)
+            f.close()
+            # 两个 URL 内容相同：只存一份
+            self.assertEqual(len(list((Path(td) / "blobs").iterdir())), 1)
+            n = len(self.server.hits)
+            g = CoverFetcher(td, size=None)
+            self.assertEqual(g.get(f"{self.base}/pic/b.jpg"), PNG)
+            self.assertEqual(len(self.server.hits), n)
+            g.close()
+
+
+class TestCliFetchCover(CoverServerCase):
+    def test_tiny_covers_replaced(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "in"
+            src.mkdir()
+            url = f"{self.base}/pic/album.jpg"
+            for i in range(4):
+                meta = {"musicName": f"t{i}", "albumPic": url}
+                (src / f"{i}.ncm").write_bytes(make_ncm(b"fLaC" + bytes(100), meta, cover=b"\xff\xd8\xff\xe0tiny"))
+            out = Path(td) / "out"
+            rc = main([
+                "-i", str(src), "-o", str(out), "--no-banner", "--quiet", "--workers", "4",
+                "--cover", "--fetch-cover", "--cover-size", "64", "--cover-cache-dir", str(Path(td) / "cache"),
+            ])
+            self.assertEqual(rc, 0)
+            for i in range(4):
+                self.assertEqual((out / f"{i}.png").read_bytes(), PNG)
+            self.assertEqual(self.server.hits, ["/pic/album.jpg?param=64y64"])
+
+    def test_failing_url_requested_once(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "in"
+            src.mkdir()
+            for i in range(6):
+                meta = {"musicName": f"t{i}", "albumPic": f"{self.base}/gone/album.jpg"}
+                (src / f"{i}.ncm").write_bytes(make_ncm(b"fLaC" + bytes(100), meta, cover=b"\xff\xd8\xff\xe0tiny"))
+            out = Path(td) / "out"
+            rc = main([
+                "-i", str(src), "-o", str(out), "--no-banner", "--quiet", "--workers", "3",
+                "--cover", "--fetch-cover", "--cover-size", "32", "--cover-cache-dir", str(Path(td) / "cache"),
+            ])
+            self.assertEqual(rc, 0)
+            # 回退到内嵌封面；同一失败 URL 只请求一次
+            self.assertEqual((out / "0.jpg").read_bytes(), b"\xff\xd8\xff\xe0tiny")
+            self.assertEqual(self.server.hits, ["/gone/album.jpg?param=32y32"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import contextlib
+import io
+import os
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from ncm_sample import make_ncm
+
+from ncmdc.daemon import Daemon, default_socket_path, main_submit, options_from_dict, submit
+from ncmdc.ncm.chunking import ChunkTuner
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "requires Unix domain sockets")
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.sock = self.tmp / "d.sock"
+        self.daemon = Daemon(self.sock, workers=2, queue_size=1)
+        self.thread = threading.Thread(target=self.daemon.serve_forever, daemon=True)
+        self.thread.start()
+        self.assertTrue(self.daemon.ready.wait(5))
+
+    def tearDown(self):
+        submit(self.sock, {"op": "shutdown"}, timeout=5)
+        self.thread.join(5)
+        self.assertFalse(self.sock.exists())
+        self._tmp.cleanup()
+
+    def test_convert_job(self):
+        srcs = []
+        for i in range(3):
+            p = self.tmp / f"s{i}.ncm"
+            p.write_bytes(make_ncm(b"ID3" + bytes([i]) * 5000))
+            srcs.append(str(p))
+        out = self.tmp / "out"
+        events = submit(self.sock, {"op": "convert", "paths": srcs, "output": str(out)}, timeout=10)
+        kinds = [e["event"] for e in events]
+        self.assertEqual(kinds[0], "accepted")
+        self.assertEqual(kinds.count("started"), 3)
+        self.assertEqual(kinds.count("result"), 3)
+        self.assertEqual(events[-1]["event"], "done")
+        self.assertEqual(events[-1]["summary"]["ok"], 3)
+        self.assertEqual((out / "s1.mp3").read_bytes(), b"ID3" + b"\x01" * 5000)
+
+        # 第二次提交：输出已存在，记为跳过
+        events = submit(self.sock, {"paths": srcs[:1], "output": str(out)}, timeout=10)
+        self.assertEqual(events[-1]["summary"]["skip"], 1)
+
+        stats = submit(self.sock, {"op": "stats"}, timeout=5)[-1]
+        self.assertEqual((stats["jobs"], stats["files"], stats["inflight"], stats["queue_size"]), (2, 4, 0, 1))
+
+    def test_bad_requests(self):
+        events = submit(self.sock, {"paths": ["x.ncm"], "options": {"no_such": 1}}, timeout=5)
+        self.assertEqual(events[-1]["event"], "error")
+        self.assertIn("no_such", events[-1]["error"])
+        self.assertEqual(submit(self.sock, {"op": "ping"}, timeout=5)[-1]["event"], "pong")
+
+    def test_client_and_stale_socket(self):
+        src = self.tmp / "a.ncm"
+        src.write_bytes(make_ncm(b"fLaC" + b"\x00" * 100))
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf):
+            code = main_submit(["--socket", str(self.sock), str(src), "--set", 'checksum="sha256"'])
+        self.assertEqual(code, 0)
+        self.assertIn("结果汇总：成功 1", buf.getvalue())
+        self.assertTrue((self.tmp / "a.flac.sha256").exists())
+        # 已有服务在监听时拒绝再启动
+        with self.assertRaises(RuntimeError):
+            Daemon(self.sock)._claim_socket()
+
+    def test_socket_is_private(self):
+        self.assertEqual(stat.S_IMODE(self.sock.stat().st_mode), 0o600)
+        events = submit(self.sock, {"paths": ["x.ncm"], "options": {"pipe_to": "touch pwned"}}, timeout=5)
+        self.assertEqual(events[-1]["event"], "error")
+        self.assertIn("pipe_to", events[-1]["error"])
+        for spec in ("-", "out.tar", str(self.tmp / "out.zip"), "s3://bucket/prefix"):
+            events = submit(self.sock, {"paths": ["x.ncm"], "output": spec}, timeout=5)
+            self.assertEqual(events[-1]["event"], "error", spec)
+            self.assertIn("directory", events[-1]["error"])
+        self.assertFalse((self.tmp / "out.zip").exists())
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "requires Unix domain sockets")
+class TestSocketPath(unittest.TestCase):
+    def test_default_path_in_private_dir(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, {"TMPDIR": tmp}), \
+                mock.patch.object(tempfile, "tempdir", None):
+            os.environ.pop("XDG_RUNTIME_DIR", None)
+            path = default_socket_path()
+            self.assertEqual(path.parent.parent, Path(tmp))
+            server = Daemon()._bind()
+            try:
+                self.assertEqual(stat.S_IMODE(path.parent.stat().st_mode), 0o700)
+                self.assertEqual(stat.S_IMODE(path.stat().st_mode), 0o600)
+            finally:
+                server.server_close()
+            # 目录权限被放宽（或属于他人）时拒绝使用
+            os.chmod(path.parent, 0o755)
+            with self.assertRaises(RuntimeError):
+                Daemon()._bind()
+
+    def test_foreign_owner_rejected(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sock = Path(tmp) / "d.sock"
+            sock.write_bytes(b"")
+            other = os.stat_result((0o140600, 0, 0, 1, os.getuid() + 1, 0, 0, 0, 0, 0))
+            with mock.patch.object(Path, "lstat", return_value=other):
+                with self.assertRaises(RuntimeError):
+                    Daemon(sock)._claim_socket()
+                with self.assertRaises(PermissionError):
+                    submit(sock, {"op": "ping"}, timeout=1)
+            # 不是套接字的同名文件不会被删除
+            with self.assertRaises(RuntimeError):
+                Daemon(sock)._claim_socket()
+            self.assertTrue(sock.exists())
+
+
+class TestOptions(unittest.TestCase):
+    def test_options_from_dict(self):
+        self.assertTrue(options_from_dict({"overwrite": True}).overwrite)
+        with self.assertRaises(ValueError):
+            options_from_dict({"overwrit": True})
+        with self.assertRaises(ValueError):
+            options_from_dict({"pipe_to": "sh -c id"})
+
+    def test_chunk_size_auto_is_explicit(self):
+        tuner = ChunkTuner()
+        opts = options_from_dict({}, tuner)
+        self.assertEqual((opts.chunk_size, opts.chunk_tuner), (None, None))
+        opts = options_from_dict({"chunk_size": "auto"}, tuner)
+        self.assertIs(opts.chunk_tuner, tuner)
+        self.assertEqual(options_from_dict({"chunk_size": 65536}, tuner).chunk_tuner, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc import ConvertOptions
+from ncmdc.cli import main
+from ncmdc.inplace import DEFAULT_JOURNAL, InPlaceConverter, Journal
+from ncmdc.output import DirectorySink
+
+
+def _audio(i: int) -> bytes:
+    return b"fLaC" + bytes((j * (i + 3)) & 0xFF for j in range(50_000 + i * 1000))
+
+
+def _library(root: Path, n: int = 3) -> None:
+    (root / "sub").mkdir(parents=True)
+    for i in range(n):
+        d = root / "sub" if i % 2 else root
+        (d / f"s{i}.ncm").write_bytes(make_ncm(_audio(i)))
+
+
+class TestCliInPlace(unittest.TestCase):
+    def test_converts_and_removes_sources(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            lib = Path(tmp) / "lib"
+            _library(lib)
+            report = Path(tmp) / "r.json"
+            rc = main(["-i", str(lib), "--no-banner", "--quiet", "--in-place", "--min-free-mb", "0", "--report", str(report)])
+            self.assertEqual(rc, 0)
+            self.assertEqual(list(lib.rglob("*.ncm")), [])
+            self.assertEqual((lib / "s0.flac").read_bytes(), _audio(0))
+            self.assertEqual((lib / "sub" / "s1.flac").read_bytes(), _audio(1))
+            self.assertFalse((lib / DEFAULT_JOURNAL).exists())
+            files = json.loads(report.read_text(encoding="utf-8"))["files"]
+            self.assertEqual({f["retired"] for f in files}, {"deleted"})
+
+    def test_archive_sources_and_floor(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            lib, out, arch = Path(tmp) / "lib", Path(tmp) / "out", Path(tmp) / "arch"
+            _library(lib)
+            argv = ["-i", str(lib), "-o", str(out), "--no-banner", "--quiet", "--in-place"]
+            # 剩余空间底线无法满足：全部跳过，源文件保留
+            self.assertEqual(main(argv + ["--min-free-mb", str(1 << 40)]), 0)
+            self.assertEqual(len(list(lib.rglob("*.ncm"))), 3)
+            self.assertEqual(list(out.rglob("*.flac")), [])
+            self.assertEqual(main(argv + ["--min-free-mb", "0", "--archive-sources", str(arch)]), 0)
+            self.assertTrue((arch / "sub" / "s1.ncm").exists())
+            self.assertEqual((out / "sub" / "s1.flac").read_bytes(), _audio(1))
+            self.assertEqual(main(argv + ["--pipe-to", "cat"]), 2)
+
+    def test_mismatched_existing_output_keeps_source(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.ncm"
+            src.write_bytes(make_ncm(_audio(0)))
+            (Path(tmp) / "a.flac").write_bytes(b"something else")
+            self.assertEqual(main(["-i", str(src), "--no-banner", "--quiet", "--in-place", "--min-free-mb", "0"]), 0)
+            self.assertTrue(src.exists())
+            self.assertEqual((Path(tmp) / "a.flac").read_bytes(), b"something else")
+
+    def test_tagged_existing_output_retires_source(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            lib = Path(tmp)
+            meta = {"musicName": "T", "artist": [["A", 1]], "album": "Al", "format": "mp3"}
+            audio = b"\xff\xfb\x90\x00" + bytes(4000)
+            (lib / "a.ncm").write_bytes(make_ncm(audio, meta=meta))
+            (lib / "b.ncm").write_bytes(make_ncm(audio, meta=meta))
+            base = ["--no-banner", "--quiet"]
+            # a.mp3：上次运行已写过标签；b.mp3：用户已有的无标签输出
+            self.assertEqual(main(["-i", str(lib / "a.ncm"), "--write-meta"] + base), 0)
+            tagged = (lib / "a.mp3").read_bytes()
+            self.assertTrue(tagged.startswith(b"ID3"))
+            (lib / "b.mp3").write_bytes(audio)
+            argv = ["-i", str(lib), "--in-place", "--min-free-mb", "0", "--write-meta"] + base
+            self.assertEqual(main(argv), 0)
+            self.assertEqual(list(lib.glob("*.ncm")), [])
+            self.assertEqual((lib / "a.mp3").read_bytes(), tagged)
+            self.assertEqual((lib / "b.mp3").read_bytes(), audio)
+
+
+class TestRecovery(unittest.TestCase):
+    def test_replays_interrupted_journal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            lib = Path(tmp)
+            a, b = lib / "a.ncm", lib / "b.ncm"
+            a.write_bytes(make_ncm(_audio(0)))
+            b.write_bytes(make_ncm(_audio(1)))
+            # a：转换中途中断（半成品输出）；b：核验完成、删除源文件前中断
+            (lib / "a.flac").write_bytes(_audio(0)[:100])
+            (lib / "b.flac").write_bytes(_audio(1))
+            journal = Journal(lib / DEFAULT_JOURNAL)
+            journal.append("begin", str(a), output=str(lib / "a.flac"), created=True)
+            journal.append("begin", str(b), output=str(lib / "b.flac"), created=True)
+            journal.append("ready", str(b), output=str(lib / "b.flac"))
+            journal.close(remove_if_clean=False)
+            with open(journal.path, "a", encoding="utf-8") as fp:
+                fp.write('{"op": "beg')  # 崩溃时写了一半的行
+            journal = Journal(lib / DEFAULT_JOURNAL)
+
+            conv = InPlaceConverter(ConvertOptions(), DirectorySink(lib), journal, root=lib, min_free=0)
+            self.assertEqual(conv.recover(), 2)
+            self.assertFalse((lib / "a.flac").exists())
+            self.assertTrue(a.exists())
+            self.assertFalse(b.exists())
+            self.assertEqual(journal.pending(), {})
+
+            res = conv.convert(a)
+            self.assertEqual((res.status, res.retired), ("ok", "deleted"))
+            self.assertEqual((lib / "a.flac").read_bytes(), _audio(0))
+            journal.close()
+            self.assertFalse(journal.path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc import ConvertOptions, convert_file
+from ncmdc.iohints import COUNTERS, IoCounters, IoHints, aligned_buffer, fileno
+from ncmdc.ncm.parser import NcmDecoder
+
+
+def _audio(n: int) -> bytes:
+    return b"ID3" + bytes((i * 13) & 0xFF for i in range(n - 3))
+
+
+class TestIoHints(unittest.TestCase):
+    def test_aligned_buffer_stream(self):
+        audio = _audio(700_000)
+        buf = aligned_buffer(10_000)
+        self.assertEqual(len(buf) % mmap.PAGESIZE, 0)
+        dec = NcmDecoder(io.BytesIO(make_ncm(audio)))
+        dec.validate()
+        out = io.BytesIO()
+        chunks = []
+        n = dec.stream_decrypt(out, observers=[lambda b: chunks.append(len(b))], buffer=buf)
+        self.assertEqual(n, len(audio))
+        self.assertEqual(out.getvalue(), audio)
+        self.assertLessEqual(max(chunks), len(buf))
+
+    def test_counts_and_truncates(self):
+        counters = IoCounters()
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.bin"
+            src.write_bytes(b"x" * 100_000)
+            dst = Path(tmp) / "b.bin"
+            with src.open("rb") as fin, dst.open("wb") as fout:
+                hints = IoHints(fin, 0, fout, 100_000, window=4096, counters=counters)
+                for _ in range(10):
+                    data = fin.read(5000)
+                    fout.write(data)
+                    hints(data)
+                # 中途停止：预分配的尾部被截掉
+                hints.finish()
+            self.assertEqual(dst.stat().st_size, 50_000)
+        snap = counters.snapshot()
+        self.assertEqual(snap["files"], 1)
+        if hasattr(os, "posix_fadvise"):
+            self.assertEqual(snap["sequential"], 1)
+            self.assertEqual(snap["dropped_read_bytes"], 50_000)
+            self.assertGreater(snap["dropped_write_bytes"], 0)
+        if snap["preallocated_bytes"]:
+            self.assertEqual(snap["preallocated_bytes"], 100_000)
+
+    def test_no_fd(self):
+        self.assertIsNone(fileno(io.BytesIO()))
+
+
+class TestConvertWithHints(unittest.TestCase):
+    def test_convert_file(self):
+        audio = _audio(600_000)
+        before = COUNTERS.snapshot()
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.ncm"
+            src.write_bytes(make_ncm(audio))
+            opts = ConvertOptions(io_hints=True, aligned_buffers=True, checksum="sha256")
+            res = convert_file(src, opts)
+            self.assertTrue(res.ok, res.error)
+            self.assertEqual(Path(res.output).read_bytes(), audio)
+            self.assertEqual(res.digest, hashlib.sha256(audio).hexdigest())
+        after = COUNTERS.snapshot()
+        self.assertEqual(after["files"] - before["files"], 1)
+        self.assertEqual(after["aligned_files"] - before["aligned_files"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from ncmdc.lyrics import dump_lrc, format_timestamp, merge, merge_lrc, parse_lrc
+
+
+class TestParse(unittest.TestCase):
+    def test_timestamp_forms(self):
+        lyr = parse_lrc("[1:05.00]a\n[01:05.000]b\n[01:05:5]c\n[01:05]d\n[123:00.01]e")
+        self.assertEqual(
+            [(ln.time_ms, ln.text) for ln in lyr.lines],
+            [(65000, "a"), (65000, "b"), (65000, "d"), (65500, "c"), (7380010, "e")],
+        )
+
+    def test_multi_timestamp_and_order(self):
+        lyr = parse_lrc("[00:30.00]x\n[00:10.00][00:20.00]chorus\n[10:00.00]late\n[09:00.00]early")
+        self.assertEqual(
+            [(ln.time_ms, ln.text) for ln in lyr.lines],
+            [(10000, "chorus"), (20000, "chorus"), (30000, "x"), (540000, "early"), (600000, "late")],
+        )
+
+    def test_tags_and_offset(self):
+        lyr = parse_lrc("[ti:Song]\n[ar:Someone]\n[offset:500]\nplain text\n[00:01.00]a [b]\n[00:00.20]z")
+        self.assertEqual(lyr.tags, {"ti": "Song", "ar": "Someone"})
+        self.assertEqual([(ln.time_ms, ln.text) for ln in lyr.lines], [(0, "z"), (500, "a [b]")])
+        raw = parse_lrc("[offset:-250]\n[00:01.00]a", apply_offset=False)
+        self.assertEqual(raw.tags["offset"], "-250")
+        self.assertEqual(raw.lines[0].time_ms, 1000)
+
+    def test_dump_round_trip(self):
+        text = "[ti:t]\n[00:01.50]a\n[12:34.56]b"
+        self.assertEqual(dump_lrc(parse_lrc(text)), text)
+        self.assertEqual(format_timestamp(7380010), "123:00.01")
+        self.assertEqual(format_timestamp(1234, digits=3), "00:01.234")
+
+
+class TestMerge(unittest.TestCase):
+    def test_aligns_different_spellings(self):
+        out = merge_lrc("[1:05.00]hello\n[10:00.00]late", "[01:05.000]你好\n[10:00.05]晚")
+        self.assertEqual(out, "[01:05.00]hello / 你好\n[10:00.00]late / 晚")
+
+    def test_nearest_within_tolerance(self):
+        a = parse_lrc("[00:01.00]a1\n[00:01.08]a2")
+        b = parse_lrc("[00:01.07]b\n[00:05.00]only")
+        out = merge(a, b, tolerance_ms=100)
+        self.assertEqual(
+            [(ln.time_ms, ln.text) for ln in out.lines],
+            [(1000, "a1"), (1080, "a2 / b"), (5000, "only")],
+        )
+
+    def test_empty_translation_line(self):
+        self.assertEqual(merge_lrc("[00:00.00]intro", "[00:00.00]"), "[00:00.00]intro")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import sqlite3
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+from ncm_sample import make_ncm
+
+from ncmdc.cli import main
+from ncmdc.metadump import JsonlMetaWriter, SqliteMetaWriter, meta_record
+
+
+def _record(i: int) -> dict:
+    parsed = {"title": f"t{i}", "artists": ["a", "b"], "album": "al", "format": "flac", "song_id": str(i)}
+    return meta_record(f"/src/{i}.ncm", f"/out/{i}.flac", parsed, {"musicId": i})
+
+
+class TestWriters(unittest.TestCase):
+    def test_jsonl_concurrent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "m.jsonl"
+            with JsonlMetaWriter(path) as w, ThreadPoolExecutor(8) as ex:
+                list(ex.map(lambda i: w.add(_record(i)), range(2000)))
+            lines = path.read_text(encoding="utf-8").splitlines()
+            self.assertEqual(len(lines), 2000)
+            self.assertEqual(sorted(json.loads(l)["raw"]["musicId"] for l in lines), list(range(2000)))
+
+    def test_jsonl_flushes_batches_and_appends(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "m.jsonl"
+            path.write_text('{"source": "/src/old.ncm"}\n{"source": "/src/to', encoding="utf-8")
+            w = JsonlMetaWriter(path)
+            try:
+                for i in range(600):
+                    w.add(_record(i))
+                # 未 close 时已满一批的记录已写出（进程被中止也不会丢失）
+                lines = path.read_text(encoding="utf-8").splitlines()
+                self.assertGreaterEqual(len(lines), 2 + 500)
+                # 空闲时剩余记录按间隔落盘
+                with mock.patch("ncmdc.metadump._FLUSH_SECONDS", 0.05):
+                    w2 = JsonlMetaWriter(Path(tmp) / "idle.jsonl")
+                    try:
+                        w2.add(_record(0))
+                        time.sleep(0.3)
+                        self.assertEqual(len((Path(tmp) / "idle.jsonl").read_text(encoding="utf-8").splitlines()), 1)
+                    finally:
+                        w2.close()
+            finally:
+                w.close()
+            lines = path.read_text(encoding="utf-8").splitlines()
+            self.assertEqual(json.loads(lines[0])["source"], "/src/old.ncm")
+            self.assertEqual(lines[1], '{"source": "/src/to')
+            self.assertEqual(len(lines), 602)
+            self.assertEqual(json.loads(lines[2])["source"], "/src/0.ncm")
+
+    def test_sqlite_upsert(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "m.sqlite"
+            with SqliteMetaWriter(path) as w, ThreadPoolExecutor(4) as ex:
+                list(ex.map(lambda i: w.add(_record(i % 700)), range(1400)))
+            self.assertEqual(w.count, 1400)
+            conn = sqlite3.connect(str(path))
+            try:
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM tracks_meta").fetchone()[0], 700)
+                row = conn.execute("SELECT song_id, artist, raw_json FROM tracks_meta WHERE source = '/src/5.ncm'").fetchone()
+            finally:
+                conn.close()
+            self.assertEqual(row[:2], (5, "a / b"))
+            self.assertEqual(json.loads(row[2]), {"musicId": 5})
+
+
+class TestCliAggregate(unittest.TestCase):
+    def test_jsonl_instead_of_sidecars(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "in"
+            src.mkdir()
+            for i in range(3):
+                (src / f"s{i}.ncm").write_bytes(make_ncm(b"ID3" + bytes(50), meta={"musicName": f"song{i}", "musicId": i}))
+            out = Path(tmp) / "out"
+            rc = main(["-i", str(src), "-o", str(out), "--no-banner", "--quiet", "--workers", "3", "--dump-meta-format", "jsonl"])
+            self.assertEqual(rc, 0)
+            self.assertEqual(list(out.glob("*.meta.json")), [])
+            recs = [json.loads(l) for l in (out / "ncm-meta.jsonl").read_text(encoding="utf-8").splitlines()]
+            self.assertEqual(sorted(r["parsed"]["title"] for r in recs), ["song0", "song1", "song2"])
+            self.assertTrue(all(r["output"].endswith(".mp3") for r in recs))
+
+    def test_archive_output_requires_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / "a.ncm").write_bytes(make_ncm(b"ID3" + bytes(50)))
+            rc = main(["-i", tmp, "-o", str(Path(tmp) / "o.zip"), "--no-banner", "--quiet", "--dump-meta-format", "sqlite"])
+            self.assertEqual(rc, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import tempfile
+import unittest
+import urllib.request
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc import ConvertResult
+from ncmdc.cli import main
+from ncmdc.metrics import ConversionMetrics, Counter, Histogram, MetricsServer, Registry, TextfileExporter, parse_listen
+
+
+class TestRegistry(unittest.TestCase):
+    def test_render(self):
+        reg = Registry()
+        c = reg.register(Counter("x_total", "X.", ["kind"]))
+        h = reg.register(Histogram("lat_seconds", "Latency.", buckets=(0.1, 1.0)))
+        c.inc(kind='a"b')
+        c.inc(2, kind='a"b')
+        for v in (0.05, 0.5, 5):
+            h.observe(v)
+        text = reg.render()
+        self.assertIn("# TYPE x_total counter", text)
+        self.assertIn('x_total{kind="a\\"b"} 3', text)
+        self.assertIn('lat_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('lat_seconds_bucket{le="1"} 2', text)
+        self.assertIn('lat_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("lat_seconds_count 3", text)
+        self.assertIn("lat_seconds_sum 5.55", text)
+        tiny = reg.register(Histogram("tiny_seconds", "Tiny.", buckets=(1.0,)))
+        tiny.observe(0.00001)
+        self.assertIn("tiny_seconds_sum 0.00001\n", reg.render())
+        with self.assertRaises(ValueError):
+            c.inc(-1, kind="a")
+        with self.assertRaises(ValueError):
+            reg.register(Counter("x_total", "dup"))
+
+    def test_record_result(self):
+        m = ConversionMetrics()
+        r = ConvertResult(source="a", status="ok", bytes=100, bytes_in=150, timings={"decrypt": 0.2, "total": 0.3})
+        r.warnings.append("lyrics_fetch")
+        m.record(r)
+        m.record(ConvertResult(source="b", status="fail", timings={"header": 0.001}))
+        # 失败（头部即出错）与跳过的文件不计入输入字节
+        m.record(ConvertResult(source="c", status="fail", bytes_in=4096, error="bad header"))
+        m.record(ConvertResult(source="d", status="skip", bytes_in=2048))
+        self.assertEqual(m.files.value(status="ok"), 1)
+        self.assertEqual(m.files.value(status="fail"), 2)
+        self.assertEqual(m.bytes_in.value(), 150)
+        self.assertEqual(m.bytes_out.value(), 100)
+        self.assertEqual(m.stage.count(stage="decrypt"), 1)
+        self.assertEqual(m.fetch_errors.value(kind="lyrics"), 1)
+        self.assertIn("ncmdc_stage_seconds_sum{stage=\"header\"} 0.001", m.registry.render())
+
+    def test_parse_listen(self):
+        self.assertEqual(parse_listen("9464"), ("127.0.0.1", 9464))
+        self.assertEqual(parse_listen("0.0.0.0:80"), ("0.0.0.0", 80))
+        with self.assertRaises(ValueError):
+            parse_listen("host:")
+
+
+class TestExporters(unittest.TestCase):
+    def test_http_and_textfile(self):
+        m = ConversionMetrics()
+        m.queue_depth.set(3)
+        server = MetricsServer(m.registry, "127.0.0.1", 0).start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as resp:
+                self.assertTrue(resp.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+                self.assertIn("ncmdc_queue_depth 3", resp.read().decode())
+        finally:
+            server.stop()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "ncmdc.prom"
+            exp = TextfileExporter(m.registry, path, interval=60).start()
+            m.queue_depth.set(0)
+            exp.stop()
+            self.assertIn("ncmdc_queue_depth 0", path.read_text(encoding="utf-8"))
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], ["ncmdc.prom"])
+
+    def test_cli_textfile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "in"
+            src.mkdir()
+            for i in range(3):
+                (src / f"{i}.ncm").write_bytes(make_ncm(b"ID3" + bytes(100)))
+            (src / "bad.ncm").write_bytes(b"not an ncm file")
+            prom = Path(tmp) / "m.prom"
+            rc = main(["-i", str(src), "-o", str(Path(tmp) / "out"), "--no-banner", "--quiet",
+                       "--workers", "2", "--metrics-textfile", str(prom)])
+            self.assertEqual(rc, 0)
+            text = prom.read_text(encoding="utf-8")
+            self.assertIn('ncmdc_files_total{status="ok"} 3', text)
+            self.assertIn('ncmdc_files_total{status="skip"} 1', text)
+            self.assertIn('ncmdc_stage_seconds_count{stage="decrypt"} 3', text)
+            self.assertIn("ncmdc_queue_depth 0", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
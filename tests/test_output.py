@@ -0,0 +1,147 @@
+import io
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path, PurePosixPath
+from unittest import mock
+
+from ncm_sample import make_ncm
+
+from ncmdc.cli import main
+from ncmdc.output import DirectorySink, TarSink, ZipSink, open_output
+
+AUDIO = b"fLaC" + bytes(range(256)) * 30
+
+
+class _Unseekable(io.RawIOBase):
+    def __init__(self, fp):
+        self._fp = fp
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self._fp.write(b)
+
+    def flush(self):
+        self._fp.flush()
+
+
+class TestSinks(unittest.TestCase):
+    def test_tar_known_and_unknown_size(self):
+        buf = io.BytesIO()
+        sink = TarSink(buf)
+        with sink.open(PurePosixPath("a/x.bin"), size=5) as fp:
+            fp.write(b"ab")
+            fp.write(b"cde")
+        with sink.open(PurePosixPath("a/y.txt")) as fp:
+            fp.write(b"unknown size")
+        sink.write_text(PurePosixPath("z.json"), "{}")
+        self.assertTrue(sink.exists(PurePosixPath("a/x.bin")))
+        sink.close()
+        self.assertEqual(len(buf.getvalue()) % tarfile.RECORDSIZE, 0)
+        buf.seek(0)
+        with tarfile.open(fileobj=buf) as tf:
+            self.assertEqual(tf.getnames(), ["a/x.bin", "a/y.txt", "z.json"])
+            self.assertEqual(tf.extractfile("a/x.bin").read(), b"abcde")
+            self.assertEqual(tf.extractfile("a/y.txt").read(), b"unknown size")
+
+    def test_tar_size_mismatch_keeps_stream_readable(self):
+        buf = io.BytesIO()
+        sink = TarSink(buf)
+        with self.assertRaises(OSError):
+            with sink.open(PurePosixPath("bad"), size=10) as fp:
+                fp.write(b"short")
+        sink.write_bytes(PurePosixPath("good"), b"ok")
+        sink.close()
+        buf.seek(0)
+        with tarfile.open(fileobj=buf) as tf:
+            self.assertEqual(tf.extractfile("good").read(), b"ok")
+            self.assertEqual(tf.getnames(), ["bad.partial", "good"])
+
+    def test_tar_failed_member_not_extracted_as_track(self):
+        long_name = "专辑/" + "很长的曲名" * 30 + ".flac"
+        for target in ("file", "stream"):
+            with self.subTest(target=target), tempfile.TemporaryDirectory() as td:
+                path = Path(td) / "o.tar"
+                raw = path.open("wb")
+                # 不可 seek 的目标（stdout 管道）走缓冲路径
+                out = raw if target == "file" else _Unseekable(raw)
+                sink = TarSink(out)
+                for name in ("a.flac", long_name):
+                    with self.assertRaises(RuntimeError):
+                        with sink.open(PurePosixPath(name), size=4096) as fp:
+                            fp.write(b"x" * 1000)
+                            raise RuntimeError("decrypt failed")
+                    self.assertFalse(sink.exists(PurePosixPath(name)))
+                sink.write_bytes(PurePosixPath("b.flac"), b"fine")
+                sink.close()
+                raw.close()
+                with tarfile.open(path) as tf:
+                    names = tf.getnames()
+                    self.assertNotIn("a.flac", names)
+                    self.assertNotIn(long_name, names)
+                    self.assertEqual(tf.extractfile("b.flac").read(), b"fine")
+                    if target == "file":
+                        self.assertEqual(names, ["a.flac.partial", long_name + ".partial", "b.flac"])
+                        self.assertIn("ncmdc.failed", tf.getmember("a.flac.partial").pax_headers)
+                    else:
+                        self.assertEqual(names, ["b.flac"])
+
+    def test_zip_sink(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "o.zip"
+            sink = ZipSink(path)
+            with sink.open(PurePosixPath("d/a.flac"), size=3) as fp:
+                fp.write(b"abc")
+            sink.close()
+            with zipfile.ZipFile(path) as zf:
+                self.assertEqual(zf.read("d/a.flac"), b"abc")
+
+    def test_open_output_routing(self):
+        with tempfile.TemporaryDirectory() as td:
+            self.assertIsInstance(open_output(td), DirectorySink)
+            self.assertIsInstance(open_output(str(Path(td) / "x.tgz")), TarSink)
+            self.assertIsInstance(open_output(str(Path(td) / "x.zip")), ZipSink)
+
+
+class TestCliArchiveOutput(unittest.TestCase):
+    def test_convert_into_tar(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "in"
+            (src / "sub").mkdir(parents=True)
+            (src / "sub" / "a.ncm").write_bytes(make_ncm(AUDIO, {"musicName": "a"}))
+            out = Path(td) / "out.tar.gz"
+            rc = main(["-i", str(src), "-o", str(out), "--no-banner", "--quiet", "--cover", "--dump-meta"])
+            self.assertEqual(rc, 0)
+            with tarfile.open(out) as tf:
+                names = tf.getnames()
+                self.assertIn("sub/a.flac", names)
+                self.assertIn("sub/a.jpg", names)
+                self.assertIn("sub/a.meta.json", names)
+                self.assertEqual(tf.extractfile("sub/a.flac").read(), AUDIO)
+
+    def test_convert_to_stdout(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "a.ncm"
+            src.write_bytes(make_ncm(AUDIO))
+            stdout = io.TextIOWrapper(io.BytesIO())
+            with mock.patch("sys.stdout", stdout):
+                rc = main(["-i", str(src), "-o", "-", "--no-banner", "--quiet"])
+            self.assertEqual(rc, 0)
+            raw = stdout.buffer
+            raw.seek(0)
+            with tarfile.open(fileobj=raw, mode="r|") as tf:
+                member = tf.next()
+                self.assertEqual(member.name, "a.flac")
+                self.assertEqual(tf.extractfile(member).read(), AUDIO)
+
+    def test_write_meta_rejected(self):
+        with tempfile.TemporaryDirectory() as td:
+            rc = main(["-i", td, "-o", str(Path(td) / "o.zip"), "--no-banner", "--quiet", "--write-meta"])
+            self.assertEqual(rc, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc import ConvertOptions, convert_archive, convert_file
+from ncmdc.api import convert_stream
+from ncmdc.ncm.parallel import parallel_decrypt, split_ranges
+from ncmdc.ncm.parser import NcmDecoder
+from ncmdc.output import DirectorySink
+
+
+def _audio(n: int) -> bytes:
+    return b"fLaC" + bytes((i * 7 + i // 256) & 0xFF for i in range(n - 4))
+
+
+class TestSplitRanges(unittest.TestCase):
+    def test_cover_whole_size(self):
+        ranges = split_ranges(1000, 300)
+        self.assertEqual(ranges, [(0, 256), (256, 512), (512, 768), (768, 1000)])
+        self.assertEqual(split_ranges(0, 300), [])
+
+
+class TestParallelDecrypt(unittest.TestCase):
+    def test_matches_stream_decrypt(self):
+        audio = _audio(200_000)
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.ncm"
+            src.write_bytes(make_ncm(audio))
+            with src.open("rb") as fp:
+                dec = NcmDecoder(fp)
+                dec.validate()
+                dst = Path(tmp) / "a.flac"
+                n = parallel_decrypt(src, dst, dec.audio_start, dec.audio_size(), dec.key_box, 3, "thread", range_size=10_000)
+            self.assertEqual(n, len(audio))
+            self.assertEqual(dst.read_bytes(), audio)
+
+    def test_failure_removes_output(self):
+        audio = _audio(50_000)
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.ncm"
+            src.write_bytes(make_ncm(audio))
+            with src.open("rb") as fp:
+                dec = NcmDecoder(fp)
+                dec.validate()
+                start, size = dec.audio_start, dec.audio_size()
+            dst = Path(tmp) / "a.flac"
+            # 声明的大小超过源文件实际长度：末尾区间读到 EOF
+            with self.assertRaises(EOFError):
+                parallel_decrypt(src, dst, start, size + 4096, dec.key_box, 2, "thread", range_size=8192)
+            self.assertFalse(dst.exists())
+
+
+class TestConvertSplit(unittest.TestCase):
+    def test_convert_file_uses_ranges_above_threshold(self):
+        audio = _audio(3 * 1024 * 1024)
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "big.ncm"
+            src.write_bytes(make_ncm(audio))
+            opts = ConvertOptions(split_threshold_mb=1, split_workers=2, split_backend="thread", checksum="sha256")
+            res = convert_file(src, opts, output=Path(tmp) / "out")
+            self.assertTrue(res.ok, res.error)
+            self.assertEqual(res.ranges, 1)
+            self.assertEqual(Path(res.output).read_bytes(), audio)
+            self.assertEqual(res.digest, hashlib.sha256(audio).hexdigest())
+            self.assertEqual(res.to_dict()["ranges"], 1)
+
+            # 低于阈值走顺序解密
+            res = convert_file(src, ConvertOptions(overwrite=True), output=Path(tmp) / "out")
+            self.assertTrue(res.ok)
+            self.assertIsNone(res.ranges)
+
+    def test_split_needs_explicit_local_path(self):
+        audio = _audio(3 * 1024 * 1024)
+        other = _audio(3 * 1024 * 1024 + 100)
+        opts = ConvertOptions(split_threshold_mb=1, split_workers=2, split_backend="thread")
+        with tempfile.TemporaryDirectory() as tmp:
+            # 归档成员名与当前目录下无关文件的相对路径相同：不能把后者当作源文件
+            (Path(tmp) / "big.ncm").write_bytes(make_ncm(other))
+            archive = Path(tmp) / "lib.zip"
+            with zipfile.ZipFile(archive, "w") as zf:
+                zf.writestr("big.ncm", make_ncm(audio))
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                results = list(convert_archive(archive, opts, output=Path(tmp) / "out"))
+            finally:
+                os.chdir(cwd)
+            self.assertTrue(results[0].ok, results[0].error)
+            self.assertIsNone(results[0].ranges)
+            self.assertEqual((Path(tmp) / "out" / "big.flac").read_bytes(), audio)
+
+            # 已打开的本地文件：未给 path 时顺序解密
+            with (Path(tmp) / "big.ncm").open("rb") as fp:
+                res = convert_stream(fp, "s", DirectorySink(Path(tmp) / "s"), opts)
+            self.assertTrue(res.ok)
+            self.assertIsNone(res.ranges)
+
+    def test_process_backend(self):
+        audio = _audio(300_000)
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.ncm"
+            src.write_bytes(make_ncm(audio))
+            with src.open("rb") as fp:
+                dec = NcmDecoder(fp)
+                dec.validate()
+                dst = Path(tmp) / "a.flac"
+                parallel_decrypt(src, dst, dec.audio_start, dec.audio_size(), dec.key_box, 2, "process", range_size=100_000)
+            self.assertEqual(dst.read_bytes(), audio)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import shlex
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc import ConvertOptions, convert_file
+from ncmdc.cli import main
+from ncmdc.pipe import build_command, check_template
+
+# 超过管道缓冲区，覆盖子进程提前退出（EPIPE）的情况
+AUDIO = b"fLaC" + bytes(range(256)) * 4096
+PY = shlex.quote(sys.executable)
+
+COPY = "import os,sys,shutil; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb')); open(sys.argv[1] + '.env', 'w').write(os.environ['NCMDC_TITLE'])"
+
+
+class TestTemplate(unittest.TestCase):
+    def test_placeholders_are_per_argument(self):
+        cmd = build_command("tool --title {title} -f {ext} {{lit}}", {"title": "a b; rm -rf /", "ext": "flac"})
+        self.assertEqual(cmd, ["tool", "--title", "a b; rm -rf /", "-f", "flac", "{lit}"])
+
+    def test_check(self):
+        check_template("cat {stem}.{ext}")
+        for bad in ("cat {nope}", "", "cat 'unterminated"):
+            with self.assertRaises(ValueError):
+                check_template(bad)
+
+
+class TestPipe(unittest.TestCase):
+    def test_pipe_with_placeholders_and_env(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "a.ncm"
+            src.write_bytes(make_ncm(AUDIO, {"musicName": "Song"}))
+            dest = Path(td) / "piped"
+            dest.mkdir()
+            cmd = f"{PY} -c {shlex.quote(COPY)} {shlex.quote(str(dest))}/{{stem}}.{{ext}}"
+            res = convert_file(src, ConvertOptions(pipe_to=cmd, checksum="sha256"), output=Path(td) / "out")
+            self.assertEqual(res.status, "ok", res.error)
+            self.assertEqual(res.returncode, 0)
+            self.assertIsNone(res.output)
+            self.assertEqual((dest / "a.flac").read_bytes(), AUDIO)
+            self.assertEqual((dest / "a.flac.env").read_text(), "Song")
+            self.assertEqual(res.digest, hashlib.sha256(AUDIO).hexdigest())
+            self.assertFalse(res.partial)
+            # 不产生输出音频与校验和旁车
+            self.assertFalse((Path(td) / "out").exists())
+
+    def test_early_exit_and_exit_codes(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "a.ncm"
+            src.write_bytes(make_ncm(AUDIO))
+            head = f"{PY} -c {shlex.quote('import sys; sys.stdin.buffer.read(10)')}"
+            res = convert_file(src, ConvertOptions(pipe_to=head, checksum="sha256", verify_container=True))
+            self.assertEqual(res.status, "ok")
+            self.assertLess(res.bytes, len(AUDIO))
+            # 只送出了开头部分：标记 partial，不报告摘要与容器检查
+            self.assertTrue(res.partial)
+            self.assertIsNone(res.digest)
+            self.assertIsNone(res.container)
+            self.assertTrue(res.to_dict()["partial"])
+            self.assertNotIn("sha256", res.to_dict())
+
+            fail = f"{PY} -c {shlex.quote('import sys; sys.stdin.buffer.read(); sys.exit(3)')}"
+            res = convert_file(src, ConvertOptions(pipe_to=fail))
+            self.assertEqual((res.status, res.returncode, res.error), ("fail", 3, "exit code 3"))
+            self.assertEqual(convert_file(src, ConvertOptions(pipe_to=fail, pipe_skip_code=3)).status, "skip")
+
+    @unittest.skipUnless(shutil.which("sha256sum"), "sha256sum not available")
+    def test_cli_sha256sum_summary(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "in"
+            src.mkdir()
+            for i in range(3):
+                (src / f"{i}.ncm").write_bytes(make_ncm(AUDIO + bytes([i])))
+            report = Path(td) / "r.json"
+            rc = main(["-i", str(src), "--no-banner", "--quiet", "--workers", "2", "--pipe-to", "sha256sum", "--report", str(report)])
+            self.assertEqual(rc, 0)
+            data = json.loads(report.read_text(encoding="utf-8"))
+            self.assertEqual(data["summary"]["ok"], 3)
+            self.assertFalse(list(src.glob("*.flac")))
+
+    def test_cli_rejects_bad_template(self):
+        with tempfile.TemporaryDirectory() as td:
+            self.assertEqual(main(["-i", td, "--no-banner", "--quiet", "--pipe-to", "cat {bogus}"]), 2)
+            self.assertEqual(main(["-i", td, "--no-banner", "--quiet", "--pipe-to", "cat", "--write-meta"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
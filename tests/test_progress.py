@@ -0,0 +1,127 @@
+import io
+import os
+import logging
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc.cli import main
+from ncmdc.logqueue import LogPipeline, worker_initializer
+from ncmdc.ncm.parallel import parallel_decrypt
+from ncmdc.ncm.parser import NcmDecoder
+from ncmdc.progress import Progress
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _child_log(msg: str) -> int:
+    logging.getLogger("ncmdc.worker").warning(msg)
+    return 1
+
+
+class TestProgress(unittest.TestCase):
+    def test_rate_and_eta(self):
+        clock = FakeClock()
+        p = Progress(io.StringIO(), clock=clock)
+        p.set_total(4, 40 * 1048576)
+        clock.t = 2.0
+        p.advance(10 * 1048576)
+        self.assertEqual(p.line(), "进度：1/4 文件，10.0/40.0 MB，5.0 MB/s，剩余 00:06")
+
+    def test_unknown_total(self):
+        clock = FakeClock()
+        p = Progress(io.StringIO(), clock=clock)
+        clock.t = 1.0
+        p.advance(1048576)
+        self.assertEqual(p.line(), "进度：1 文件，1.0 MB，1.0 MB/s")
+
+    def test_non_tty_writes_whole_lines(self):
+        out = io.StringIO()
+        p = Progress(out, interval=60).start()
+        p.write("WARNING hello")
+        p.advance(5)
+        p.close()
+        p.close()
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "WARNING hello")
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("进度：1 文件"))
+        self.assertNotIn("\r", out.getvalue())
+
+
+class TestLogPipeline(unittest.TestCase):
+    def test_thread_logging_and_restore(self):
+        out = io.StringIO()
+        logger = logging.getLogger("ncmdc")
+        before = (logger.handlers[:], logger.propagate)
+        pipe = LogPipeline(logging.INFO, stream=out).start()
+        logging.getLogger("ncmdc.test").info("queued %d", 1)
+        pipe.stop()
+        self.assertEqual(out.getvalue(), "INFO queued 1\n")
+        self.assertEqual((logger.handlers, logger.propagate), before)
+
+    def test_process_workers(self):
+        with tempfile.TemporaryDirectory() as td:
+            log_file = Path(td) / "run.log"
+            pipe = LogPipeline(logging.INFO, stream=io.StringIO(), log_file=str(log_file), for_processes=True).start()
+            try:
+                with ProcessPoolExecutor(2, initializer=worker_initializer, initargs=pipe.worker_args()) as ex:
+                    self.assertEqual(sum(ex.map(_child_log, ["a", "b", "c"])), 3)
+            finally:
+                pipe.stop()
+            lines = sorted(log_file.read_text(encoding="utf-8").splitlines())
+            self.assertEqual(lines, ["WARNING a", "WARNING b", "WARNING c"])
+
+    def test_split_process_pool_joins_pipeline(self):
+        audio = b"fLaC" + bytes(60_000)
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "a.ncm"
+            src.write_bytes(make_ncm(audio))
+            with src.open("rb") as fp:
+                dec = NcmDecoder(fp)
+                dec.validate()
+            log_file = Path(td) / "run.log"
+            pipe = LogPipeline(logging.INFO, stream=io.StringIO(), log_file=str(log_file)).start()
+            try:
+                # 声明的大小超过实际长度：子进程中的末尾区间读到 EOF 并记录日志
+                with self.assertRaises(EOFError):
+                    parallel_decrypt(src, Path(td) / "a.flac", dec.audio_start, len(audio) + 4096, dec.key_box, 3,
+                                     "process", range_size=16384)
+            finally:
+                pipe.stop()
+            text = log_file.read_text(encoding="utf-8")
+            self.assertIn("WARNING split range", text)
+            self.assertNotIn(f"pid {os.getpid()}", text)
+
+
+class TestCliProgress(unittest.TestCase):
+    def test_progress_and_log_file(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "in"
+            src.mkdir()
+            for i in range(3):
+                (src / f"{i}.ncm").write_bytes(make_ncm(b"fLaC" + bytes(1000 + i)))
+            (src / "bad.ncm").write_bytes(b"junk")
+            log_file = Path(td) / "run.log"
+            err = io.StringIO()
+            with mock.patch("sys.stderr", err):
+                rc = main(["-i", str(src), "-o", str(Path(td) / "out"), "--no-banner", "--progress", "--log-file", str(log_file), "--workers", "2"])
+            self.assertEqual(rc, 0)
+            self.assertIn("进度：4/4 文件", err.getvalue())
+            # 进度模式只保留告警
+            self.assertIn("magic header mismatch", log_file.read_text(encoding="utf-8"))
+            self.assertNotIn("INFO", log_file.read_text(encoding="utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from ncmdc.scan import scan_tree
+
+
+class TestScanTree(unittest.TestCase):
+    def _tree(self, root: Path) -> None:
+        for rel in ("a.ncm", "b.NCM", "c.mp3", "x/d.ncm", "x/y/e.ncm", "skip/f.ncm", "x/y/z/g.ncm"):
+            p = root / rel
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_bytes(b"")
+
+    def _names(self, it):
+        return sorted(p.name for p in it)
+
+    def test_all_ncm(self):
+        with tempfile.TemporaryDirectory() as td:
+            self._tree(Path(td))
+            names = self._names(scan_tree(td, workers=4))
+            self.assertEqual(names, ["a.ncm", "b.NCM", "d.ncm", "e.ncm", "f.ncm", "g.ncm"])
+
+    def test_max_depth(self):
+        with tempfile.TemporaryDirectory() as td:
+            self._tree(Path(td))
+            self.assertEqual(self._names(scan_tree(td, max_depth=0)), ["a.ncm", "b.NCM"])
+            self.assertEqual(self._names(scan_tree(td, max_depth=1)), ["a.ncm", "b.NCM", "d.ncm", "f.ncm"])
+
+    def test_include_exclude(self):
+        with tempfile.TemporaryDirectory() as td:
+            self._tree(Path(td))
+            self.assertEqual(self._names(scan_tree(td, exclude=["skip", "y"])), ["a.ncm", "b.NCM", "d.ncm"])
+            # fnmatch 语义：* 可跨越 /，因此 x/* 覆盖 x 下所有层级
+            self.assertEqual(self._names(scan_tree(td, include=["x/*"])), ["d.ncm", "e.ncm", "g.ncm"])
+            self.assertEqual(self._names(scan_tree(td, include=["[ae].ncm"])), ["a.ncm", "e.ncm"])
+
+    def test_early_close(self):
+        with tempfile.TemporaryDirectory() as td:
+            self._tree(Path(td))
+            it = scan_tree(td)
+            self.assertTrue(next(it).name.lower().endswith(".ncm"))
+            it.close()
+
+    def test_missing_root(self):
+        self.assertEqual(list(scan_tree("/nonexistent/ncmdc-scan-test")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
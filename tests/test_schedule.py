@@ -0,0 +1,82 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from ncmdc.schedule import ByteBudget, Task, lpt_makespan, plan_tasks, run_scheduled
+
+
+class TestPlanTasks(unittest.TestCase):
+    def test_largest_first_and_small_batches(self):
+        with tempfile.TemporaryDirectory() as td:
+            sizes = {"big": 5000, "mid": 3000, "s1": 10, "s2": 20, "s3": 30}
+            paths = []
+            for name, size in sizes.items():
+                p = Path(td) / name
+                p.write_bytes(b"x" * size)
+                paths.append(p)
+            tasks = plan_tasks(paths, small_bytes=100, batch_bytes=40)
+            self.assertEqual([t.paths[0].name for t in tasks[:2]], ["big", "mid"])
+            small = [sorted(p.name for p in t.paths) for t in tasks[2:]]
+            self.assertEqual(sorted(small), [["s1", "s2"], ["s3"]])
+            self.assertEqual([t.size for t in tasks], sorted((t.size for t in tasks), reverse=True))
+
+
+class TestBudget(unittest.TestCase):
+    def test_oversized_request_runs_alone(self):
+        b = ByteBudget(10)
+        b.acquire(50)
+        got = threading.Event()
+        t = threading.Thread(target=lambda: (b.acquire(1), got.set()))
+        t.start()
+        self.assertFalse(got.wait(0.1))
+        b.release(50)
+        self.assertTrue(got.wait(2.0))
+        t.join()
+        self.assertEqual(b.peak, 50)
+
+
+class TestRunScheduled(unittest.TestCase):
+    def test_lpt_makespan(self):
+        self.assertAlmostEqual(lpt_makespan([4, 3, 3, 2], workers=2, rate=1.0), 6.0)
+
+    def test_budget_respected(self):
+        tasks = [Task([Path(f"f{i}")], 60) for i in range(6)]
+        lock = threading.Lock()
+        state = {"now": 0, "max": 0}
+
+        def fn(p):
+            with lock:
+                state["now"] += 60
+                state["max"] = max(state["max"], state["now"])
+            time.sleep(0.01)
+            with lock:
+                state["now"] -= 60
+
+        report = run_scheduled(tasks, fn, workers=4, max_inflight_bytes=130)
+        self.assertLessEqual(state["max"], 120)
+        self.assertEqual(report.files, 6)
+        self.assertLessEqual(report.peak_inflight_bytes, 130)
+        self.assertGreater(report.expected_seconds, 0)
+        self.assertIn("调度", report.summary())
+
+    def test_failure_does_not_drop_batch(self):
+        tasks = [Task([Path("a"), Path("bad"), Path("c")], 3), Task([Path("d")], 1)]
+        done, errors = [], []
+
+        def fn(p):
+            if p.name == "bad":
+                raise ValueError("boom")
+            done.append(p.name)
+
+        with self.assertLogs("ncmdc", "ERROR"):
+            report = run_scheduled(tasks, fn, workers=2, on_error=lambda p, e: errors.append((p.name, str(e))))
+        self.assertEqual(sorted(done), ["a", "c", "d"])
+        self.assertEqual(errors, [("bad", "boom")])
+        self.assertEqual(report.failed, 1)
+        self.assertIn("异常 1 个", report.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from ncm_sample import make_ncm
+
+from ncmdc.cli import main
+from ncmdc.shard import assign_by_size, merge_reports, parse_shard, select_shard, shard_key, shard_of
+
+
+class TestShard(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for bad in ("0/4", "5/4", "x", "1/0"):
+            with self.assertRaises(ValueError):
+                parse_shard(bad)
+
+    def test_hash_is_stable_and_partitions(self):
+        keys = [f"d{i % 7}/{i}.ncm" for i in range(200)]
+        # 固定值：跨进程/跨机器不变
+        self.assertEqual(shard_of("a/b.ncm", 4), shard_of("a/b.ncm", 4))
+        parts = [set(select_shard([Path(k) for k in keys], i, 3, root=Path.cwd())) for i in (1, 2, 3)]
+        self.assertEqual(sum(len(p) for p in parts), 200)
+        self.assertEqual(set().union(*parts), {Path(k) for k in keys})
+        self.assertTrue(all(len(p) > 40 for p in parts))
+
+    def test_key_ignores_mount_point(self):
+        self.assertEqual(shard_key(Path("/mnt/a/x/y.ncm"), Path("/mnt/a")), shard_key(Path("/nfs/x/y.ncm"), Path("/nfs")))
+
+    def test_size_balance(self):
+        sized = [("a", 100), ("b", 60), ("c", 50), ("d", 10)]
+        self.assertEqual(assign_by_size(sized, 2), {"a": 1, "b": 2, "c": 2, "d": 1})
+        self.assertEqual(assign_by_size(reversed(sized), 2), assign_by_size(sized, 2))
+
+    def test_merge_reports(self):
+        r1 = {"summary": {"ok": 2, "skip": 0, "fail": 1, "bytes_out": 10}, "files": [{"source": "b"}], "shard": {"index": 1, "count": 3}}
+        r2 = {"summary": {"ok": 1, "skip": 1, "fail": 0, "bytes_out": 5}, "files": [{"source": "a"}], "shard": {"index": 3, "count": 3}}
+        merged = merge_reports([r1, r2])
+        self.assertEqual(merged["summary"], {"ok": 3, "skip": 1, "fail": 1, "bytes_out": 15})
+        self.assertEqual([f["source"] for f in merged["files"]], ["a", "b"])
+        self.assertEqual(merged["missing_shards"], [2])
+
+
+class TestCliShard(unittest.TestCase):
+    def test_shards_cover_tree_and_merge(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "in"
+            for i in range(12):
+                p = src / f"d{i % 3}" / f"{i}.ncm"
+                p.parent.mkdir(parents=True, exist_ok=True)
+                p.write_bytes(make_ncm(b"fLaC" + bytes(100 * i)))
+            out = Path(td) / "out"
+            reports = []
+            for by in ("hash", "size"):
+                reports.clear()
+                for i in (1, 2, 3):
+                    rep = Path(td) / f"{by}{i}.json"
+                    rc = main([
+                        "-i", str(src), "-o", str(out / by), "--no-banner", "--quiet",
+                        "--shard", f"{i}/3", "--shard-by", by, "--report", str(rep),
+                    ])
+                    self.assertEqual(rc, 0)
+                    reports.append(str(rep))
+                self.assertEqual(len(list((out / by).rglob("*.flac"))), 12)
+                merged = Path(td) / f"{by}.json"
+                with mock.patch("sys.stdout", io.StringIO()) as so:
+                    rc = main(["merge-reports", *reports, "-o", str(merged)])
+                self.assertEqual(rc, 0)
+                self.assertIn("成功 12", so.getvalue())
+                data = json.loads(merged.read_text(encoding="utf-8"))
+                self.assertEqual(len(data["files"]), 12)
+                self.assertEqual([s["index"] for s in data["shards"]], [1, 2, 3])
+
+    def test_rejects_bad_spec(self):
+        with tempfile.TemporaryDirectory() as td:
+            self.assertEqual(main(["-i", td, "--no-banner", "--quiet", "--shard", "4/3"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
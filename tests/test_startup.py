@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# 纯解密路径不应加载的可选子系统
+LAZY_MODULES = (
+    "ncmdc.meta.writer",
+    "ncmdc.providers.netease",
+    "ncmdc.providers.local_lyric",
+    "mutagen",
+    "urllib.request",
+    "http.client",
+    "tarfile",
+    "zipfile",
+)
+
+# 冷启动导入预算（毫秒），可用环境变量放宽（慢速 CI 机器）
+IMPORT_BUDGET_MS = float(os.environ.get("NCMDC_IMPORT_BUDGET_MS", "400"))
+
+
+def _run(code: str, *args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(ROOT), PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run(
+        [sys.executable, *args, "-c", code], capture_output=True, text=True, env=env, cwd=str(ROOT), timeout=60
+    )
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_plain_decrypt_skips_optional_subsystems(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "a.ncm"
+            src.write_bytes(make_ncm(b"fLaC" + bytes(1000)))
+            code = (
+                "import json, sys\n"
+                "from ncmdc.cli import main\n"
+                f"rc = main(['-i', {str(src)!r}, '--no-banner', '--quiet'])\n"
+                f"print(json.dumps([rc, [m for m in {list(LAZY_MODULES)!r} if m in sys.modules]]))\n"
+            )
+            proc = _run(code)
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+            rc, loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+            self.assertEqual(rc, 0)
+            self.assertEqual(loaded, [])
+            self.assertTrue((Path(td) / "a.flac").exists())
+
+    def test_import_time_budget(self):
+        proc = _run("import ncmdc.cli", "-X", "importtime")
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        cumulative = None
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            parts = [p.strip() for p in line.split("|")]
+            if len(parts) == 3 and parts[2] == "ncmdc.cli":
+                cumulative = int(parts[1])
+        self.assertIsNotNone(cumulative, proc.stderr[-500:])
+        self.assertLess(cumulative / 1000, IMPORT_BUDGET_MS)
+
+    def test_package_import_defers_api(self):
+        code = (
+            "import json, sys\n"
+            "import ncmdc\n"
+            "before = 'ncmdc.api' in sys.modules\n"
+            "from ncmdc import ConvertOptions, convert_file\n"
+            "print(json.dumps([before, 'ncmdc.api' in sys.modules, convert_file.__module__, 'convert_many' in dir(ncmdc)]))\n"
+        )
+        proc = _run(code)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(json.loads(proc.stdout.strip()), [False, True, "ncmdc.api", True])
+        with self.assertRaises(AttributeError):
+            import ncmdc
+
+            ncmdc.no_such_name
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import hashlib
+import io
+import json
+import random
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from ncm_sample import make_ncm
+
+from ncmdc.cli import main
+from ncmdc.ncm.parser import NcmDecoder
+from ncmdc.verify import FlacCheck, Mp3Check, Mp4Check, StreamVerifier, _crc8, sample_ranges, verify_sampled
+
+
+def flac_sample(frames: int = 3, corrupt_crc: bool = False) -> bytes:
+    # STREAMINFO：44100Hz / 2ch / 16bit
+    packed = (44100 << 44) | (1 << 41) | (15 << 36) | 1000
+    streaminfo = struct.pack(">HH", 4096, 4096) + b"\x00" * 6 + packed.to_bytes(8, "big") + b"\x00" * 16
+    out = b"fLaC" + bytes([0x00]) + (34).to_bytes(3, "big") + streaminfo
+    out += bytes([0x81]) + (8).to_bytes(3, "big") + b"\x00" * 8  # 最后一个块：PADDING
+    for n in range(frames):
+        hdr = bytes([0xFF, 0xF8, 0xC9, 0x18, n])
+        crc = _crc8(hdr) ^ (1 if corrupt_crc and n == 0 else 0)
+        out += hdr + bytes([crc]) + b"\x11" * 50
+    return out
+
+
+def mp3_sample(frames: int = 4, garbage: bool = False) -> bytes:
+    # MPEG1 Layer III 128kbps 44100Hz，无填充：帧长 417
+    frame = b"\xff\xfb\x90\x00" + b"\x00" * 413
+    out = b"ID3\x03\x00\x00\x00\x00\x00\x05" + b"\x00" * 5
+    for n in range(frames):
+        out += frame
+        if garbage and n == 1:
+            out += b"\x12" * 40
+    return out + b"TAG" + b"\x00" * 125
+
+
+def mp4_sample(with_moov: bool = True) -> bytes:
+    ftyp = struct.pack(">I4s4sI4s", 20, b"ftyp", b"M4A ", 0, b"M4A ")
+    moov = struct.pack(">I4s", 16, b"moov") + b"\x00" * 8
+    mdat = struct.pack(">I4s", 1, b"mdat") + struct.pack(">Q", 16 + 100) + b"\x00" * 100
+    return ftyp + (moov if with_moov else b"") + mdat
+
+
+def feed(check, data: bytes, step: int):
+    for i in range(0, len(data), step):
+        check.update(data[i:i + step])
+    return check.finish()
+
+
+class TestContainerChecks(unittest.TestCase):
+    def test_flac(self):
+        for step in (1, 7, 4096):
+            res = feed(FlacCheck(), flac_sample(), step)
+            self.assertTrue(res.ok, res.detail)
+            self.assertEqual(res.stats["frames"], 3)
+            self.assertEqual(res.stats["sample_rate"], 44100)
+        self.assertFalse(feed(FlacCheck(), flac_sample(corrupt_crc=True), 64).ok)
+        self.assertFalse(feed(FlacCheck(), b"ID3" + b"\x00" * 60, 64).ok)
+
+    def test_mp3(self):
+        for step in (1, 100, 1 << 16):
+            res = feed(Mp3Check(), mp3_sample(), step)
+            self.assertTrue(res.ok, res.detail)
+            self.assertEqual(res.stats["frames"], 4)
+        res = feed(Mp3Check(), mp3_sample(garbage=True), 256)
+        self.assertFalse(res.ok)
+        self.assertEqual(res.stats["sync_errors"], 1)
+
+    def test_mp4(self):
+        for step in (1, 5, 4096):
+            res = feed(Mp4Check(), mp4_sample(), step)
+            self.assertTrue(res.ok, res.detail)
+            self.assertEqual(res.stats["boxes"], ["ftyp", "moov", "mdat"])
+        self.assertFalse(feed(Mp4Check(), mp4_sample(with_moov=False), 64).ok)
+        self.assertFalse(feed(Mp4Check(), mp4_sample()[:-10], 64).ok)
+
+    def test_stream_verifier_digest(self):
+        v = StreamVerifier(".mp3", digest="blake2b", container=True)
+        data = mp3_sample()
+        v(data[:10])
+        v(data[10:])
+        self.assertEqual(v.hexdigest(), hashlib.blake2b(data).hexdigest())
+        self.assertTrue(v.finish().ok)
+
+
+class TestCliChecksum(unittest.TestCase):
+    def test_sidecar_and_report(self):
+        with tempfile.TemporaryDirectory() as td:
+            audio = flac_sample()
+            (Path(td) / "a.ncm").write_bytes(make_ncm(audio))
+            out = Path(td) / "out"
+            report = Path(td) / "report.json"
+            rc = main([
+                "-i", td, "-o", str(out), "--no-banner", "--quiet",
+                "--checksum", "sha256", "--verify-container", "--report", str(report),
+            ])
+            self.assertEqual(rc, 0)
+            digest = hashlib.sha256(audio).hexdigest()
+            self.assertEqual((out / "a.flac.sha256").read_text(encoding="utf-8"), f"{digest}  a.flac\n")
+            data = json.loads(report.read_text(encoding="utf-8"))
+            self.assertEqual(data["summary"]["ok"], 1)
+            entry = data["files"][0]
+            self.assertEqual(entry["sha256"], digest)
+            self.assertTrue(entry["container"]["ok"])
+
+
+class TestSampledVerify(unittest.TestCase):
+    def _decoder(self, audio: bytes) -> NcmDecoder:
+        dec = NcmDecoder(io.BytesIO(make_ncm(audio)))
+        dec.validate()
+        return dec
+
+    def test_ranges_cover_head_and_tail(self):
+        ranges = sample_ranges(1000, 3, 100, random.Random(1))
+        self.assertIn((0, 100), ranges)
+        self.assertIn((900, 100), ranges)
+        self.assertTrue(all(0 <= o and o + n <= 1000 for o, n in ranges))
+        self.assertEqual(sample_ranges(10, 3, 100, random.Random(1)), [(0, 10)])
+
+    def test_match_and_mismatch(self):
+        audio = bytes(random.Random(7).randrange(256) for _ in range(50000))
+        dec = self._decoder(audio)
+        self.assertEqual(dec.read_decrypted(1234, 10), audio[1234:1244])
+        with tempfile.TemporaryDirectory() as td:
+            out = Path(td) / "a.mp3"
+            out.write_bytes(audio)
+            res = verify_sampled(dec, out, samples=4, block=512, rng=random.Random(3))
+            self.assertTrue(res.ok, res.detail)
+            out.write_bytes(audio[:-1])
+            self.assertIn("size mismatch", verify_sampled(dec, out).detail)
+            broken = bytearray(audio)
+            broken[-1] ^= 0xFF
+            out.write_bytes(bytes(broken))
+            self.assertFalse(verify_sampled(dec, out, samples=0, block=512).ok)
+
+    def test_cli_verify_existing(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "in"
+            src.mkdir()
+            audio = flac_sample()
+            (src / "a.ncm").write_bytes(make_ncm(audio))
+            (src / "b.ncm").write_bytes(make_ncm(audio))
+            (src / "c.ncm").write_bytes(make_ncm(audio))
+            out = Path(td) / "out"
+            out.mkdir()
+            (out / "a.flac").write_bytes(audio)
+            (out / "b.flac").write_bytes(audio[:-3] + b"xyz")
+            report = Path(td) / "r.json"
+            rc = main(["-i", str(src), "-o", str(out), "--no-banner", "--quiet", "--verify-existing", "--report", str(report)])
+            self.assertEqual(rc, 0)
+            summary = json.loads(report.read_text(encoding="utf-8"))["summary"]
+            self.assertEqual((summary["ok"], summary["fail"], summary["skip"]), (1, 1, 1))
+            self.assertFalse((out / "c.flac").exists())
+
+    def test_cli_verify_existing_tagged_output(self):
+        with tempfile.TemporaryDirectory() as td:
+            src, out = Path(td) / "in", Path(td) / "out"
+            src.mkdir()
+            meta = {"musicName": "T", "artist": [["A", 1]], "album": "Al", "format": "flac"}
+            (src / "a.ncm").write_bytes(make_ncm(flac_sample(), meta=meta))
+            (src / "b.ncm").write_bytes(make_ncm(mp3_sample(), meta=dict(meta, format="mp3")))
+            base = ["-i", str(src), "-o", str(out), "--no-banner", "--quiet"]
+            self.assertEqual(main(base + ["--write-meta"]), 0)
+            self.assertTrue((out / "b.mp3").read_bytes().startswith(b"ID3"))
+            report = Path(td) / "r.json"
+            self.assertEqual(main(base + ["--verify-existing", "--report", str(report)]), 0)
+            summary = json.loads(report.read_text(encoding="utf-8"))["summary"]
+            self.assertEqual((summary["ok"], summary["fail"]), (2, 0))
+            # 标签之外的音频负载被改动仍能发现
+            data = bytearray((out / "b.mp3").read_bytes())
+            data[-200] ^= 0xFF  # 末尾 128 字节是 ID3v1，-200 落在最后一帧内
+            (out / "b.mp3").write_bytes(bytes(data))
+            self.assertEqual(main(base + ["--verify-existing", "--verify-samples", "0", "--report", str(report)]), 0)
+            summary = json.loads(report.read_text(encoding="utf-8"))["summary"]
+            self.assertEqual((summary["ok"], summary["fail"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from ncmdc.scan import ScanFilter
+from ncmdc.watch import DirectoryWatcher, run_watch
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDirectoryWatcher(unittest.TestCase):
+    def test_emit_after_settle(self):
+        with tempfile.TemporaryDirectory() as td:
+            clock = FakeClock()
+            w = DirectoryWatcher(td, settle=3.0, clock=clock)
+            p = Path(td) / "a.ncm"
+            p.write_bytes(b"x" * 10)
+            (Path(td) / "a.mp3").write_bytes(b"ignored")
+            self.assertEqual(w.poll(), [])
+            clock.now = 1.0
+            self.assertEqual(w.poll(), [])
+            clock.now = 3.5
+            events = w.poll()
+            self.assertEqual([e.path for e in events], [p])
+            self.assertFalse(events[0].changed)
+            # 已提交的文件不会重复触发
+            clock.now = 10.0
+            self.assertEqual(w.poll(), [])
+
+    def test_growing_file_resets_timer(self):
+        with tempfile.TemporaryDirectory() as td:
+            clock = FakeClock()
+            w = DirectoryWatcher(td, settle=2.0, clock=clock)
+            p = Path(td) / "a.ncm"
+            p.write_bytes(b"x")
+            w.poll()
+            clock.now = 5.0
+            p.write_bytes(b"xx")
+            self.assertEqual(w.poll(), [])
+            clock.now = 6.0
+            self.assertEqual(w.poll(), [])
+            clock.now = 7.5
+            self.assertEqual(len(w.poll()), 1)
+
+    def test_prime_and_changed(self):
+        with tempfile.TemporaryDirectory() as td:
+            clock = FakeClock()
+            p = Path(td) / "sub" / "a.ncm"
+            p.parent.mkdir()
+            p.write_bytes(b"x")
+            w = DirectoryWatcher(td, settle=0.0, clock=clock)
+            w.prime()
+            self.assertEqual(w.poll(), [])
+            p.write_bytes(b"changed")
+            w.poll()
+            clock.now = 1.0
+            events = w.poll()
+            self.assertEqual(len(events), 1)
+            self.assertTrue(events[0].changed)
+
+    def test_prime_leaves_recent_files_to_settle(self):
+        with tempfile.TemporaryDirectory() as td:
+            clock = FakeClock()
+            old, fresh = Path(td) / "old.ncm", Path(td) / "fresh.ncm"
+            old.write_bytes(b"done")
+            past = time.time() - 60
+            os.utime(old, (past, past))
+            fresh.write_bytes(b"still downloading")
+            w = DirectoryWatcher(td, settle=3.0, clock=clock)
+            w.prime(quiet=3.0)
+            self.assertTrue(w.is_primed(old))
+            # 仍在写入的文件不进首轮，稳定后由监听阶段提交
+            self.assertFalse(w.is_primed(fresh))
+            self.assertEqual(w.poll(), [])
+            clock.now = 3.5
+            self.assertEqual([e.path for e in w.poll()], [fresh])
+
+    def test_filters_match_scan(self):
+        with tempfile.TemporaryDirectory() as td:
+            clock = FakeClock()
+            root = Path(td)
+            for rel in ("a.ncm", "skip.ncm", "tmp/b.ncm", "sub/c.ncm", "sub/deep/d.ncm"):
+                (root / rel).parent.mkdir(parents=True, exist_ok=True)
+                (root / rel).write_bytes(b"x")
+            filters = ScanFilter(exclude=("skip.ncm", "tmp"), max_depth=1)
+            w = DirectoryWatcher(td, settle=0.0, clock=clock, filters=filters)
+            w.poll()
+            clock.now = 1.0
+            got = sorted(e.path.relative_to(root).as_posix() for e in w.poll())
+            self.assertEqual(got, ["a.ncm", "sub/c.ncm"])
+            # 被剪枝的目录不加入 inotify 监听
+            self.assertNotIn(root / "tmp", w.directories)
+
+
+class TestRunWatch(unittest.TestCase):
+    def test_new_file_reaches_handler(self):
+        with tempfile.TemporaryDirectory() as td:
+            w = DirectoryWatcher(td, settle=0.0)
+            w.prime()
+            seen = []
+            got = threading.Event()
+            stop = threading.Event()
+
+            def handler(ev):
+                seen.append(ev.path.name)
+                got.set()
+
+            t = threading.Thread(
+                target=run_watch,
+                args=(w, handler),
+                kwargs={"interval": 0.05, "workers": 2, "queue_size": 2, "stop": stop},
+            )
+            t.start()
+            try:
+                time.sleep(0.1)
+                (Path(td) / "new.ncm").write_bytes(b"data")
+                self.assertTrue(got.wait(5.0))
+            finally:
+                stop.set()
+                t.join(5.0)
+            self.assertEqual(seen, ["new.ncm"])
+            self.assertFalse(t.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()